@@ -0,0 +1,168 @@
+"""Benchmark suite of the hfoGUI readers, the Hilbert detection, the Stockwell transform and the Intan conversion on
+synthetic Tint sessions (see synthetic_session.py).
+
+Every benchmark records its wall time, the samples it processed, its throughput (samples per second) and its peak
+allocated memory (tracemalloc), and the results are saved as JSON so that releases can be compared:
+
+    python benchmarks/run_benchmarks.py --scales 1min 1h --output benchmarks/results/v3.0.json --label v3.0
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+import numpy as np
+import scipy
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import hfoGUI  # noqa: E402 (adds the hfoGUI directory to the path for the core imports)
+from hfoGUI.core.profiling import StageProfile  # noqa: E402
+from hfoGUI.core.Tint_Matlab import ReadEEG, bits2uV, importspikes, getpos, read_cut  # noqa: E402
+from hfoGUI.core.Score import hilbert_detect_events, hilbert_detect_events_streaming  # noqa: E402
+
+from synthetic_session import SCALES, EGF_FS, write_session, synthetic_intan_data  # noqa: E402
+
+BENCHMARKS = ['ReadEEG', 'bits2uV', 'hilbert_detect_events', 'hilbert_detect_events_streaming', 'stran_psd',
+              'importspikes', 'read_cut', 'getpos', 'intan_conversion']
+
+DETECTION_PARAMETERS = dict(epoch=5 * 60, sd_num=3, min_duration=10, min_freq=80, max_freq=500,
+                            required_peak_number=6, required_peak_sd=2, boundary_fraction=0.3)
+
+
+def run_scale(scale, session_dir, benchmarks, burst_rate=1.0, stran_windows=5, intan_duration=None):
+    """Generates the session of a scale and runs the benchmarks on it, returns a list of the benchmark results."""
+    duration = SCALES[scale]
+
+    start_time = time.perf_counter()
+    paths = write_session(session_dir, duration, burst_rate=burst_rate)
+    print('  generated the %s session in %.1f s' % (scale, time.perf_counter() - start_time))
+
+    profile = StageProfile()
+    with profile:
+        if 'ReadEEG' in benchmarks or 'bits2uV' in benchmarks or 'hilbert_detect_events' in benchmarks:
+            with profile.stage('ReadEEG') as stage:
+                raw_data, Fs = ReadEEG(paths['egf'])
+                stage['samples'] = len(raw_data)
+
+            with profile.stage('bits2uV', len(raw_data)):
+                data_uV, scalar = bits2uV(raw_data, paths['egf'], paths['set'])
+
+            if 'hilbert_detect_events' in benchmarks:
+                with profile.stage('hilbert_detect_events', len(data_uV)):
+                    hilbert_detect_events(data_uV, Fs, **DETECTION_PARAMETERS)
+
+            data_uV = None
+            raw_data = None
+
+        if 'hilbert_detect_events_streaming' in benchmarks:
+            with profile.stage('hilbert_detect_events_streaming', duration * EGF_FS):
+                raw_data, Fs = ReadEEG(paths['egf'])
+                _, scalar = bits2uV([], paths['egf'], paths['set'])
+                hilbert_detect_events_streaming(raw_data, Fs, chunk_sec=60, scalar=scalar, **DETECTION_PARAMETERS)
+            raw_data = None
+
+        if 'stran_psd' in benchmarks:
+            from hfoGUI.core.TFA_Functions import stran_psd
+
+            # the Score/TF windows transform a second around an event, so a second around the first bursts
+            raw_data, Fs = ReadEEG(paths['egf'])
+            for burst_start in paths['burst_starts'][:stran_windows]:
+                first = max(int((burst_start - 0.5) * Fs), 0)
+                window = raw_data[first:first + int(Fs)].astype(float)
+                with profile.stage('stran_psd', len(window)):
+                    stran_psd(window - np.mean(window), Fs, minfreq=80, maxfreq=500, output_Fs=1)
+            raw_data = None
+
+        if 'importspikes' in benchmarks:
+            for tetrode_filename in paths['tetrodes']:
+                with profile.stage('importspikes') as stage:
+                    spikes, spike_parameters = importspikes(tetrode_filename)
+                    stage['samples'] = spike_parameters['num_spikes']
+
+        if 'read_cut' in benchmarks:
+            for cut_filename in paths['cuts']:
+                with profile.stage('read_cut') as stage:
+                    stage['samples'] = len(read_cut(cut_filename))
+
+        if 'getpos' in benchmarks:
+            with profile.stage('getpos') as stage:
+                posx, posy, post, Fs_pos = getpos(paths['pos'], 'BehaviorRoom')
+                stage['samples'] = len(post)
+
+        if 'intan_conversion' in benchmarks:
+            from hfoGUI.core.Intan_to_Tint import create_eeg_and_egf_files
+
+            intan_data = synthetic_intan_data(intan_duration or duration)
+            with tempfile.TemporaryDirectory() as output_dir:
+                with profile.stage('intan_conversion', intan_data['amplifier_data'].size):
+                    create_eeg_and_egf_files(intan_data, 'synthetic', output_dir)
+            intan_data = None
+
+    results = []
+    for stage in profile.as_dict()['stages']:
+        stage['scale'] = scale
+        stage['duration_s'] = duration
+        stage['samples_per_s'] = stage['samples'] / stage['wall_time_s'] if stage['wall_time_s'] > 0 else None
+        results.append(stage)
+
+        print('  {:<34} {:>9.3f} s {:>14.0f} samples/s {:>10.1f} MB'.format(
+            stage['name'], stage['wall_time_s'], stage['samples_per_s'] or 0, stage['peak_allocated_bytes'] / 1e6))
+
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='hfoGUI benchmark suite on synthetic Tint sessions')
+    parser.add_argument('--scales', nargs='+', choices=list(SCALES), default=['1min', '1h'],
+                        help='Session durations to benchmark (default: 1min 1h), 24h needs more than 10 GB of memory '
+                             'for the whole-recording detection')
+    parser.add_argument('--benchmarks', nargs='+', choices=BENCHMARKS, default=BENCHMARKS,
+                        help='Benchmarks to run (default: all)')
+    parser.add_argument('--burst-rate', type=float, default=1.0,
+                        help='Injected HFO bursts per second (default: 1)')
+    parser.add_argument('--stran-windows', type=int, default=5,
+                        help='Number of 1 s windows transformed by the stran_psd benchmark (default: 5)')
+    parser.add_argument('--intan-duration', type=float,
+                        help='Duration (s) of the synthetic Intan recording to convert (default: the session '
+                             'duration)')
+    parser.add_argument('--workdir', help='Directory for the synthetic sessions (default: a temporary directory)')
+    parser.add_argument('--output', default='benchmark_results.json', help='JSON results file')
+    parser.add_argument('--label', default='', help='Label stored with the results, e.g. the release')
+    args = parser.parse_args(argv)
+
+    results = {
+        'label': args.label,
+        'created': datetime.datetime.now().isoformat(timespec='seconds'),
+        'platform': platform.platform(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'scipy': scipy.__version__,
+        'cpu_count': os.cpu_count(),
+        'burst_rate': args.burst_rate,
+        'benchmarks': [],
+    }
+
+    with tempfile.TemporaryDirectory() as temporary_dir:
+        workdir = args.workdir or temporary_dir
+
+        for scale in args.scales:
+            print('Benchmarking the %s session' % scale)
+            results['benchmarks'] += run_scale(scale, os.path.join(workdir, scale), args.benchmarks,
+                                               burst_rate=args.burst_rate, stran_windows=args.stran_windows,
+                                               intan_duration=args.intan_duration)
+
+    output_dir = os.path.dirname(os.path.abspath(args.output))
+    os.makedirs(output_dir, exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+
+    print('Saved the results -> %s' % args.output)
+
+
+if __name__ == '__main__':
+    main()
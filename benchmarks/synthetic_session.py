@@ -0,0 +1,217 @@
+"""Writes synthetic Tint (Axona) sessions for the benchmarks: a .set file, the .egf/.eeg LFP, the .pos tracking,
+tetrode files and their .cut files, with HFO-like bursts injected into the LFP.
+
+The files are written in chunks of a minute so that even the 24 hour sessions are generated with bounded memory.
+"""
+import json
+import os
+import struct
+
+import numpy as np
+
+# the session durations of the benchmark suite, in seconds
+SCALES = {
+    '1min': 60,
+    '1h': 60 * 60,
+    '24h': 24 * 60 * 60,
+}
+
+ADC_FULLSCALE_MV = 1500
+CHANNEL_GAIN = 2000
+EGF_FS = 4800
+EEG_FS = 250
+POS_FS = 50
+SPIKE_TIMEBASE = 96000
+SAMPLES_PER_SPIKE = 50
+
+CHUNK_SEC = 60
+
+
+def _header(lines):
+    return ''.join('%s\r\n' % line for line in lines).encode('utf-8')
+
+
+def _lfp_chunk(rng, n_samples, Fs, burst_starts, chunk_first, burst_uV, noise_uV):
+    """The LFP (in uV) of a chunk, background noise plus the 250 Hz bursts that start in this chunk."""
+    data = rng.standard_normal(n_samples) * noise_uV
+
+    burst_samples = int(0.03 * Fs)  # 30 ms bursts
+    burst = burst_uV * np.sin(2 * np.pi * 250 * np.arange(burst_samples) / Fs) * np.hanning(burst_samples)
+
+    for burst_start in burst_starts:
+        first = int(burst_start * Fs) - chunk_first
+        if 0 <= first < n_samples:
+            last = min(first + burst_samples, n_samples)
+            data[first:last] += burst[:last - first]
+
+    return data
+
+
+def write_set_file(set_filename, duration, n_tetrodes=4, n_eeg=1):
+    lines = ['trial_date Monday, 1 Jan 2024', 'trial_time 12:00:00', 'experimenter benchmark',
+             'comments synthetic session', 'duration %d' % duration, 'sw_version 1.2.2.14',
+             'ADC_fullscale_mv %d' % ADC_FULLSCALE_MV]
+    lines += ['gain_ch_%d %d' % (channel, CHANNEL_GAIN) for channel in range(4 * max(n_tetrodes, 16))]
+    lines += ['collectMask_%d %d' % (tetrode, int(tetrode <= n_tetrodes)) for tetrode in range(1, 17)]
+    lines += ['saveEEG_ch_%d %d' % (eeg, int(eeg <= n_eeg)) for eeg in range(1, 17)]
+    lines += ['EEG_ch_%d %d' % (eeg, eeg) for eeg in range(1, 17)]
+    lines += ['saveEGF 1']
+
+    with open(set_filename, 'wb') as f:
+        f.write(_header(lines))
+
+
+def write_lfp_file(filename, duration, Fs, burst_starts, rng):
+    """Writes an .egf (int16, Fs=4800) or .eeg (int8, Fs=250) file."""
+    is_egf = '.egf' in os.path.splitext(filename)[1]
+    n_samples = int(duration * Fs)
+
+    if is_egf:
+        scalar = ADC_FULLSCALE_MV * 1000 / (CHANNEL_GAIN * 32768)
+        sample_type, bytes_per_sample, info = '<i2', 2, np.iinfo(np.int16)
+        header = ['num_EGF_samples %d' % n_samples]
+    else:
+        scalar = ADC_FULLSCALE_MV * 1000 / (CHANNEL_GAIN * 128)
+        sample_type, bytes_per_sample, info = 'i1', 1, np.iinfo(np.int8)
+        header = ['num_EEG_samples %d' % n_samples, 'EEG_samples_per_position 5']
+
+    header = ['trial_date Monday, 1 Jan 2024', 'trial_time 12:00:00', 'duration %d' % duration, 'num_chans 1',
+              'sample_rate %d hz' % Fs, 'bytes_per_sample %d' % bytes_per_sample] + header
+
+    with open(filename, 'wb') as f:
+        f.write(_header(header) + b'data_start')
+
+        for chunk_first in range(0, n_samples, CHUNK_SEC * Fs):
+            n_chunk = min(CHUNK_SEC * Fs, n_samples - chunk_first)
+            data = _lfp_chunk(rng, n_chunk, Fs, burst_starts, chunk_first, burst_uV=300, noise_uV=30)
+            data = np.clip(np.round(data / scalar), info.min, info.max).astype(sample_type)
+            f.write(data.tobytes())
+
+        f.write(b'\r\ndata_end\r\n')
+
+
+def write_pos_file(pos_filename, duration, rng):
+    """Writes a two-spot .pos file (t, x1, y1, x2, y2, numpix1, numpix2 and a spare word, big-endian)."""
+    n_samples = int(duration * POS_FS)
+
+    header = ['trial_date Monday, 1 Jan 2024', 'trial_time 12:00:00', 'duration %d' % duration, 'num_colours 4',
+              'min_x 0', 'max_x 768', 'min_y 0', 'max_y 574', 'window_min_x 0', 'window_max_x 767',
+              'window_min_y 0', 'window_max_y 573', 'timebase %d hz' % POS_FS, 'bytes_per_timestamp 4',
+              'sample_rate %.1f hz' % POS_FS, 'EEG_samples_per_position 5', 'bearing_colour_1 0',
+              'pos_format t,x1,y1,x2,y2,numpix1,numpix2', 'bytes_per_coord 2', 'pixels_per_metre 500',
+              'num_pos_samples %d' % n_samples]
+
+    position = np.array([314.75, 390.5])
+
+    with open(pos_filename, 'wb') as f:
+        f.write(_header(header) + b'data_start')
+
+        for chunk_first in range(0, n_samples, CHUNK_SEC * POS_FS):
+            n_chunk = min(CHUNK_SEC * POS_FS, n_samples - chunk_first)
+
+            # a random walk inside the arena
+            steps = rng.standard_normal((n_chunk, 2)) * 2
+            walk = np.clip(position + np.cumsum(steps, axis=0), [100, 100], [600, 500])
+            position = walk[-1]
+
+            records = np.zeros(n_chunk, dtype=[('t', '>i4'), ('words', '>i2', 8)])
+            records['t'] = np.arange(chunk_first, chunk_first + n_chunk)
+            records['words'][:, 0:2] = np.round(walk)
+            records['words'][:, 2:4] = np.round(walk) + 5
+            records['words'][:, 4:6] = 40
+            f.write(records.tobytes())
+
+        f.write(b'\r\ndata_end\r\n')
+
+
+def write_tetrode_files(tetrode_filename, cut_filename, duration, spike_rate, rng, n_cells=5):
+    """Writes a tetrode file (4 x (big-endian timestamp + 50 int8 samples) per spike) and its .cut file."""
+    n_spikes = rng.poisson(spike_rate * duration)
+    spike_times = np.sort(rng.uniform(0, duration, n_spikes))
+    cells = rng.integers(0, n_cells + 1, n_spikes)  # cell 0 is the noise cluster
+
+    header = ['trial_date Monday, 1 Jan 2024', 'trial_time 12:00:00', 'duration %d' % duration, 'num_chans 4',
+              'timebase %d hz' % SPIKE_TIMEBASE, 'bytes_per_timestamp 4',
+              'samples_per_spike %d' % SAMPLES_PER_SPIKE, 'sample_rate 48000 hz', 'bytes_per_sample 1',
+              'spike_format t,ch1,t,ch2,t,ch3,t,ch4', 'num_spikes %d' % n_spikes]
+
+    waveform = (np.exp(-((np.arange(SAMPLES_PER_SPIKE) - 12) / 3.0) ** 2) * 100).astype(int)
+
+    with open(tetrode_filename, 'wb') as f:
+        f.write(_header(header) + b'data_start')
+
+        spikes_per_chunk = 100000
+        for first in range(0, n_spikes, spikes_per_chunk):
+            timestamps = (spike_times[first:first + spikes_per_chunk] * SPIKE_TIMEBASE).astype('>i4')
+
+            records = np.zeros((len(timestamps), 4), dtype=[('t', '>i4'), ('samples', 'i1', SAMPLES_PER_SPIKE)])
+            records['t'] = timestamps[:, np.newaxis]
+            records['samples'] = np.clip(waveform * rng.uniform(0.5, 1.0, (len(timestamps), 4, 1)) +
+                                         rng.normal(0, 5, (len(timestamps), 4, SAMPLES_PER_SPIKE)), -128, 127)
+            f.write(records.tobytes())
+
+        f.write(b'\r\ndata_end\r\n')
+
+    with open(cut_filename, 'w') as f:
+        f.write('n_clusters: %d\n' % (n_cells + 1))
+        f.write('n_channels: 4\nn_params: 2\n')
+        f.write('Exact_cut_for: %s spikes: %d\n' % (os.path.splitext(os.path.basename(tetrode_filename))[0],
+                                                    n_spikes))
+        for first in range(0, n_spikes, 25):
+            f.write(' '.join(str(cell) for cell in cells[first:first + 25]) + '\n')
+
+
+def write_session(directory, duration, session='synthetic', burst_rate=1.0, n_tetrodes=4, spike_rate=20.0,
+                  eeg=True, seed=0):
+    """Writes a synthetic session of the given duration (in seconds) to the directory.
+
+    burst_rate is the number of injected HFO bursts per second (30 ms, 250 Hz, in both the .egf and the .eeg),
+    spike_rate the number of spikes per second of each tetrode. Returns a dictionary with the paths of the files and
+    the injected burst start times (in seconds), which is also saved as <session>_truth.json.
+    """
+    os.makedirs(directory, exist_ok=True)
+    rng = np.random.default_rng(seed)
+
+    burst_starts = np.sort(rng.uniform(0, max(duration - 0.1, 0), rng.poisson(burst_rate * duration)))
+
+    paths = {'set': os.path.join(directory, '%s.set' % session),
+             'egf': os.path.join(directory, '%s.egf' % session),
+             'pos': os.path.join(directory, '%s.pos' % session),
+             'tetrodes': [], 'cuts': []}
+
+    write_set_file(paths['set'], duration, n_tetrodes=n_tetrodes)
+    write_lfp_file(paths['egf'], duration, EGF_FS, burst_starts, rng)
+
+    if eeg:
+        paths['eeg'] = os.path.join(directory, '%s.eeg' % session)
+        write_lfp_file(paths['eeg'], duration, EEG_FS, burst_starts, rng)
+
+    write_pos_file(paths['pos'], duration, rng)
+
+    for tetrode in range(1, n_tetrodes + 1):
+        tetrode_filename = os.path.join(directory, '%s.%d' % (session, tetrode))
+        cut_filename = os.path.join(directory, '%s_%d.cut' % (session, tetrode))
+        write_tetrode_files(tetrode_filename, cut_filename, duration, spike_rate, rng)
+        paths['tetrodes'].append(tetrode_filename)
+        paths['cuts'].append(cut_filename)
+
+    with open(os.path.join(directory, '%s_truth.json' % session), 'w') as f:
+        json.dump({'duration': duration, 'burst_rate': burst_rate, 'burst_starts': burst_starts.tolist()}, f)
+
+    paths['burst_starts'] = burst_starts
+
+    return paths
+
+
+def synthetic_intan_data(duration, n_channels=4, Fs=20000, seed=0):
+    """An in-memory Intan recording (the dictionary read_rhd_data returns) for the Intan conversion benchmark."""
+    rng = np.random.default_rng(seed)
+    n_samples = int(duration * Fs)
+
+    return {
+        'frequency_parameters': {'amplifier_sample_rate': float(Fs)},
+        't_amplifier': np.arange(n_samples) / float(Fs),
+        'amplifier_data': rng.standard_normal((n_channels, n_samples)) * 30,
+        'amplifier_channels': [{'native_channel_name': 'A-%03d' % channel,
+                                'custom_channel_name': 'A-%03d' % channel} for channel in range(n_channels)],
+    }
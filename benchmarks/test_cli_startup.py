@@ -0,0 +1,47 @@
+"""Startup benchmark of the headless CLI: the parser has to come up without importing Qt, numpy or the detection,
+so that hilbert-batch workers and the compute nodes without Qt start quickly."""
+import os
+import subprocess
+import sys
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# seconds, the headless CLI starts in ~0.1 s, importing the GUI took ~3 s
+STARTUP_BUDGET_SEC = 1.0
+
+GUI_MODULES = ['PyQt5', 'pyqtgraph', 'matplotlib']
+
+
+def _run_python(*args):
+    return subprocess.run([sys.executable] + list(args), cwd=REPO_DIR, stdout=subprocess.PIPE,
+                          stderr=subprocess.PIPE, check=True, universal_newlines=True)
+
+
+def test_hilbert_batch_help_startup_time():
+    # the first run also compiles the bytecode
+    _run_python('-m', 'hfoGUI', 'hilbert-batch', '--help')
+
+    timings = []
+    for _ in range(3):
+        start_time = time.perf_counter()
+        _run_python('-m', 'hfoGUI', 'hilbert-batch', '--help')
+        timings.append(time.perf_counter() - start_time)
+
+    assert min(timings) < STARTUP_BUDGET_SEC, 'hilbert-batch --help took {:.2f} s'.format(min(timings))
+
+
+def test_headless_modules_do_not_import_the_gui():
+    result = _run_python('-c', 'import sys; import hfoGUI.cli, hfoGUI.core.hilbert_detection, '
+                               'hfoGUI.core.Tint_Matlab, hfoGUI.core.filtering, hfoGUI.core.profiling, '
+                               'hfoGUI.core.manifest; print(" ".join(sorted(sys.modules)))')
+
+    loaded = {module.split('.')[0] for module in result.stdout.split()}
+    assert not loaded.intersection(GUI_MODULES)
+
+
+def test_cli_parser_does_not_import_numpy():
+    result = _run_python('-c', 'import sys; import hfoGUI.cli; print(" ".join(sorted(sys.modules)))')
+
+    loaded = {module.split('.')[0] for module in result.stdout.split()}
+    assert not loaded.intersection(['numpy', 'scipy', 'pandas'] + GUI_MODULES)
@@ -0,0 +1,44 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import hfoGUI  # noqa: E402,F401
+from hfoGUI.core.Tint_Matlab import ReadEEG, bits2uV, getpos, importspikes, read_cut  # noqa: E402
+
+from synthetic_session import EGF_FS, EEG_FS, POS_FS, write_session  # noqa: E402
+
+
+@pytest.fixture(scope='module')
+def session(tmp_path_factory):
+    return write_session(str(tmp_path_factory.mktemp('session')), 5, burst_rate=2.0, n_tetrodes=2, spike_rate=10.0)
+
+
+def test_synthetic_lfp_is_readable(session):
+    raw_data, Fs = ReadEEG(session['egf'])
+    assert Fs == EGF_FS
+    assert len(raw_data) == 5 * EGF_FS
+
+    data_uV, scalar = bits2uV(raw_data, session['egf'], session['set'])
+    # the 300 uV bursts stand out of the 30 uV background noise
+    assert 200 < np.max(np.abs(data_uV)) < 500
+
+    raw_data, Fs = ReadEEG(session['eeg'])
+    assert Fs == EEG_FS
+    assert len(raw_data) == 5 * EEG_FS
+
+
+def test_synthetic_pos_and_spikes_are_readable(session):
+    posx, posy, post, Fs_pos = getpos(session['pos'], 'BehaviorRoom')
+    assert Fs_pos == POS_FS
+    assert len(post) == 5 * POS_FS
+
+    for tetrode_filename, cut_filename in zip(session['tetrodes'], session['cuts']):
+        spikes, spike_parameters = importspikes(tetrode_filename)
+        assert spike_parameters['num_spikes'] == len(spikes['t'])
+        assert np.all(np.diff(spikes['t']) >= 0)
+        assert len(read_cut(cut_filename)) == spike_parameters['num_spikes']
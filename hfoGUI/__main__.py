@@ -1,7 +1,6 @@
 import sys
 
-from .cli import build_parser, run_hilbert_batch
-from .main import run
+from .cli import build_parser, run_hilbert_batch, run_hilbert_sweep, run_hilbert_watch, run_intan_convert
 
 version = "1.0.8"
 
@@ -12,7 +11,15 @@ def main(argv=None):
 
     if args.command == 'hilbert-batch':
         run_hilbert_batch(args)
+    elif args.command == 'hilbert-sweep':
+        run_hilbert_sweep(args)
+    elif args.command == 'hilbert-watch':
+        run_hilbert_watch(args)
+    elif args.command == 'intan-convert':
+        run_intan_convert(args)
     else:
+        # the GUI (Qt, pyqtgraph and the windows) is only imported when it is launched
+        from .main import run
         run()
 
 
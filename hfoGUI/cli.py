@@ -1,13 +1,21 @@
 import argparse
+import contextlib
 import json
+import multiprocessing
+import os
+import re
+import signal
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, as_completed, wait
 from pathlib import Path
 from typing import Optional, Tuple
 
-import numpy as np
-import pandas as pd
-
-from .core.Score import hilbert_detect_events
-from .core.Tint_Matlab import ReadEEG, bits2uV, TintException
+# numpy, pandas, scipy and the detection are imported by the functions that use them, so the parser (--help) and
+# the worker processes start without them; nothing here imports Qt
+from .core.profiling import StageProfile, PeakRSSMonitor, merge_profiles, profile_stage
+from .core.manifest import RunManifest, ShardedRunManifest, params_hash
+from .core.event_store import EventStore
 
 
 def _default_freqs(data_path: Path, max_freq: Optional[float]) -> Tuple[float, float]:
@@ -23,19 +31,22 @@ def _default_freqs(data_path: Path, max_freq: Optional[float]) -> Tuple[float, f
     return min_freq, 125.0
 
 
-def _build_output_paths(data_path: Path, set_path: Optional[Path], output: Optional[Path]):
+def _build_output_paths(data_path: Path, set_path: Optional[Path], output: Optional[Path],
+                        channel: Optional[str] = None):
     method_tag = 'HIL'
     session_base = set_path.stem if set_path else data_path.stem
+    # one scores file per channel of the session, e.g. <session>_egf2_HIL.txt
+    file_base = '{}_{}'.format(session_base, channel) if channel else session_base
 
     if output:
         output_dir = output.parent
-        scores_path = output_dir / "{}.txt".format(session_base)
-        settings_path = output_dir / "{}_settings.json".format(session_base)
+        scores_path = output_dir / "{}.txt".format(file_base)
+        settings_path = output_dir / "{}_settings.json".format(file_base)
     else:
         base_dir = set_path.parent if set_path else data_path.parent
         scores_dir = base_dir / 'HFOScores' / session_base
-        scores_path = scores_dir / ("{}_{}.txt".format(session_base, method_tag))
-        settings_path = scores_dir / ("{}_{}_settings.json".format(session_base, method_tag))
+        scores_path = scores_dir / ("{}_{}.txt".format(file_base, method_tag))
+        settings_path = scores_dir / ("{}_{}_settings.json".format(file_base, method_tag))
 
     scores_path.parent.mkdir(parents=True, exist_ok=True)
     return scores_path, settings_path
@@ -59,6 +70,49 @@ def _find_data_files(directory: Path):
     return sorted(filtered_eeg + egf_files)
 
 
+# the thread pools of the BLAS, OpenMP and FFT libraries, pinned in the --jobs workers so that N detections don't
+# each start a thread per CPU
+_THREAD_ENV_VARS = ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS', 'BLIS_NUM_THREADS',
+                    'VECLIB_MAXIMUM_THREADS', 'NUMEXPR_NUM_THREADS')
+
+
+@contextlib.contextmanager
+def _pinned_threads(threads_per_worker: int):
+    """Sets the thread pool sizes of the processes started inside the context, restoring the environment after.
+
+    The libraries read these variables when they are first imported, so the workers have to be spawned (not forked
+    from a process that already imported numpy) while the context is active.
+    """
+    previous = {name: os.environ.get(name) for name in _THREAD_ENV_VARS}
+    os.environ.update({name: str(threads_per_worker) for name in _THREAD_ENV_VARS})
+    try:
+        yield
+    finally:
+        for name, value in previous.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+
+@contextlib.contextmanager
+def _worker_pool(workers: int):
+    """A pool of spawned worker processes whose BLAS/OpenMP/FFT thread pools share the CPUs
+    (cpu_count // workers threads each). The workers ignore Ctrl-C, the main process decides what to do with the
+    files they are processing."""
+    threads_per_worker = max((os.cpu_count() or 1) // workers, 1)
+
+    with _pinned_threads(threads_per_worker), \
+            ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                                initializer=signal.signal, initargs=(signal.SIGINT, signal.SIG_IGN)) as executor:
+        try:
+            yield executor
+        except BaseException:
+            # e.g. Ctrl-C, don't start the files that are still queued
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+
+
 def _find_set_file(data_path: Path):
     """Find corresponding .set file for a data file."""
     set_path = data_path.with_suffix('.set')
@@ -71,33 +125,30 @@ def _find_set_file(data_path: Path):
     return None
 
 
-def _process_single_file(data_path: Path, set_path: Optional[Path], args: argparse.Namespace):
-    """Process a single data file with Hilbert detection.
-    
-    Returns:
-        int: Number of events detected (for summary reporting).
-    """
-    if args.verbose:
-        print('\nProcessing: {}'.format(data_path))
+def _find_session_channels(data_path: Path):
+    """Find every channel of the session of a data file with the same kind (.egf, .egf2, ... or .eeg, .eeg2, ...),
+    sorted by channel number."""
+    kind = 'egf' if data_path.suffix.lower().startswith('.egf') else 'eeg'
+    channel_pattern = re.compile(r'^\.{}(\d*)$'.format(kind), re.IGNORECASE)
 
-    raw_data, Fs = ReadEEG(str(data_path))
+    channels = []
+    for path in data_path.parent.iterdir():
+        match = channel_pattern.match(path.suffix)
+        if match and path.stem == data_path.stem:
+            channels.append((int(match.group(1) or 1), path))
+
+    return [path for _, path in sorted(channels)]
 
-    if set_path and set_path.exists() and not args.skip_bits2uv:
-        try:
-            raw_data, _ = bits2uV(raw_data, str(data_path), str(set_path))
-        except TintException as exc:
-            if not args.skip_bits2uv:
-                raise
-            if args.verbose:
-                print('  Warning: Proceeding without bits->uV conversion: {}'.format(exc))
 
+def _detection_params(data_path: Path, args: argparse.Namespace):
+    """The hilbert_detect_events parameters of the hilbert-batch arguments (saved as the settings)."""
     min_freq_default, max_freq_default = _default_freqs(data_path, args.max_freq)
     min_freq = args.min_freq if args.min_freq is not None else min_freq_default
     max_freq = args.max_freq if args.max_freq is not None else max_freq_default
 
     peak_sd = None if args.no_required_peak_threshold else float(args.required_peak_threshold_sd)
 
-    params = {
+    return {
         'epoch': float(args.epoch_sec),
         'sd_num': float(args.threshold_sd),
         'min_duration': float(args.min_duration_ms),
@@ -109,17 +160,57 @@ def _process_single_file(data_path: Path, set_path: Optional[Path], args: argpar
         'verbose': args.verbose,
     }
 
-    events = hilbert_detect_events(np.asarray(raw_data, dtype=float), Fs, **params)
+
+def _run_params(data_path: Path, args: argparse.Namespace):
+    """Every hilbert-batch argument that changes the files written for a data file, hashed in the run manifest."""
+    params = _detection_params(data_path, args)
+    params.pop('verbose')
+    params.update(precision=args.precision, chunk_sec=args.chunk_sec, all_channels=args.all_channels,
+                  skip_bits2uv=args.skip_bits2uv, validate_precision=args.validate_precision, output=args.output,
+                  db=args.db)
+    return params
+
+
+def _manifest_inputs(data_path: Path, set_path: Optional[Path], args: argparse.Namespace):
+    """The input files of a data file whose size and mtime are recorded in the run manifest."""
+    inputs = _find_session_channels(data_path) if args.all_channels else [data_path]
+    return inputs + ([set_path] if set_path else [])
+
+
+def _manifest_path(input_dir: Path, args: argparse.Namespace):
+    """--manifest, or hilbert_batch_manifest.jsonl next to the output (the --output directory or
+    <input dir>/HFOScores)."""
+    if args.manifest:
+        return Path(args.manifest).expanduser()
+    if args.output:
+        return Path(args.output).expanduser().parent / 'hilbert_batch_manifest.jsonl'
+    return input_dir / 'HFOScores' / 'hilbert_batch_manifest.jsonl'
+
+
+def _save_scores(events, params, data_path: Path, set_path: Optional[Path], args: argparse.Namespace,
+                 channel: Optional[str] = None, outputs: Optional[list] = None, detections: Optional[list] = None):
+    """Save the events (and the settings they were detected with) like the Score window, returns the scores path.
+
+    The paths of the files written are appended to outputs (e.g. for the run manifest) and the events with their
+    session, channel and settings to detections (for the --db event store) if they are given.
+    """
+    import numpy as np
+    import pandas as pd
 
     out_path = Path(args.output).expanduser() if args.output else None
     scores_path, settings_path = _build_output_paths(
         data_path,
         set_path if set_path and set_path.exists() else None,
         out_path,
+        channel=channel,
     )
 
+    settings = dict(params)
+    if args.precision != 'double':
+        settings['precision'] = args.precision
+
     with open(str(settings_path), 'w', encoding='utf-8') as f:
-        json.dump(params, f, indent=2)
+        json.dump(settings, f, indent=2)
 
     df = pd.DataFrame({
         'ID#:': ['HIL{}'.format(idx + 1) for idx in range(len(events))],
@@ -130,14 +221,246 @@ def _process_single_file(data_path: Path, set_path: Optional[Path], args: argpar
 
     df.to_csv(str(scores_path), sep='\t', index=False)
 
+    if outputs is not None:
+        outputs += [scores_path, settings_path]
+
+    if detections is not None:
+        detections.append({
+            'session': set_path.stem if set_path and set_path.exists() else data_path.stem,
+            'channel': channel or data_path.suffix[1:],
+            'data_file': str(data_path),
+            'events': np.asarray(events, dtype=float).reshape(-1, 2),
+            # verbose doesn't change the events, runs with and without it share the parameter set
+            'settings': {key: value for key, value in settings.items() if key != 'verbose'},
+        })
+
     if args.verbose:
         print('  Saved settings -> {}'.format(settings_path))
 
     print('  Detected {} events; saved scores -> {}'.format(len(events), scores_path))
+
+    return scores_path
+
+
+def _process_session_channels(data_paths, set_path: Optional[Path], args: argparse.Namespace, profile=None,
+                              outputs: Optional[list] = None, detections: Optional[list] = None):
+    """Process all the channels of a session at once with the multi-channel Hilbert detection, saves the scores of
+    each channel and the cross-channel co-occurrence table.
+
+    Returns:
+        int: Number of events detected over all the channels (for summary reporting).
+    """
+    import numpy as np
+    from .core.hilbert_detection import hilbert_detect_events_multichannel, event_cooccurrence
+    from .core.Tint_Matlab import ReadEEG, bits2uV
+
+    if args.verbose:
+        print('\nProcessing {} channels: {}'.format(len(data_paths), ', '.join(path.name for path in data_paths)))
+
+    dtype = np.float32 if args.precision == 'single' else None
+
+    channel_data = []
+    channel_Fs = set()
+    for data_path in data_paths:
+        with profile_stage(profile, 'ReadEEG') as stage:
+            raw_data, Fs = ReadEEG(str(data_path), dtype=dtype)
+            stage['samples'] = len(raw_data)
+
+        if set_path and set_path.exists() and not args.skip_bits2uv:
+            with profile_stage(profile, 'bits2uV', len(raw_data)):
+                raw_data, _ = bits2uV(raw_data, str(data_path), str(set_path), dtype=dtype)
+
+        channel_data.append(np.asarray(raw_data, dtype=dtype or float))
+        channel_Fs.add(Fs)
+
+    if len(channel_Fs) != 1 or len({len(data) for data in channel_data}) != 1:
+        raise ValueError('The channels of {} do not have the same sample rate and length'.format(data_paths[0].stem))
+
+    params = _detection_params(data_paths[0], args)
+
+    with profile_stage(profile, 'multi-channel detection', len(channel_data) * len(channel_data[0])):
+        channel_events = hilbert_detect_events_multichannel(np.vstack(channel_data), Fs, dtype=dtype, **params)
+    channel_data = None
+
+    channel_names = [data_path.suffix[1:] for data_path in data_paths]
+
+    with profile_stage(profile, 'save scores'):
+        for data_path, channel, events in zip(data_paths, channel_names, channel_events):
+            _save_scores(events, params, data_path, set_path, args, channel=channel, outputs=outputs,
+                         detections=detections)
+
+    session_scores_path, _ = _build_output_paths(data_paths[0], set_path if set_path and set_path.exists() else None,
+                                                 Path(args.output).expanduser() if args.output else None)
+
+    cooccurrence = event_cooccurrence(channel_events, channel_names=channel_names)
+    cooccurrence_path = session_scores_path.with_name('{}_cooccurrence.txt'.format(session_scores_path.stem))
+    cooccurrence.to_csv(str(cooccurrence_path), sep='\t', index_label='Channel')
+    if outputs is not None:
+        outputs.append(cooccurrence_path)
+
+    print('  Saved channel co-occurrence -> {}'.format(cooccurrence_path))
+
+    if profile is not None and args.profile:
+        _save_profile(profile, session_scores_path)
+
+    return int(sum(len(events) for events in channel_events))
+
+
+def _save_profile(profile, scores_path: Path):
+    """Save the stage profile of a file next to its scores, as <scores>_profile.json."""
+    profile_path = scores_path.with_name('{}_profile.json'.format(scores_path.stem))
+    with open(str(profile_path), 'w', encoding='utf-8') as f:
+        json.dump(profile.as_dict(), f, indent=2)
+
+    print('  Saved profile -> {}'.format(profile_path))
+
+
+def _print_profile(profile):
+    print('{:<26} {:>6} {:>10} {:>14} {:>12}'.format('Stage', 'Calls', 'Time (s)', 'Samples', 'Peak (MB)'))
+    for stage in profile['stages']:
+        print('{:<26} {:>6} {:>10.3f} {:>14} {:>12.1f}'.format(stage['name'], stage['calls'], stage['wall_time_s'],
+                                                               stage['samples'],
+                                                               stage['peak_allocated_bytes'] / 1e6))
+
+
+def _process_single_file(data_path: Path, set_path: Optional[Path], args: argparse.Namespace, profile=None,
+                         outputs: Optional[list] = None, detections: Optional[list] = None):
+    """Process a single data file with Hilbert detection.
+    
+    Returns:
+        int: Number of events detected (for summary reporting).
+    """
+    import numpy as np
+    from .core.hilbert_detection import hilbert_detect_events, hilbert_detect_events_streaming, \
+        hilbert_precision_report
+    from .core.Tint_Matlab import ReadEEG, TintLFPFile, bits2uV, TintException
+
+    if args.verbose:
+        print('\nProcessing: {}'.format(data_path))
+
+    # single precision halves the memory of the whole detection, the raw samples are converted as they are read
+    dtype = np.float32 if args.precision == 'single' else None
+
+    with profile_stage(profile, 'ReadEEG') as stage:
+        if args.chunk_sec:
+            # the chunks are read from the memmap of the file as they are streamed
+            lfp_file = TintLFPFile(data_path, set_path)
+            raw_data, Fs = lfp_file.data, lfp_file.Fs
+        else:
+            raw_data, Fs = ReadEEG(str(data_path), dtype=dtype)
+        stage['samples'] = len(raw_data)
+    scalar = 1
+
+    if set_path and set_path.exists() and not args.skip_bits2uv:
+        try:
+            with profile_stage(profile, 'bits2uV', 0 if args.chunk_sec else len(raw_data)):
+                if args.chunk_sec:
+                    # only the scalar is needed, the chunks are converted as they are streamed
+                    scalar = lfp_file.scalar
+                else:
+                    raw_data, _ = bits2uV(raw_data, str(data_path), str(set_path), dtype=dtype)
+        except TintException as exc:
+            if not args.skip_bits2uv:
+                raise
+            if args.verbose:
+                print('  Warning: Proceeding without bits->uV conversion: {}'.format(exc))
+
+    params = _detection_params(data_path, args)
+
+    if args.chunk_sec:
+        params['chunk_sec'] = float(args.chunk_sec)
+        with profile_stage(profile, 'streaming detection', len(raw_data)):
+            events = hilbert_detect_events_streaming(raw_data, Fs, scalar=scalar, dtype=dtype, **params)
+    else:
+        # the epoch workers only change how the epochs are evaluated, not the events, so they aren't saved
+        epoch_workers = args.epoch_workers if args.epoch_workers > 0 else (os.cpu_count() or 1)
+        events = hilbert_detect_events(np.asarray(raw_data, dtype=dtype or float), Fs, epoch_workers=epoch_workers,
+                                       epoch_executor=args.epoch_executor, dtype=dtype, profile=profile, **params)
+
+    with profile_stage(profile, 'save scores', len(events)):
+        scores_path = _save_scores(events, params, data_path, set_path, args, outputs=outputs,
+                                   detections=detections)
+
+    if profile is not None and args.profile:
+        _save_profile(profile, scores_path)
+
+    if args.validate_precision:
+        # not with --chunk-sec (rejected by the commands), the whole recording is compared in float64
+        report_params = {key: value for key, value in params.items() if key != 'verbose'}
+        report = hilbert_precision_report(np.multiply(raw_data, scalar, dtype=float), Fs, dtype=np.float32,
+                                          **report_params)
+
+        report_path = scores_path.with_name('{}_precision.json'.format(scores_path.stem))
+        with open(str(report_path), 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        if outputs is not None:
+            outputs.append(report_path)
+
+        print('  float32 vs float64: {} / {} events matched, boundaries moved by at most {:.3f} ms; '
+              'saved report -> {}'.format(report['matched_events'], report['reference_events'],
+                                          max(report['start_shift_max_ms'], report['stop_shift_max_ms']),
+                                          report_path))
     
     return len(events)
 
 
+def _add_detection_arguments(parser: argparse.ArgumentParser):
+    """The detection, output and worker arguments shared by hilbert-batch and hilbert-watch."""
+    parser.add_argument('-o', '--output', help='Output directory; scores saved as <session>.txt, defaults to HFOScores/<session>/<session>_HIL.txt')
+    parser.add_argument('--epoch-sec', type=float, default=5 * 60, help='Epoch length in seconds (default: 300)')
+    parser.add_argument('--threshold-sd', type=float, default=3.0,
+                        help='Envelope threshold in SD above mean (default: 3)')
+    parser.add_argument('--min-duration-ms', type=float, default=10.0, help='Minimum event duration in ms (default: 10)')
+    parser.add_argument('--min-freq', type=float, help='Minimum bandpass frequency (Hz). Default 80 Hz')
+    parser.add_argument('--max-freq', type=float, help='Maximum bandpass frequency (Hz). Default 125 Hz for EEG, 500 Hz for EGF')
+    parser.add_argument('--required-peaks', type=int, default=6,
+                        help='Minimum peak count inside rectified signal (default: 6)')
+    parser.add_argument('--required-peak-threshold-sd', type=float, default=2.0,
+                        help='Peak threshold in SD above mean (default: 2). Use --no-required-peak-threshold to disable')
+    parser.add_argument('--no-required-peak-threshold', action='store_true',
+                        help='Disable the peak-threshold SD check')
+    parser.add_argument('--boundary-percent', type=float, default=30.0,
+                        help='Percent of threshold to find boundaries (default: 30)')
+    parser.add_argument('--skip-bits2uv', action='store_true',
+                        help='Skip bits-to-uV conversion if the .set file is missing')
+    parser.add_argument('--chunk-sec', type=float,
+                        help='Stream the detection in chunks of this many seconds to bound the memory use '
+                             '(default: process the whole recording at once)')
+    parser.add_argument('--all-channels', action='store_true',
+                        help='Detect on every channel of the session (.egf, .egf2, ... or .eeg, .eeg2, ...) at once, '
+                             'saving the scores of each channel and a cross-channel co-occurrence table')
+    parser.add_argument('--epoch-workers', type=int, default=1,
+                        help='Number of workers evaluating the epochs in parallel, 0 uses every CPU (default: 1)')
+    parser.add_argument('--epoch-executor', choices=['thread', 'process'], default='thread',
+                        help='Evaluate the epochs with a thread or a process pool (default: thread)')
+    parser.add_argument('--precision', choices=['double', 'single'], default='double',
+                        help='Run the detection in float64 (double) or float32/complex64 (single), single halves '
+                             'the memory (default: double)')
+    parser.add_argument('--validate-precision', action='store_true',
+                        help='Also run the detection in both precisions and save a report of how far the events '
+                             'move in float32 (<scores>_precision.json)')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='Number of files processed in parallel worker processes, 0 uses every CPU '
+                             '(default: 1)')
+    parser.add_argument('--manifest',
+                        help='Run manifest (JSON lines) recording the inputs, parameters, outputs and status of each '
+                             'file of a directory, so that a rerun skips the unchanged files (default: '
+                             'hilbert_batch_manifest.jsonl in the output directory or <directory>/HFOScores)')
+    parser.add_argument('--db',
+                        help='Also store the events in this SQLite database (the settings of each parameter set '
+                             'once, the events indexed by session and time), the scores files are still written')
+    parser.add_argument('--profile', action='store_true',
+                        help='Record the wall time, samples and peak allocated memory of each stage, saved per file '
+                             'as <scores>_profile.json and summed in the batch summary')
+    parser.add_argument('--metrics-out',
+                        help='Append a JSON lines metrics feed to this file: a record per file (wall time, samples/s, '
+                             'bytes read, events, peak RSS, error) and per stage, and a periodic heartbeat with the '
+                             'overall throughput and ETA')
+    parser.add_argument('--metrics-interval', type=float, default=30.0,
+                        help='Seconds between the --metrics-out heartbeats (default: 30)')
+    parser.add_argument('-v', '--verbose', action='store_true', help='Verbose progress logging')
+
+
 def build_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser(description='hfoGUI command-line utilities')
     sub = parser.add_subparsers(dest='command')
@@ -145,30 +468,501 @@ def build_parser() -> argparse.ArgumentParser:
     hilbert = sub.add_parser('hilbert-batch', help='Run Hilbert-based automatic detection headlessly')
     hilbert.add_argument('-f', '--file', required=True, help='Path to .eeg/.egf file or directory to process recursively')
     hilbert.add_argument('-s', '--set-file', help='Optional .set file or directory; defaults to sibling of the data file')
-    hilbert.add_argument('-o', '--output', help='Output directory; scores saved as <session>.txt, defaults to HFOScores/<session>/<session>_HIL.txt')
-    hilbert.add_argument('--epoch-sec', type=float, default=5 * 60, help='Epoch length in seconds (default: 300)')
-    hilbert.add_argument('--threshold-sd', type=float, default=3.0,
-                         help='Envelope threshold in SD above mean (default: 3)')
-    hilbert.add_argument('--min-duration-ms', type=float, default=10.0, help='Minimum event duration in ms (default: 10)')
-    hilbert.add_argument('--min-freq', type=float, help='Minimum bandpass frequency (Hz). Default 80 Hz')
-    hilbert.add_argument('--max-freq', type=float, help='Maximum bandpass frequency (Hz). Default 125 Hz for EEG, 500 Hz for EGF')
-    hilbert.add_argument('--required-peaks', type=int, default=6,
-                         help='Minimum peak count inside rectified signal (default: 6)')
-    hilbert.add_argument('--required-peak-threshold-sd', type=float, default=2.0,
-                         help='Peak threshold in SD above mean (default: 2). Use --no-required-peak-threshold to disable')
-    hilbert.add_argument('--no-required-peak-threshold', action='store_true',
-                         help='Disable the peak-threshold SD check')
-    hilbert.add_argument('--boundary-percent', type=float, default=30.0,
-                         help='Percent of threshold to find boundaries (default: 30)')
-    hilbert.add_argument('--skip-bits2uv', action='store_true',
-                         help='Skip bits-to-uV conversion if the .set file is missing')
-    hilbert.add_argument('-v', '--verbose', action='store_true', help='Verbose progress logging')
+    _add_detection_arguments(hilbert)
+    hilbert.add_argument('--max-memory',
+                         help='Memory budget of the --jobs workers, e.g. 16G: the recordings run largest first and a '
+                              'recording only starts when the predicted peak memory of the running ones (from the '
+                              'file headers, corrected with the measured RSS) leaves room for it')
+    hilbert.add_argument('--queue', metavar='DIR',
+                         help='Work queue directory shared by several hosts (e.g. on the NAS): the files of the '
+                              'directory are queued there, and every hilbert-batch --queue process (on any host) '
+                              'claims and processes them until the queue is empty')
+    hilbert.add_argument('--stale-sec', type=float, default=300.0,
+                         help='Seconds without a heartbeat after which a --queue claim is given to another worker '
+                              '(default: 300)')
+    hilbert.add_argument('--force', action='store_true',
+                         help='Reprocess every file of a directory batch, even if the manifest has it up to date')
+
+    watch = sub.add_parser('hilbert-watch',
+                           help='Watch a directory tree and run the Hilbert-based detection on each recording once '
+                                'it is complete')
+    watch.add_argument('-d', '--directory', required=True, help='Directory to watch recursively')
+    watch.add_argument('--poll-sec', type=float, default=30.0,
+                       help='Seconds between scans of the directory (default: 30)')
+    watch.add_argument('--settle-sec', type=float, default=30.0,
+                       help='Seconds a recording with a data_end marker must stay unmodified before it is processed '
+                            '(default: 30)')
+    watch.add_argument('--once', action='store_true',
+                       help='Scan once, process the complete recordings and exit (e.g. from cron)')
+    _add_detection_arguments(watch)
+
+    sweep = sub.add_parser('hilbert-sweep',
+                           help='Run the Hilbert-based detection over a grid of threshold parameters, filtering once')
+    sweep.add_argument('-f', '--file', required=True, help='Path to the .eeg/.egf file')
+    sweep.add_argument('-s', '--set-file', help='Optional .set file; defaults to sibling of the data file')
+    sweep.add_argument('-o', '--output', help='Output table (tab separated), defaults to '
+                                              'HFOScores/<session>/<session>_HIL_sweep.txt')
+    sweep.add_argument('--epoch-sec', type=float, default=5 * 60, help='Epoch length in seconds (default: 300)')
+    sweep.add_argument('--min-freq', type=float, help='Minimum bandpass frequency (Hz). Default 80 Hz')
+    sweep.add_argument('--max-freq', type=float, help='Maximum bandpass frequency (Hz). Default 125 Hz for EEG, 500 Hz for EGF')
+    sweep.add_argument('--band', type=float, nargs=2, action='append', metavar=('MIN_FREQ', 'MAX_FREQ'),
+                       help='Sweep this frequency band (Hz) instead of --min-freq/--max-freq, repeat it to sweep '
+                            'several bands of the session (read once and shared with the --jobs workers)')
+    sweep.add_argument('--threshold-sd', type=float, nargs='+', default=[3.0],
+                       help='Envelope thresholds in SD above mean (default: 3)')
+    sweep.add_argument('--min-duration-ms', type=float, nargs='+', default=[10.0],
+                       help='Minimum event durations in ms (default: 10)')
+    sweep.add_argument('--required-peaks', type=int, nargs='+', default=[6],
+                       help='Minimum peak counts inside rectified signal (default: 6)')
+    sweep.add_argument('--required-peak-threshold-sd', type=_peak_threshold_sd, nargs='+', default=[2.0],
+                       help='Peak thresholds in SD above mean, "none" disables the peak-threshold check (default: 2)')
+    sweep.add_argument('--boundary-percent', type=float, nargs='+', default=[30.0],
+                       help='Percents of threshold to find boundaries (default: 30)')
+    sweep.add_argument('--skip-bits2uv', action='store_true',
+                       help='Skip bits-to-uV conversion if the .set file is missing')
+    sweep.add_argument('--precision', choices=['double', 'single'], default='double',
+                       help='Run the detection in float64 (double) or float32/complex64 (single) (default: double)')
+    sweep.add_argument('-j', '--jobs', type=int, default=1,
+                       help='Worker processes sweeping the --band bands in parallel, 0 for one per CPU (default: 1)')
+    sweep.add_argument('-v', '--verbose', action='store_true', help='Verbose progress logging')
+
+    convert = sub.add_parser('intan-convert',
+                             help='Convert Intan .rhd recordings to Tint .set + .egf/.eeg files headlessly')
+    convert.add_argument('-f', '--file', required=True, nargs='+',
+                         help='.rhd files or directories to search recursively, the related files of a session are '
+                              'converted together')
+    convert.add_argument('--channels', nargs='+',
+                         help='Amplifier channels to convert, e.g. A-000 A-001 (default: every amplifier channel)')
+    convert.add_argument('-o', '--output', help='Directory for the session folders, defaults to next to each .rhd')
+    convert.add_argument('-j', '--jobs', type=int, default=0,
+                         help='Worker processes converting the channels of a session in parallel, 0 for one per CPU '
+                              '(default: 0)')
 
     return parser
 
 
+def _peak_threshold_sd(value):
+    if value.lower() == 'none':
+        return None
+    return float(value)
+
+
+def _sweep_band(raw_data, Fs, band_sweep):
+    """Sweeps one frequency band of a session in a map_session worker, band_sweep is (min_freq, max_freq, the
+    hilbert_sweep keyword arguments)."""
+    from .core.hilbert_detection import hilbert_sweep
+
+    min_freq, max_freq, sweep_params = band_sweep
+    results = hilbert_sweep(raw_data, Fs, min_freq=min_freq, max_freq=max_freq, **sweep_params)
+    results.insert(0, 'max_freq', max_freq)
+    results.insert(0, 'min_freq', min_freq)
+    return results
+
+
+def run_hilbert_sweep(args: argparse.Namespace):
+    import numpy as np
+    import pandas as pd
+    from .core.shared_session import SharedSession, map_session
+
+    data_path = Path(args.file).expanduser()
+    if not data_path.exists():
+        raise FileNotFoundError('Data file not found: {}'.format(data_path))
+
+    set_path = Path(args.set_file).expanduser() if args.set_file else data_path.with_suffix('.set')
+    if not set_path.exists() and not args.skip_bits2uv:
+        raise FileNotFoundError('Set file not found: {} (pass --skip-bits2uv to continue without scaling)'.format(set_path))
+
+    dtype = np.float32 if args.precision == 'single' else None
+
+    if args.band:
+        bands = [(float(min_freq), float(max_freq)) for min_freq, max_freq in args.band]
+    else:
+        min_freq_default, max_freq_default = _default_freqs(data_path, args.max_freq)
+        bands = [(float(args.min_freq if args.min_freq is not None else min_freq_default),
+                  float(args.max_freq if args.max_freq is not None else max_freq_default))]
+
+    sweep_params = dict(
+        epoch=float(args.epoch_sec),
+        sd_num=args.threshold_sd,
+        min_duration=args.min_duration_ms,
+        required_peak_number=args.required_peaks,
+        required_peak_sd=args.required_peak_threshold_sd,
+        boundary_fraction=[percent / 100.0 for percent in args.boundary_percent],
+        dtype=dtype,
+        verbose=args.verbose,
+    )
+
+    workers = min(args.jobs if args.jobs > 0 else (os.cpu_count() or 1), len(bands))
+    threads = _pinned_threads(max((os.cpu_count() or 1) // workers, 1)) if workers > 1 else contextlib.nullcontext()
+
+    # the session is read and converted to µV once, the band sweeps attach to the same shared array
+    with SharedSession(data_path, set_path if set_path.exists() else None, dtype=dtype) as session, threads:
+        band_results = map_session(_sweep_band, session, [(min_freq, max_freq, sweep_params)
+                                                          for min_freq, max_freq in bands], workers=workers)
+
+    if args.band:
+        results = pd.concat(band_results, ignore_index=True)
+    else:
+        # a single band keeps the table of the earlier versions
+        results = band_results[0].drop(columns=['min_freq', 'max_freq'])
+
+    if args.output:
+        sweep_path = Path(args.output).expanduser()
+        sweep_path.parent.mkdir(parents=True, exist_ok=True)
+    else:
+        scores_path, _ = _build_output_paths(data_path, set_path if set_path.exists() else None, None)
+        sweep_path = scores_path.with_name('{}_sweep.txt'.format(scores_path.stem))
+
+    results.to_csv(str(sweep_path), sep='\t', index=False)
+
+    print('Evaluated {} parameter sets; saved sweep -> {}'.format(len(results), sweep_path))
+
+    return results
+
+
+def _find_rhd_sessions(inputs):
+    """The .rhd files of the inputs (files or directories searched recursively), one per session: the related files
+    of a session (find_related_rhd_files) are converted together."""
+    from .intan_rhd_format import find_related_rhd_files
+
+    rhd_files = []
+    for input_path in inputs:
+        input_path = Path(input_path).expanduser()
+        if input_path.is_dir():
+            rhd_files.extend(sorted(path for path in input_path.rglob('*') if path.suffix.lower() == '.rhd'))
+        elif input_path.exists():
+            rhd_files.append(input_path)
+        else:
+            raise FileNotFoundError('RHD file not found: {}'.format(input_path))
+
+    sessions = []
+    grouped = set()
+    for rhd_file in rhd_files:
+        if str(rhd_file) in grouped:
+            continue
+        related_files = find_related_rhd_files(str(rhd_file))
+        grouped.update(related_files)
+        sessions.append(rhd_file)
+
+    return sessions
+
+
+def run_intan_convert(args: argparse.Namespace):
+    from .intan_rhd_format import convert_session, session_name_of
+
+    sessions = _find_rhd_sessions(args.file)
+    if not sessions:
+        print('No .rhd files found')
+        return
+
+    jobs = args.jobs if args.jobs > 0 else (os.cpu_count() or 1)
+    print('Converting {} session(s) with {} worker process(es)'.format(len(sessions), jobs))
+
+    results = []
+    file_errors = []
+    for rhd_file in sessions:
+        output_dir = str(Path(args.output).expanduser() / session_name_of(str(rhd_file))) if args.output else None
+        try:
+            with _pinned_threads(max((os.cpu_count() or 1) // jobs, 1)) if jobs > 1 else contextlib.nullcontext():
+                result = convert_session(str(rhd_file), channels=args.channels, workers=jobs, output_dir=output_dir)
+        except Exception as e:
+            print('  Error converting {}: {}'.format(rhd_file, e))
+            file_errors.append((rhd_file, e))
+            continue
+
+        results.append(result)
+        print('  {}: {} channel(s), {:.1f} M samples, read {:.1f} s, converted in {:.1f} s ({:.1f} M samples/s) -> {}'
+              .format(result['session'], len(result['channels']), result['samples'] / 1e6, result['read_sec'],
+                      result['convert_sec'], result['samples'] / max(result['convert_sec'], 1e-9) / 1e6,
+                      result['output_dir']))
+
+    print('\n' + '='*60)
+    print('INTAN CONVERSION SUMMARY')
+    print('='*60)
+    print('Sessions converted:     {}'.format(len(results)))
+    print('Failed:                 {}'.format(len(file_errors)))
+    print('Channels written:       {}'.format(sum(len(result['channels']) for result in results)))
+    print('='*60)
+
+    if file_errors:
+        print('\nFailed sessions:')
+        for rhd_file, error in file_errors:
+            print('  {}: {}'.format(rhd_file, error))
+
+    return results
+
+
+def _process_data_file(data_path: Path, set_path: Optional[Path], args: argparse.Namespace, profile=None,
+                       outputs: Optional[list] = None, detections: Optional[list] = None):
+    if args.all_channels:
+        return _process_session_channels(_find_session_channels(data_path), set_path, args, profile=profile,
+                                         outputs=outputs, detections=detections)
+
+    return _process_single_file(data_path, set_path, args, profile=profile, outputs=outputs, detections=detections)
+
+
+def _process_batch_file(data_path: Path, set_path: Optional[Path], args: argparse.Namespace):
+    """Processes one file of a directory batch. Runs in the --jobs worker processes, so everything it returns is
+    picklable and the main process writes the manifest and the database.
+
+    Returns:
+        dict: the event count ('events'), the profile dictionary ('profile', None without --profile or
+        --metrics-out), the paths of the files written ('outputs'), the detections for the --db event store
+        ('detections', None without --db), the peak RSS of the file above the worker's baseline ('peak_rss_bytes',
+        None where it can't be measured) and the wall time ('wall_sec').
+    """
+    # the first file of a worker imports the detection modules, outside of the measured peak of the file
+    from .core import hilbert_detection, Tint_Matlab  # noqa: F401
+
+    # the metrics only need the stage times, tracemalloc (which slows the detection down) is left to --profile
+    profile = StageProfile(trace_memory=args.profile) if args.profile or args.metrics_out else None
+    outputs = []
+    detections = [] if args.db else None
+    start_time = time.perf_counter()
+    with PeakRSSMonitor() as rss_monitor, profile or contextlib.nullcontext():
+        event_count = _process_data_file(data_path, set_path, args, profile=profile, outputs=outputs,
+                                         detections=detections)
+
+    return {
+        'events': event_count,
+        'profile': profile.as_dict() if profile is not None else None,
+        'outputs': [str(output) for output in outputs],
+        'detections': detections,
+        'peak_rss_bytes': rss_monitor.peak_bytes,
+        'wall_sec': time.perf_counter() - start_time,
+    }
+
+
+def _open_metrics(args: argparse.Namespace, tasks=None):
+    """The --metrics-out MetricsStream of a run (None without --metrics-out), started. The total of the tasks
+    ((data_path, set_path) pairs, None when unknown) gives the heartbeats an ETA."""
+    if not args.metrics_out:
+        return None
+
+    from .core.metrics import MetricsStream
+
+    bytes_total = None
+    if tasks is not None:
+        bytes_total = sum(_input_bytes(data_path, set_path, args) for data_path, set_path in tasks)
+
+    metrics = MetricsStream(Path(args.metrics_out).expanduser(), interval_sec=args.metrics_interval,
+                            files_total=len(tasks) if tasks is not None else None, bytes_total=bytes_total)
+    metrics.start(command=args.command, params={key: value for key, value in vars(args).items()
+                                                if key not in ['verbose']})
+    return metrics
+
+
+def _input_bytes(data_path: Path, set_path: Optional[Path], args: argparse.Namespace):
+    """The bytes a file reads (its data files and .set file)."""
+    total = 0
+    for path in _manifest_inputs(data_path, set_path, args):
+        try:
+            total += path.stat().st_size
+        except OSError:
+            continue
+    return total
+
+
+def _record_metrics(metrics, data_path: Path, set_path: Optional[Path], args: argparse.Namespace, result=None,
+                    error=None):
+    """The file (and stage) records of a finished file, result is the dictionary of _process_batch_file."""
+    if metrics is None:
+        return
+
+    n_samples, _, n_channels = _recording_size(data_path, args)
+    bytes_read = _input_bytes(data_path, set_path, args)
+
+    if error is not None:
+        metrics.file_finished(data_path, 'failed', samples=0, bytes_read=bytes_read, error=str(error))
+        return
+
+    metrics.file_finished(data_path, 'done', wall_sec=result['wall_sec'], samples=n_samples * n_channels,
+                          bytes_read=bytes_read, events=result['events'], peak_rss_bytes=result['peak_rss_bytes'],
+                          profile=result['profile'])
+
+
+def _store_detections(store: Optional[EventStore], detections):
+    """Adds the detections of a file to the --db event store (if there is one)."""
+    if store is None or not detections:
+        return
+
+    for detection in detections:
+        store.add_detection(detection['session'], detection['channel'], detection['data_file'], detection['events'],
+                            detection['settings'])
+
+
+def _memory_model(args: argparse.Namespace):
+    from .core.memory_model import DetectionMemoryModel
+    return DetectionMemoryModel(precision=args.precision, chunk_sec=args.chunk_sec,
+                                validate_precision=args.validate_precision, min_freq=args.min_freq,
+                                max_freq=args.max_freq)
+
+
+def _recording_size(data_path: Path, args: argparse.Namespace):
+    """(samples per channel, Fs, channels) of a data file from its header, (0, 0, 1) if the header can't be read (the
+    file fails when it is processed)."""
+    from .core.memory_model import recording_samples
+
+    n_channels = len(_find_session_channels(data_path)) if args.all_channels else 1
+    try:
+        n_samples, Fs = recording_samples(data_path)
+    except Exception:
+        return 0, 0.0, n_channels
+
+    return n_samples, Fs, n_channels
+
+
+def _iter_batch_results(tasks, args: argparse.Namespace, jobs: int = 1, max_memory: Optional[int] = None):
+    """Processes the (data_path, set_path) tasks, in a pool of jobs processes when jobs > 1, and yields
+    (data_path, result, error) in the order they complete (result is the dictionary of _process_batch_file, error is
+    None on success).
+
+    The pool runs the largest recordings (read from their headers) first, and with max_memory (bytes) only starts a
+    recording when the predicted peak memory of the running ones plus its own fits in the budget. A recording that
+    doesn't fit on its own runs alone. The prediction is corrected with the peak RSS measured on every file.
+    """
+    if jobs <= 1 or len(tasks) <= 1:
+        for data_path, set_path in tasks:
+            try:
+                yield data_path, _process_batch_file(data_path, set_path, args), None
+            except Exception as e:
+                yield data_path, None, e
+        return
+
+    memory_model = _memory_model(args)
+    sizes = {data_path: _recording_size(data_path, args) for data_path, _ in tasks}
+    pending = sorted(tasks, key=lambda task: sizes[task[0]][0] * sizes[task[0]][2], reverse=True)
+
+    with _worker_pool(min(jobs, len(tasks))) as executor:
+        running = {}
+
+        while pending or running:
+            used_memory = sum(memory_model.estimate(*sizes[data_path]) for data_path, _ in running.values())
+
+            for task in list(pending):
+                if len(running) >= jobs:
+                    break
+
+                required_memory = memory_model.estimate(*sizes[task[0]])
+                if max_memory is not None and running and used_memory + required_memory > max_memory:
+                    # a smaller recording further down the list may still fit
+                    continue
+
+                if max_memory is not None and required_memory > max_memory:
+                    print('  {} needs ~{:.0f} MB, more than --max-memory, running it alone'.format(
+                        task[0], required_memory / 1e6))
+
+                pending.remove(task)
+                running[executor.submit(_process_batch_file, task[0], task[1], args)] = task
+                used_memory += required_memory
+
+            done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+            for future in done:
+                data_path, _ = running.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    yield data_path, None, e
+                    continue
+
+                n_samples, Fs, n_channels = sizes[data_path]
+                memory_model.observe(n_samples, Fs, result['peak_rss_bytes'], n_channels=n_channels)
+                if args.verbose and result['peak_rss_bytes'] is not None:
+                    print('  {}: peak {:.0f} MB (predicted {:.0f} MB)'.format(
+                        data_path.name, result['peak_rss_bytes'] / 1e6,
+                        memory_model.base_estimate(n_samples, Fs, n_channels) / 1e6))
+
+                yield data_path, result, None
+
+
+def _queue_worker(queue_dir: Path, args: argparse.Namespace):
+    """Claims and processes the items of a --queue work queue until none is pending or claimed, recording them in
+    the shard of this process of the queue manifest. Runs in the --jobs worker processes (or in the main process),
+    any number of them on any number of hosts.
+
+    Returns:
+        list: (data_path, result, error) of the files this process finished, as yielded by _iter_batch_results.
+    """
+    from .core.work_queue import WorkQueue
+
+    queue = WorkQueue(queue_dir, stale_sec=args.stale_sec)
+    manifest = ShardedRunManifest(queue_dir / 'manifest', queue.worker_id)
+
+    finished = []
+    while True:
+        for claim_name in queue.reclaim_stale():
+            print('  Reclaimed the stale claim {}'.format(claim_name))
+
+        claimed = queue.claim()
+        if claimed is None:
+            # the claims of the other workers are reclaimed if they stop their heartbeat, so wait for them
+            if queue.counts()['claimed'] == 0:
+                return finished
+            time.sleep(min(5.0, args.stale_sec / 4.0))
+            continue
+
+        claim_name, item = claimed
+        data_path = Path(item['data_file'])
+        set_path = Path(item['set_file']) if item['set_file'] else None
+        manifest_inputs = _manifest_inputs(data_path, set_path, args)
+        run_params_hash = params_hash(_run_params(data_path, args))
+
+        try:
+            with queue.heartbeat(claim_name):
+                result = _process_batch_file(data_path, set_path, args)
+        except Exception as e:
+            manifest.record(data_path, manifest_inputs, run_params_hash, 'failed', error=str(e))
+            queue.finish(claim_name, 'failed')
+            finished.append((data_path, None, e))
+            continue
+
+        manifest.record(data_path, manifest_inputs, run_params_hash, 'done', outputs=result['outputs'],
+                        events=result['events'])
+        queue.finish(claim_name, 'done')
+        print('  Finished {} ({}): {} events'.format(data_path, queue.worker_id, result['events']))
+        finished.append((data_path, result, None))
+
+
+def _iter_queue_results(queue_dir: Path, tasks, args: argparse.Namespace, jobs: int = 1):
+    """Queues the tasks in the --queue work queue and works on the queue with jobs processes (along with any other
+    hosts working on it) until it is empty. Yields the (data_path, result, error) of the files processed here, once
+    the queue is empty; the workers already recorded them in the queue manifest."""
+    from .core.work_queue import WorkQueue
+
+    queue = WorkQueue(queue_dir, stale_sec=args.stale_sec)
+    queued = sum(queue.enqueue({'data_file': str(data_path), 'set_file': str(set_path) if set_path else None})
+                 for data_path, set_path in tasks)
+    counts = queue.counts()
+    print('Queued {} file(s) -> {} ({} pending, {} claimed)'.format(queued, queue.directory, counts['pending'],
+                                                                    counts['claimed']))
+
+    if jobs <= 1:
+        yield from _queue_worker(queue_dir, args)
+        return
+
+    print('Working on the queue with {} worker processes'.format(jobs))
+    with _worker_pool(jobs) as executor:
+        futures = [executor.submit(_queue_worker, queue_dir, args) for _ in range(jobs)]
+        for future in as_completed(futures):
+            yield from future.result()
+
+
 def run_hilbert_batch(args: argparse.Namespace):
     input_path = Path(args.file).expanduser()
+
+    if args.all_channels and args.chunk_sec:
+        raise ValueError('--all-channels can not be combined with --chunk-sec')
+    if args.validate_precision and args.chunk_sec:
+        raise ValueError('--validate-precision can not be combined with --chunk-sec (the precision report runs the '
+                         'detection on the whole recording at once)')
+    if args.queue and args.db:
+        raise ValueError('--db can not be combined with --queue (the SQLite database can not be shared by several '
+                         'hosts), load the scores files of a --queue run instead')
+
+    max_memory = None
+    if args.max_memory:
+        from .core.memory_model import parse_memory_size
+        max_memory = parse_memory_size(args.max_memory)
     
     # Check if input is a directory
     if input_path.is_dir():
@@ -181,49 +975,124 @@ def run_hilbert_batch(args: argparse.Namespace):
         
         print('Found {} data file(s)'.format(len(data_files)))
         
+        if args.queue:
+            # the hosts of a --queue run share the manifest in the queue directory, one shard per process
+            from .core.work_queue import default_worker_id
+            manifest = ShardedRunManifest(Path(args.queue).expanduser() / 'manifest', default_worker_id())
+        else:
+            manifest = RunManifest(_manifest_path(input_path, args))
+        store = EventStore(Path(args.db).expanduser()) if args.db else None
+
         # Track summary statistics
         successful = 0
         failed = 0
+        up_to_date = 0
         total_events = 0
         file_results = []
-        
-        # Process each data file
+        file_errors = []
+        file_profiles = []
+
+        tasks = []
         for data_path in data_files:
             set_path = _find_set_file(data_path)
             if not set_path and not args.skip_bits2uv:
                 if args.verbose:
                     print('  Skipping {} (no .set file found, use --skip-bits2uv to process anyway)'.format(data_path))
                 continue
-            
-            try:
-                event_count = _process_single_file(data_path, set_path, args)
-                successful += 1
-                total_events += event_count
-                file_results.append((data_path.name, event_count))
-            except Exception as e:
-                print('  Error processing {}: {}'.format(data_path, e))
+
+            # files that finished with the same inputs and parameters in an earlier run are skipped, failures retried
+            if not args.force and manifest.is_up_to_date(data_path, _manifest_inputs(data_path, set_path, args),
+                                                         params_hash(_run_params(data_path, args))):
+                up_to_date += 1
+                if args.verbose:
+                    print('  Skipping {} (unchanged since the last run, use --force to reprocess)'.format(data_path))
+                continue
+
+            tasks.append((data_path, set_path))
+
+        if up_to_date:
+            print('{} file(s) unchanged since the last run -> {}'.format(
+                up_to_date, manifest.directory if args.queue else manifest.path))
+
+        jobs = args.jobs if args.jobs > 0 else (os.cpu_count() or 1)
+        # with --queue other hosts drain the same queue, this host doesn't know how many of the tasks it will process,
+        # so its heartbeats have no total or ETA
+        metrics = _open_metrics(args, None if args.queue else tasks)
+
+        if args.queue:
+            batch_results = _iter_queue_results(Path(args.queue).expanduser(), tasks, args, jobs)
+        else:
+            if jobs > 1 and len(tasks) > 1:
+                print('Processing with {} worker processes'.format(min(jobs, len(tasks))))
+            batch_results = _iter_batch_results(tasks, args, jobs=jobs, max_memory=max_memory)
+
+        # the files finish in any order with --jobs, the summary is sorted by path so that it is reproducible
+        set_paths = dict(tasks)
+        for data_path, result, error in batch_results:
+            manifest_inputs = _manifest_inputs(data_path, set_paths.get(data_path), args)
+            run_params_hash = params_hash(_run_params(data_path, args))
+            _record_metrics(metrics, data_path, set_paths.get(data_path), args, result=result, error=error)
+
+            if error is not None:
+                if not args.queue:
+                    manifest.record(data_path, manifest_inputs, run_params_hash, 'failed', error=str(error))
+                print('  Error processing {}: {}'.format(data_path, error))
                 failed += 1
+                file_errors.append((data_path, error))
                 if args.verbose:
-                    import traceback
-                    traceback.print_exc()
+                    traceback.print_exception(type(error), error, error.__traceback__)
                 continue
-        
+
+            event_count, profile = result['events'], result['profile']
+            if not args.queue:
+                # the events are in the database before the manifest has the file up to date
+                _store_detections(store, result['detections'])
+                manifest.record(data_path, manifest_inputs, run_params_hash, 'done', outputs=result['outputs'],
+                                events=event_count)
+            successful += 1
+            total_events += event_count
+            file_results.append((data_path, event_count))
+            if profile is not None and args.profile:
+                file_profiles.append((data_path, profile))
+
+        if store is not None:
+            store.close()
+            print('Saved the events -> {}'.format(store.path))
+
+        if metrics is not None:
+            metrics.close(total_events=total_events, files_unchanged=up_to_date)
+            print('Saved the metrics -> {}'.format(metrics.path))
+
+        file_results.sort(key=lambda file_result: file_result[0])
+        file_errors.sort(key=lambda file_error: file_error[0])
+        file_profiles.sort(key=lambda file_profile: file_profile[0])
+
         # Print summary
         print('\n' + '='*60)
         print('BATCH PROCESSING SUMMARY')
         print('='*60)
         print('Total files found:     {}'.format(len(data_files)))
         print('Successfully processed: {}'.format(successful))
+        print('Unchanged (skipped):    {}'.format(up_to_date))
         print('Failed:                 {}'.format(failed))
         print('Total HFOs detected:    {}'.format(total_events))
         if successful > 0:
             print('Average per file:       {:.1f}'.format(total_events / float(successful)))
         print('='*60)
+
+        if file_errors:
+            print('\nFailed files:')
+            for data_path, error in file_errors:
+                print('  {}: {}'.format(data_path, error))
+
+        if file_profiles:
+            print('\nStage profile (all files):')
+            _print_profile(merge_profiles([profile for _, profile in file_profiles]))
         
         if args.verbose and file_results:
             print('\nPer-file event counts:')
-            for fname, count in file_results:
-                print('  {}: {} events'.format(fname, count))
+            for data_path, count in file_results:
+                print('  {}: {} events'.format(data_path.name, count))
     
     else:
         # Single file mode
@@ -241,7 +1110,175 @@ def run_hilbert_batch(args: argparse.Namespace):
         if set_path and not set_path.exists() and not args.skip_bits2uv:
             raise FileNotFoundError('Set file not found: {} (pass --skip-bits2uv to continue without scaling)'.format(set_path))
         
-        _process_single_file(input_path, set_path, args)
+        metrics = _open_metrics(args, [(input_path, set_path)])
+        try:
+            result = _process_batch_file(input_path, set_path, args)
+        except Exception as e:
+            _record_metrics(metrics, input_path, set_path, args, error=e)
+            if metrics is not None:
+                metrics.close()
+            raise
+
+        if args.db:
+            with EventStore(Path(args.db).expanduser()) as store:
+                _store_detections(store, result['detections'])
+            print('Saved the events -> {}'.format(args.db))
+
+        if metrics is not None:
+            _record_metrics(metrics, input_path, set_path, args, result=result)
+            metrics.close(total_events=result['events'])
+            print('Saved the metrics -> {}'.format(metrics.path))
+
+        if args.profile:
+            print('\nStage profile:')
+            _print_profile(result['profile'])
+
+
+def _recording_complete(data_path: Path, settle_sec: float, previous_sizes: dict):
+    """Whether dacqUSB finished writing a recording: its data_end marker is written, its size hasn't changed since
+    the previous scan and it hasn't been modified for settle_sec seconds."""
+    try:
+        stat = data_path.stat()
+    except OSError:
+        return False
+
+    previous_size = previous_sizes.get(data_path)
+    previous_sizes[data_path] = stat.st_size
+    if previous_size is not None and previous_size != stat.st_size:
+        return False
+
+    if time.time() - stat.st_mtime < settle_sec:
+        return False
+
+    with open(str(data_path), 'rb') as f:
+        f.seek(max(stat.st_size - 64, 0))
+        return b'data_end' in f.read()
+
+
+def _scan_watch_directory(watch_dir: Path, args: argparse.Namespace, manifest: RunManifest, previous_sizes: dict,
+                          busy):
+    """The (data_path, set_path) of the complete recordings of the directory that aren't in the manifest yet (and
+    aren't queued or running, busy)."""
+    tasks = []
+    for data_path in _find_data_files(watch_dir):
+        if data_path in busy:
+            continue
+
+        set_path = _find_set_file(data_path)
+        if not set_path and not args.skip_bits2uv:
+            continue
+
+        # a recording that failed is retried once it (or the parameters) change
+        manifest_inputs = _manifest_inputs(data_path, set_path, args)
+        run_params_hash = params_hash(_run_params(data_path, args))
+        if manifest.is_up_to_date(data_path, manifest_inputs, run_params_hash) or \
+                manifest.has_failed(data_path, manifest_inputs, run_params_hash):
+            continue
+
+        data_paths = _find_session_channels(data_path) if args.all_channels else [data_path]
+        if not all(_recording_complete(path, args.settle_sec, previous_sizes) for path in data_paths):
+            continue
+
+        tasks.append((data_path, set_path))
+
+    return tasks
+
+
+def run_hilbert_watch(args: argparse.Namespace):
+    """Polls a directory tree and detects the events of each recording once it is complete.
+
+    The recordings are processed by _process_batch_file in a pool of --jobs worker processes, at most --jobs at a
+    time so the queue is never ahead of the directory, and every result is appended to the run manifest (shared with
+    hilbert-batch), so a restarted watch only processes the recordings that are new or changed.
+    """
+    watch_dir = Path(args.directory).expanduser()
+    if not watch_dir.is_dir():
+        raise FileNotFoundError('Watch directory not found: {}'.format(watch_dir))
+
+    if args.all_channels and args.chunk_sec:
+        raise ValueError('--all-channels can not be combined with --chunk-sec')
+    if args.validate_precision and args.chunk_sec:
+        raise ValueError('--validate-precision can not be combined with --chunk-sec (the precision report runs the '
+                         'detection on the whole recording at once)')
+
+    manifest = RunManifest(_manifest_path(watch_dir, args))
+    store = EventStore(Path(args.db).expanduser()) if args.db else None
+    jobs = args.jobs if args.jobs > 0 else (os.cpu_count() or 1)
+    # the recordings keep coming, the heartbeats have no ETA
+    metrics = _open_metrics(args)
+
+    print('Watching {} every {:g} s with {} worker process(es), state -> {}'.format(watch_dir, args.poll_sec, jobs,
+                                                                                   manifest.path))
+
+    previous_sizes = {}
+    queued = []
+    running = {}
+    counts = {'processed': 0, 'failed': 0}
+    scanned = False
+
+    def record_result(future):
+        data_path, set_path = running.pop(future)
+        manifest_inputs = _manifest_inputs(data_path, set_path, args)
+        run_params_hash = params_hash(_run_params(data_path, args))
+
+        try:
+            result = future.result()
+        except Exception as e:
+            _record_metrics(metrics, data_path, set_path, args, error=e)
+            print('  Error processing {}: {}'.format(data_path, e))
+            manifest.record(data_path, manifest_inputs, run_params_hash, 'failed', error=str(e))
+            counts['failed'] += 1
+            if args.verbose:
+                traceback.print_exception(type(e), e, e.__traceback__)
+            return
+
+        _record_metrics(metrics, data_path, set_path, args, result=result)
+        _store_detections(store, result['detections'])
+        manifest.record(data_path, manifest_inputs, run_params_hash, 'done', outputs=result['outputs'],
+                        events=result['events'])
+        counts['processed'] += 1
+        print('Finished {}: {} events'.format(data_path, result['events']))
+
+    with _worker_pool(jobs) as executor:
+        try:
+            while True:
+                if not (args.once and scanned):
+                    busy = {data_path for data_path, _ in queued} | {data_path for data_path, _ in running.values()}
+                    new_tasks = _scan_watch_directory(watch_dir, args, manifest, previous_sizes, busy)
+                    for data_path, _ in new_tasks:
+                        print('Queued {}'.format(data_path))
+                    queued += new_tasks
+                    scanned = True
+
+                while queued and len(running) < jobs:
+                    data_path, set_path = queued.pop(0)
+                    running[executor.submit(_process_batch_file, data_path, set_path, args)] = (data_path, set_path)
+
+                if args.once and not queued and not running:
+                    break
+
+                if running:
+                    done, _ = wait(list(running), timeout=args.poll_sec, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        record_result(future)
+                else:
+                    time.sleep(args.poll_sec)
+
+        except KeyboardInterrupt:
+            # the workers ignore Ctrl-C, the running recordings finish and are recorded, the queued ones are
+            # picked up again by the next scan after a restart
+            print('\nStopping, waiting for {} running recording(s) to finish (Ctrl-C again to abort)'.format(
+                len(running)))
+            for future in list(running):
+                wait([future])
+                record_result(future)
+
+    if store is not None:
+        store.close()
+    if metrics is not None:
+        metrics.close()
+
+    print('Processed {} recording(s), {} failed'.format(counts['processed'], counts['failed']))
 
 
-__all__ = ['build_parser', 'run_hilbert_batch']
+__all__ = ['build_parser', 'run_hilbert_batch', 'run_hilbert_sweep', 'run_hilbert_watch', 'run_intan_convert']
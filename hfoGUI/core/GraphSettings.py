@@ -1,5 +1,5 @@
 from core.GUI_Utils import Worker, find_consec, background, Communicate
-from core.Tint_Matlab import ReadEEG, get_setfile_parameter, find_unit, detect_peaks, bits2uV, getspikes, \
+from core.Tint_Matlab import TintLFPFile, SpikeIndex, get_setfile_parameter, detect_peaks, \
     TintException, getpos, remBadTrack, speed2D, centerBox
 import os, time, json, functools
 from scipy.signal import hilbert
@@ -12,6 +12,8 @@ from pyqtgraph.Qt import QtCore, QtWidgets
 import numpy as np
 from scipy import signal
 
+# windows plotted before and after the visible one, a source is only read and plotted over this span
+PLOT_MARGIN_WINDOWS = 10
 
 
 class update_plots_signal(QtCore.QObject):
@@ -48,6 +50,8 @@ class GraphSettingsWindows(QtWidgets.QWidget):
 
         self.ActiveSourceSignal = Communicate()
         self.RePlotTFSignal = Communicate()
+        self.RePlotSignal = Communicate()
+        self.RePlotSignal.myGUI_signal.connect(self.RePlot)
 
         self.profile_filename = os.path.join(main.SETTINGS_DIR, 'profiles.json')
 
@@ -340,9 +344,12 @@ class GraphSettingsWindows(QtWidgets.QWidget):
         self.selected_time = None
 
         self.plotting = False
+        self.plotted_span = None
+        self.replot_pending = False
         self.loaded_sources = {}
         self.cell_spike_time_array = []
         self.tetrode_spikes = {}
+        self.spike_index = None  # the SpikeIndex of the plotted session
         self.cell_labels = []
         self.mark_source = []
         self.source_values = []
@@ -868,6 +875,17 @@ class GraphSettingsWindows(QtWidgets.QWidget):
         session_path, set_filename = os.path.split(self.mainWindow.current_set_filename)
         session = os.path.splitext(set_filename)[0]
 
+        # only the visible window and PLOT_MARGIN_WINDOWS windows before and after it are read and plotted, scrolling
+        # out of them plots the sources again (followWindow)
+        self.replot_pending = False
+        current_time, windowsize = self.mainWindow.current_time, self.mainWindow.windowsize
+        if isinstance(current_time, (int, float)) and isinstance(windowsize, (int, float)) and windowsize > 0:
+            plot_start_ms = max(current_time - PLOT_MARGIN_WINDOWS * windowsize, 0)
+            plot_stop_ms = current_time + (PLOT_MARGIN_WINDOWS + 1) * windowsize
+        else:
+            plot_start_ms, plot_stop_ms = 0, None
+        self.plotted_span = (plot_start_ms, plot_stop_ms)
+
         iterator = QtWidgets.QTreeWidgetItemIterator(self.graphs)
 
         # define the location in the QTreeWidget where our variables are located
@@ -968,9 +986,10 @@ class GraphSettingsWindows(QtWidgets.QWidget):
 
             if '.eeg' in source_filename or '.egf' in source_filename:
                 if source_filename not in self.loaded_sources.keys():
-                    EEG, Fs = ReadEEG(source_filename)
+                    # the file is only opened (header and memmap), the samples are read when they are used
+                    lfp_file = TintLFPFile(source_filename)
                     try:
-                        EEGRaw, _ = bits2uV(EEG, source_filename)  # converting the EEG from bits to uV
+                        lfp_file.read_scalar()  # the bits to uV conversion
                     except TintException:
                         # this means there was no set file
                         self.mainWindow.choice = ''
@@ -995,21 +1014,19 @@ class GraphSettingsWindows(QtWidgets.QWidget):
                                     return
 
                             else:
-                                EEGRaw, _ = bits2uV(EEG, source_filename,
-                                                    set_fpath=set_filepath)  # converting the EEG from bits to uV
-
-                    EEG = None  # don't need this variable anymore
-
-                    # Interpolating the EEG to increase the array length by a factor of 10
+                                lfp_file = TintLFPFile(source_filename, set_filepath)
 
-                    self.loaded_sources[source_filename] = [EEGRaw, Fs]
-                    EEG_times = None
-                    EEGRaw = None
+                    self.loaded_sources[source_filename] = [lfp_file, lfp_file.Fs]
+                    lfp_file = None
 
-                EEGRaw = self.loaded_sources[source_filename][0]
+                lfp_file = self.loaded_sources[source_filename][0]
                 Fs = self.loaded_sources[source_filename][1]
 
-
+                # the plotted span, read in uV with FILTER_PAD_SEC more on each side for the edges of the filters
+                plot_first, plot_last = lfp_file.sample_range(plot_start_ms, plot_stop_ms)
+                read_first, read_last = lfp_file.sample_range(plot_start_ms, plot_stop_ms,
+                                                              pad_ms=1000 * filt.FILTER_PAD_SEC)
+                EEGRaw = lfp_file[read_first:read_last]
 
                 # ------- filter the EEG data for the ----------------
 
@@ -1055,7 +1072,10 @@ class GraphSettingsWindows(QtWidgets.QWidget):
                     '''Don't notch filter the data'''
                     pass
 
-                self.source_values.append([EEG, Fs])
+                # [data, Fs, first sample of the data, samples in the recording]
+                self.source_values.append([EEG[plot_first - read_first:plot_last - read_first], Fs, plot_first,
+                                           len(lfp_file)])
+                lfp_file = None
 
             elif '.pos' in source_filename:
                 if source_filename not in self.loaded_sources.keys():
@@ -1094,7 +1114,7 @@ class GraphSettingsWindows(QtWidgets.QWidget):
                 speed = self.loaded_sources[source_filename][0]
                 Fs = self.loaded_sources[source_filename][1]
 
-                self.source_values.append([speed, Fs])  # the filtered data
+                self.source_values.append([speed, Fs, 0, len(speed)])  # the filtered data
 
             self.progress_value += 25/self.graphs.topLevelItemCount()
             self.progress_signal.mysignal.emit('setValue', {'value': self.progress_value})
@@ -1134,30 +1154,21 @@ class GraphSettingsWindows(QtWidgets.QWidget):
                     self.spike_colors_index = 0
                     self.spike_color_list = []
                     # ------- getting the spike data -------------------
-                    for tetrode_number in self.mainWindow.active_tetrodes:
-
-                        tetrode_file = os.path.join(session_path, '%s.%d' % (session, tetrode_number))
+                    # only the spike timestamps and the .cut files are read, not the waveforms
+                    if self.spike_index is None or (self.spike_index.session_path, self.spike_index.session) != \
+                            (session_path, session):
+                        # a new session, the units of its tetrodes are read again
+                        self.spike_index = SpikeIndex(session_path, session)
 
-                        if not os.path.exists(tetrode_file):
-                            continue
-
-                        cut_file = os.path.join(session_path, ''.join(
-                            [os.path.splitext(os.path.basename(tetrode_file))[0], '_', str(tetrode_number), '.cut']))
+                    for tetrode_number in self.mainWindow.active_tetrodes:
 
-                        if not os.path.exists(cut_file):
+                        units = self.spike_index.tetrode_units(tetrode_number)
+                        if not units:
+                            # no tetrode file or .cut file (or no spikes)
                             continue
 
-                        units = find_unit([tetrode_file])
-
-                        available_units = []
-                        for list_ in units:
-                            available_units.append(np.unique(list_))
-
-                        available_units = available_units[0]
-                        spike_times, _, _, _, _, _ = getspikes(tetrode_file)
-
                         # check if the user separated bad cells from good cells
-                        plottable_units = find_consec(available_units)[0]
+                        plottable_units = find_consec(sorted(units.keys()))[0]
 
                         cell_spike_times_array = []
                         spike_color_list = []
@@ -1165,20 +1176,14 @@ class GraphSettingsWindows(QtWidgets.QWidget):
                             if cell_num == 0:
                                 continue
 
-                            cell_spike_times = 1000 * spike_times[np.where((units == cell_num))[1]]
-
-                            cell_spike_times_array.append(cell_spike_times)
+                            cell_spike_times_array.append(units[cell_num])
                             # Use modulo to wrap around if cell_num exceeds available colors
                             color_index = (cell_num - 1) % len(self.spike_colors)
                             spike_color_list.append(self.spike_colors[color_index])
 
                         self.tetrode_spikes[tetrode_number] = {'times': cell_spike_times_array,
                                                                'colors': spike_color_list}
-                        # self.spike_colors_index += 1
                         units = None
-                        available_units = None
-                        spike_times = None
-                        cell_spike_times = None
                         cell_spike_times_array = None
                         spike_color_list = None
 
@@ -1206,9 +1211,9 @@ class GraphSettingsWindows(QtWidgets.QWidget):
                 raster_spike_height = (0.30 / 4) * graph_y_range
                 current_cell_raster_minimum = 0  # start at 0 amplitude
 
-                # Get window boundaries in milliseconds for filtering spikes
-                window_start_ms = self.mainWindow.current_time
-                window_end_ms = self.mainWindow.current_time + self.mainWindow.windowsize
+                # the spikes of the plotted span
+                window_start_ms = plot_start_ms
+                window_end_ms = plot_stop_ms if plot_stop_ms is not None else np.inf
 
                 for tetrode_key in sorted(self.tetrode_spikes.keys()):
                     spike_times = self.tetrode_spikes[tetrode_key]['times']
@@ -1216,10 +1221,8 @@ class GraphSettingsWindows(QtWidgets.QWidget):
                     for i in range(len(spike_times)):
                         cell_spike_times = spike_times[i]
                         
-                        # Filter spikes to only those within the current window
-                        if len(cell_spike_times) > 0:
-                            window_mask = (cell_spike_times >= window_start_ms) & (cell_spike_times <= window_end_ms)
-                            cell_spike_times = cell_spike_times[window_mask]
+                        # Filter spikes to only those within the current window (the times are sorted)
+                        cell_spike_times = SpikeIndex.window(cell_spike_times, window_start_ms, window_end_ms)
 
                         # Only plot if there are spikes in this window
                         if len(cell_spike_times) > 0:
@@ -1258,9 +1261,9 @@ class GraphSettingsWindows(QtWidgets.QWidget):
         self.source_lengths = []
         for i, source in enumerate(self.source_values):
             data = np.multiply(source[0], self.gain_sources[i])
-            self.source_lengths.append(len(data))
+            self.source_lengths.append(source[3])
             Fs = source[1]
-            data_times = 1000 * np.linspace(0, len(data) / Fs, num=len(data), endpoint=False)
+            data_times = 1000 * (source[2] + np.arange(len(data))) / Fs
             shift_amount = - np.nanmin(data) + previous_source_max  # calculating shift
 
             envelope = None
@@ -1294,7 +1297,7 @@ class GraphSettingsWindows(QtWidgets.QWidget):
                 source = self.source_values[i]
                 data = source[0]
                 Fs = source[1]
-                data_times = 1000 * np.linspace(0, len(data) / Fs, num=len(data), endpoint=False)
+                data_times = 1000 * (source[2] + np.arange(len(data))) / Fs
                 peak_indices = detect_peaks(data, mpd=1, threshold=0)
                 peak_times = data_times[peak_indices]
 
@@ -1323,7 +1326,7 @@ class GraphSettingsWindows(QtWidgets.QWidget):
 
         # --- set the mins and maxs of the scrollbar -----
         self.mainWindow.scrollbar.setMinimum(0)
-        self.mainWindow.scrollbar.setMaximum(int(len(data) - (self.mainWindow.windowsize / 1000 * Fs)))
+        self.mainWindow.scrollbar.setMaximum(int(self.mainWindow.SourceLength - (self.mainWindow.windowsize / 1000 * Fs)))
         self.mainWindow.scrollbar.setPageStep(2000)
         self.mainWindow.scrollbar.setSingleStep(1000)
 
@@ -1334,6 +1337,27 @@ class GraphSettingsWindows(QtWidgets.QWidget):
 
         self.progress_signal.close_signal.emit('emit')
 
+    def RePlot(self, *args):
+        """Plots the sources again in the plot thread"""
+        self.mainWindow.plot_thread.start()
+        self.mainWindow.plot_thread_worker = Worker(self.Plot)
+        self.mainWindow.plot_thread_worker.moveToThread(self.mainWindow.plot_thread)
+        self.mainWindow.plot_thread_worker.start.emit("start")
+
+    def followWindow(self, current_time, windowsize):
+        """Plots the sources again when the visible window (ms) leaves the plotted span, called by the scrollbar
+        thread of the main window whenever it checks the current time"""
+        if self.plotting or self.replot_pending or self.plotted_span is None:
+            return
+
+        if not isinstance(current_time, (int, float)) or not isinstance(windowsize, (int, float)):
+            return
+
+        plot_start_ms, plot_stop_ms = self.plotted_span
+        if current_time < plot_start_ms or (plot_stop_ms is not None and current_time + windowsize > plot_stop_ms):
+            self.replot_pending = True
+            self.RePlotSignal.myGUI_signal.emit('RePlot')
+
     def PlotSlice(self):
         pass
 
@@ -5,7 +5,6 @@ import os
 import numpy as np
 import matplotlib.pyplot as plt
 import scipy.signal
-import struct
 import datetime
 import json
 
@@ -124,10 +123,12 @@ def write_eeg_or_egf_file(lfp_single_unit_data, duration,lfp_header_dict, channe
         f.writelines(write_order)
 
     # write the data to the file
+    # the same bytes as struct.pack('<%dh', ...) of the int16 (egf) / int8 (eeg) values, without a Python object per
+    # sample
     if is_egf:
-        data = struct.pack('<%dh' % (num_samples), *[np.int16(data_value) for data_value in lfp_single_unit_data.tolist()])
+        data = np.asarray(lfp_single_unit_data).astype(np.int16).astype('<i2').tobytes()
     else:
-        data = struct.pack('<%dh' % (num_samples), *[np.int8(data_value) for data_value in lfp_single_unit_data.tolist()])
+        data = np.asarray(lfp_single_unit_data).astype(np.int8).astype('<i2').tobytes()
 
 
     with open(filepath, 'rb+') as f:
@@ -1,12 +1,16 @@
 from pyqtgraph.Qt import QtGui, QtCore, QtWidgets
-from core.GUI_Utils import background, center, find_consec
+from core.GUI_Utils import background, center
 import os, time, json, functools
-from scipy.signal import hilbert
 import numpy as np
-from core.Tint_Matlab import detect_peaks
 from core.GUI_Utils import Worker
 import pandas as pd
 import core.filtering as filt
+# the detection itself is Qt-free (core/hilbert_detection.py), these are imported here for the Score window and
+# for the code that imports them from Score
+from core.hilbert_detection import hilbert_filter, hilbert_detect_events, hilbert_detect_events_streaming, \
+    hilbert_detect_events_multichannel, event_cooccurrence, hilbert_detection_intermediates, intermediates_key, \
+    hilbert_detect_from_intermediates, hilbert_sweep, hilbert_precision_report, find_eoi_boundaries, merge_eois, \
+    RejectEOIs, find_peaked_eois, find_local_maxima, count_eoi_peaks, findStop, findStart
 
 
 class TreeWidgetItem(QtWidgets.QTreeWidgetItem):
@@ -304,6 +308,7 @@ class ScoreWindow(QtWidgets.QWidget):
 
     def initialize_attributes(self):
         self.IDs = []
+        self.detection_cache = {}
 
     def openSettings(self, index, source):
 
@@ -1048,226 +1053,6 @@ class ScoreWindow(QtWidgets.QWidget):
         df.to_csv(save_filename, sep='\t')
 
 
-def hilbert_detect_events(raw_data, Fs, *, epoch, sd_num, min_duration, min_freq, max_freq,
-                          required_peak_number, required_peak_sd=None, boundary_fraction=0.3, verbose=False):
-    """Run the Hilbert-based automatic detection and return an array of [start_ms, stop_ms] rows."""
-
-    if max_freq != Fs / 2 and min_freq != 0:
-        filtered_data = filt.iirfilt(
-            bandtype='band', data=raw_data, Fs=Fs, Wp=min_freq, Ws=max_freq,
-            order=3, automatic=0, Rp=3, As=60, filttype='butter', showresponse=0
-        )
-    elif max_freq == Fs / 2:
-        filtered_data = filt.iirfilt(
-            bandtype='high', data=raw_data, Fs=Fs, Wp=min_freq, Ws=[],
-            order=3, automatic=0, Rp=3, As=60, filttype='butter', showresponse=0
-        )
-    elif min_freq == 0:
-        filtered_data = filt.iirfilt(
-            bandtype='low', data=raw_data, Fs=Fs, Wp=max_freq, Ws=[],
-            order=3, automatic=0, Rp=3, As=60, filttype='butter', showresponse=0
-        )
-    else:
-        filtered_data = raw_data.copy()
-
-    filtered_data -= np.mean(filtered_data)
-    t = (1000 / Fs) * np.arange(len(filtered_data))
-
-    analytic_signal = hilbert(filtered_data)
-    hilbert_envelope = np.abs(analytic_signal)
-    rectified_signal = np.abs(filtered_data)
-
-    epoch_window = int(epoch * Fs)
-    i = 0
-    EOIs = []
-
-    if verbose:
-        print('Epoch window (samples): %d' % epoch_window)
-
-    while i <= len(hilbert_envelope):
-
-        window_t = t[i:i + epoch_window + 1]
-        if len(window_t) == 0:
-            break
-
-        if verbose:
-            print('Analyzing times up to %f sec (%f percent of the data)' %
-                  (window_t[-1] / 1000, 100 * window_t[-1] / t[-1]))
-
-        window_data = hilbert_envelope[i:i + epoch_window + 1]
-
-        window_mean = np.mean(window_data)
-        window_std = np.std(window_data)
-        threshold = window_mean + sd_num * window_std
-
-        eoi_signal = np.where(window_data >= threshold)[0]
-        
-        # If no samples exceed threshold, skip this epoch
-        if eoi_signal.size == 0:
-            i += epoch_window + 1
-            continue
-
-        # Ensure indices are integers; if none found, advance to next epoch
-        eoi_indices = [np.asarray(eoi, dtype=int) for eoi in find_consec(eoi_signal)]
-        if len(eoi_indices) == 0:
-            i += epoch_window + 1
-            continue
-
-        window_EOIs = np.zeros((len(eoi_indices), 2))
-
-        rejected_eois = []
-
-        peri_boundary_samples = int((200 / 1000) * Fs)
-
-        eoi_find_start_indices = np.asarray(
-            [np.arange(eoi[0] - peri_boundary_samples, eoi[0]) for eoi in eoi_indices], dtype=int
-        )
-        eoi_find_start_indices[eoi_find_start_indices < 0] = 0
-        eoi_find_start_time = window_t[eoi_find_start_indices]
-
-        row, col = np.where(window_data[eoi_find_start_indices] <= boundary_fraction * threshold)
-        # enforce integer dtype for index arrays
-        row = row.astype(int)
-        col = col.astype(int)
-
-        row_consec = np.asarray(find_same_consec(row), dtype=object)
-        # ensure consec_value used for indexing is integer array
-        eoi_starts = [col[np.asarray(consec_value, dtype=int)] for consec_value in row_consec]
-        valid_rows = np.unique(row).astype(int)
-
-        eoi_starts = [
-            eoi_find_start_time[row_index, np.amax(eoi_starts[np.where(valid_rows == row_index)[0][0]])]
-            for row_index in valid_rows
-        ]
-
-        window_EOIs[valid_rows, 0] = eoi_starts
-
-        rejected_eois.extend(np.setdiff1d(np.arange(len(eoi_indices)), np.unique(row)))
-
-        eoi_find_stop_indices = np.asarray(
-            [np.arange(eoi[-1] + 1, eoi[-1] + peri_boundary_samples + 1) for eoi in eoi_indices], dtype=int
-        )
-        eoi_find_stop_indices[eoi_find_stop_indices > len(window_t) - 1] = len(window_t) - 1
-
-        eoi_find_stop_time = window_t[eoi_find_stop_indices]
-
-        row, col = np.where(window_data[eoi_find_stop_indices] <= boundary_fraction * threshold)
-        # enforce integer dtype for index arrays
-        row = row.astype(int)
-        col = col.astype(int)
-        row_consec = np.asarray(find_same_consec(row), dtype=object)
-        # ensure consec_value used for indexing is integer array
-        eoi_stops = [col[np.asarray(consec_value, dtype=int)] for consec_value in row_consec]
-        valid_rows = np.unique(row).astype(int)
-
-        eoi_stops = [
-            eoi_find_stop_time[row_index, np.amin(eoi_stops[np.where(valid_rows == row_index)[0][0]])]
-            for row_index in valid_rows
-        ]
-
-        window_EOIs[np.unique(row).astype(int), 1] = eoi_stops
-
-        rejected_eois.extend(np.setdiff1d(np.arange(len(eoi_indices)), np.unique(row)))
-
-        if rejected_eois != []:
-            window_EOIs = np.delete(window_EOIs, rejected_eois, axis=0)
-
-        if len(window_EOIs) == 0:
-            i += epoch_window + 1
-            continue
-
-        latest_time = window_EOIs[0, -1]
-        latest_index = 0
-        rejected_eois = []
-
-        for eoi_index, eoi in enumerate(window_EOIs):
-
-            if eoi_index != 0:
-                within_previous_bool = (eoi <= latest_time)
-                if sum(within_previous_bool) == 2:
-                    rejected_eois.append(eoi_index)
-
-                elif sum(within_previous_bool) == 1:
-
-                    window_EOIs[latest_index, 1] = eoi[-1]
-                    rejected_eois.append(eoi_index)
-                    latest_time = eoi[-1]
-
-                elif sum(within_previous_bool) == 0:
-                    latest_time = eoi[-1]
-                    latest_index = eoi_index
-
-        if rejected_eois != []:
-            window_EOIs = np.delete(window_EOIs, rejected_eois, axis=0)
-
-        if len(window_EOIs) == 0:
-            i += epoch_window + 1
-            continue
-
-        latest_time = window_EOIs[0, -1]
-        latest_index = 0
-        rejected_eois = []
-
-        for eoi_index, eoi in enumerate(window_EOIs):
-
-            if eoi_index != 0:
-
-                if eoi[0] - latest_time < 10:
-                    latest_time = eoi[-1]
-                    window_EOIs[latest_index, -1] = latest_time
-                    rejected_eois.append(eoi_index)
-                else:
-                    latest_time = eoi[-1]
-                    latest_index = eoi_index
-
-        if rejected_eois != []:
-            window_EOIs = np.delete(window_EOIs, rejected_eois, axis=0)
-
-        if len(window_EOIs) == 0:
-            i += epoch_window + 1
-            continue
-
-        rejected_eois = np.where(np.diff(window_EOIs) < min_duration)[0]
-        if len(rejected_eois) > 0:
-            window_EOIs = np.delete(window_EOIs, rejected_eois, axis=0)
-
-        i += epoch_window + 1
-
-        if len(window_EOIs) == 0:
-            continue
-
-        if required_peak_sd is None:
-            required_peak_threshold = None
-        else:
-            required_peak_threshold = window_mean + required_peak_sd * window_std
-
-        if len(EOIs) != 0:
-
-            if window_EOIs[0, 0] - EOIs[-1, 1] < 10:
-                EOIs[-1, 1] = window_EOIs[0, 0]
-                window_EOIs = window_EOIs[1:, :]
-
-                eoi_data = rectified_signal[int(Fs * EOIs[-1, 0] / 1000):int(Fs * EOIs[-1, 1] / 1000) + 1]
-
-                peak_indices = detect_peaks(eoi_data, threshold=0)
-                if not len(np.where(eoi_data[peak_indices] >= window_mean + 2 * window_std)[0]) >= 6:
-                    EOIs = EOIs[:-1, :]
-
-            window_EOIs = RejectEOIs(window_EOIs, rectified_signal, Fs, required_peak_threshold,
-                                     required_peak_number)
-
-            EOIs = np.vstack((EOIs, window_EOIs))
-        else:
-
-            EOIs = RejectEOIs(window_EOIs, rectified_signal, Fs, required_peak_threshold,
-                              required_peak_number)
-
-    if len(EOIs) == 0:
-        return np.asarray([])
-
-    return np.asarray(EOIs)
-
-
 def HilbertDetection(self):
     try:
         if not hasattr(self, 'source_filename'):
@@ -1276,16 +1061,25 @@ def HilbertDetection(self):
         if not os.path.exists(self.source_filename):
             return
 
-        raw_data, Fs = self.settingsWindow.loaded_sources[self.source_filename]
+        source, Fs = self.settingsWindow.loaded_sources[self.source_filename]
+
+        # the filtered signal, envelope and epoch statistics only depend on the source, the epoch and the band (the
+        # source isn't notch filtered before the detection), so a re-analysis with new thresholds reuses them
+        cache_key = intermediates_key(source, self.source_filename, epoch=self.epoch, min_freq=self.min_freq,
+                                      max_freq=self.max_freq)
+
+        intermediates = self.detection_cache.get(cache_key)
+        if intermediates is None:
+            # the source is read in uV (an .egf/.eeg source is a TintLFPFile) only when it is analysed
+            intermediates = hilbert_detection_intermediates(source[:], Fs, epoch=self.epoch, min_freq=self.min_freq,
+                                                            max_freq=self.max_freq)
+            # only the latest intermediates are kept, they are a few times the size of the source
+            self.detection_cache = {cache_key: intermediates}
 
-        EOIs = hilbert_detect_events(
-            raw_data,
-            Fs,
-            epoch=self.epoch,
+        EOIs = hilbert_detect_from_intermediates(
+            intermediates,
             sd_num=self.sd_num,
             min_duration=self.min_duration,
-            min_freq=self.min_freq,
-            max_freq=self.max_freq,
             required_peak_number=self.required_peak_number,
             required_peak_sd=self.required_peak_sd,
             boundary_fraction=self.boundary_fraction,
@@ -1328,96 +1122,6 @@ def HilbertDetection(self):
         return
 
 
-def find_same_consec(data):
-    if len(data) == 1:
-        return [0]
-
-    diff_data = np.diff(data)
-
-    consec_switch = np.where(diff_data != 0)[0]
-
-    if len(consec_switch) == 0:
-        # then it never switched
-        return [np.arange(len(data))]
-
-    consecutive_values = []
-
-    if consec_switch[0] > 0:
-        consecutive_values.append(np.arange(consec_switch[0] + 1))
-    else:
-        consecutive_values.append([0])
-        if np.sum(np.in1d(consec_switch, [0])) == 0:
-            consecutive_values.append(np.arange(1, consec_switch[1] + 1))
-
-    for i in range(1, len(consec_switch)):
-        consecutive_values.append(np.arange(consec_switch[i - 1] + 1, consec_switch[i] + 1))
-
-    if consec_switch[-1] != len(data) - 1:
-        consecutive_values.append(np.arange(consec_switch[-1] + 1, len(data)))
-
-    return consecutive_values
-
-
-def RejectEOIs(EOIs, rectified_signal, Fs, threshold, required_peaks):
-    # reject events that don't have the required_peaks above the designated threshold, if there is no threshold and
-    # you just want an N number of peaks, then leave the threshold as None (or blank in the GUI)
-    rejected_eois = []
-
-    for k in range(EOIs.shape[0]):
-
-        eoi_data = rectified_signal[int(Fs * EOIs[k, 0] / 1000):int(Fs * EOIs[k, 1] / 1000) + 1]
-
-        peak_indices = detect_peaks(eoi_data, threshold=0)
-
-        if threshold is not None:
-
-            if not len(np.where(eoi_data[peak_indices] >= threshold)[0]) >= required_peaks:
-                rejected_eois.append(k)
-
-        else:
-
-            if not len(peak_indices) >= required_peaks:
-                rejected_eois.append(k)
-
-    window_EOIs = np.delete(EOIs, rejected_eois, axis=0)  # removing rejected EOIs
-
-    return window_EOIs
-
-
-def findStop(stop_indices):
-    # checks which indices are consecutive from the first index given and finds that largest consecutive value to be
-    # the stop index
-
-    stop_index = stop_indices[0]
-
-    if len(stop_indices) == 1:
-        return stop_index
-
-    for i in range(1, len(stop_indices) + 1):
-        if stop_indices[i] == stop_index + 1:
-            stop_index = stop_indices[i]
-        else:
-            break
-    return stop_index
-
-
-def findStart(start_indices):
-    # checks which indices are consecutive from the last index given and finds that smallest consecutive value to be
-    # the start index
-
-    start_index = start_indices[-1]
-
-    if len(start_indices) == 1:
-        return start_index
-
-    for i in range(len(start_indices)-2, -1, -1):
-        if start_indices[i] == start_index - 1:
-            start_index = start_indices[i]
-        else:
-            break
-    return start_index
-
-
 class HilbertParametersWindow(QtWidgets.QWidget):
 
     def __init__(self, main, score):
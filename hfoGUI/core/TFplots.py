@@ -272,15 +272,9 @@ class TFPlotWindow(QtWidgets.QWidget):
             if self.source_filename not in self.settingsWindow.loaded_sources:
                 return
 
-            if isinstance(self.raw_data, list) or (hasattr(self.raw_data, 'size') and self.raw_data.size == 0):
-                self.raw_data, self.Fs = self.settingsWindow.loaded_sources[self.source_filename]
-
-            # filter the 60 Hz of the raw data
-
-            notch_filter_frequency = self.stockwell_notch_filter.currentText()
-            if notch_filter_frequency != 'None':
-                self.raw_data = filt.notch_filt(self.raw_data, self.Fs, freq=int(notch_filter_frequency), band=10,
-                                            order=3)
+            # an .egf/.eeg source is a TintLFPFile, only the plotted window is read from it
+            source, self.Fs = self.settingsWindow.loaded_sources[self.source_filename]
+            n_samples = len(source)
 
             if self.upper_cutoff > self.Fs/2:
                 self.upper_cutoff = self.Fs/2
@@ -290,26 +284,6 @@ class TFPlotWindow(QtWidgets.QWidget):
                 self.lower_cutoff = 0
                 self.low_frequency.setText(str(self.lower_cutoff))
 
-            # filter the data if it is not already filtered
-            if isinstance(self.filtered_data, list) or (hasattr(self.filtered_data, 'size') and self.filtered_data.size == 0):
-
-                if self.lower_cutoff != 0 and self.upper_cutoff != self.Fs/2:
-                    self.filtered_data = filt.iirfilt(bandtype='band', data=self.raw_data, Fs=self.Fs,
-                                                                Wp=self.lower_cutoff, Ws=self.upper_cutoff,
-                                                 order=3, automatic=0, Rp=3, As=60, filttype='butter',
-                                                 showresponse=0)
-                elif self.lower_cutoff == 0:
-                    self.filtered_data = filt.iirfilt(bandtype='low', data=self.raw_data, Fs=self.Fs,
-                                                                Wp=self.upper_cutoff,
-                                                                order=3, automatic=0, Rp=3, As=60, filttype='butter',
-                                                                showresponse=0)
-
-                elif self.upper_cutoff == self.Fs/2:
-                    self.filtered_data = filt.iirfilt(bandtype='high', data=self.raw_data, Fs=self.Fs,
-                                                                Wp=self.lower_cutoff,
-                                                                order=3, automatic=0, Rp=3, As=60, filttype='butter',
-                                                                showresponse=0)
-
             if not hasattr(self.settingsWindow, 'selected_time'):
                 return
 
@@ -347,8 +321,8 @@ class TFPlotWindow(QtWidgets.QWidget):
                     plot_window_min_1s = 0
                     plot_window_max_1s = np.rint(windowsize_1s)
 
-                elif plot_window_max_1s > len(self.raw_data) - 1:
-                    plot_window_max_1s = len(self.raw_data) - 1
+                elif plot_window_max_1s > n_samples - 1:
+                    plot_window_max_1s = n_samples - 1
                     plot_window_min_1s = np.rint(plot_window_max - windowsize_1s)
 
                 else:
@@ -358,8 +332,8 @@ class TFPlotWindow(QtWidgets.QWidget):
                 plot_window_min = 0
                 plot_window_max = np.rint(windowsize)
 
-            elif plot_window_max > len(self.raw_data)-1:
-                plot_window_max = len(self.raw_data)-1
+            elif plot_window_max > n_samples-1:
+                plot_window_max = n_samples-1
                 plot_window_min = np.rint(plot_window_max - windowsize)
 
             else:
@@ -372,19 +346,48 @@ class TFPlotWindow(QtWidgets.QWidget):
                 plot_window_max_1s = int(plot_window_max_1s)
                 plot_window_min_1s = int(plot_window_min_1s)
 
+            # read the window (and the 1 s window) with filt.FILTER_PAD_SEC before and after it, so the edges of the
+            # filters are outside of the plotted samples
+            read_first = plot_window_min
+            read_last = plot_window_max
+            if enforced_1s:
+                read_first = min(read_first, plot_window_min_1s)
+                read_last = max(read_last, plot_window_max_1s)
+
+            read_first = max(read_first - int(filt.FILTER_PAD_SEC * self.Fs), 0)
+            read_last = min(read_last + 1 + int(filt.FILTER_PAD_SEC * self.Fs), n_samples)
+            raw_data = np.asarray(source[read_first:read_last], dtype=float)
+
+            # filter the 60 Hz of the raw data
+
+            notch_filter_frequency = self.stockwell_notch_filter.currentText()
+            if notch_filter_frequency != 'None':
+                raw_data = filt.notch_filt(raw_data, self.Fs, freq=int(notch_filter_frequency), band=10, order=3)
+
+            if self.lower_cutoff != 0 and self.upper_cutoff != self.Fs/2:
+                filtered_data = filt.iirfilt(bandtype='band', data=raw_data, Fs=self.Fs, Wp=self.lower_cutoff,
+                                             Ws=self.upper_cutoff, order=3, automatic=0, Rp=3, As=60, filttype='butter',
+                                             showresponse=0)
+            elif self.lower_cutoff == 0:
+                filtered_data = filt.iirfilt(bandtype='low', data=raw_data, Fs=self.Fs, Wp=self.upper_cutoff, order=3,
+                                             automatic=0, Rp=3, As=60, filttype='butter', showresponse=0)
+
+            elif self.upper_cutoff == self.Fs/2:
+                filtered_data = filt.iirfilt(bandtype='high', data=raw_data, Fs=self.Fs, Wp=self.lower_cutoff, order=3,
+                                             automatic=0, Rp=3, As=60, filttype='butter', showresponse=0)
+
             t = (1000 / self.Fs) * np.arange(plot_window_min, plot_window_max + 1)  # ms
 
-            # timeseries = self.filtered_data[plot_window_min:plot_window_max + 1]
-            timeseries = self.raw_data[plot_window_min:plot_window_max + 1]
+            timeseries = raw_data[plot_window_min - read_first:plot_window_max + 1 - read_first]
             timeseries = timeseries - np.mean(timeseries)
             t_min = np.amin(t)
             t_max = np.amax(t)
 
             if enforced_1s:
-                timeseries_1s = self.raw_data[plot_window_min_1s:plot_window_max_1s + 1]
+                timeseries_1s = raw_data[plot_window_min_1s - read_first:plot_window_max_1s + 1 - read_first]
                 timeseries_1s = timeseries_1s - np.mean(timeseries_1s)
 
-            filtered_data = self.filtered_data[plot_window_min:plot_window_max + 1]
+            filtered_data = filtered_data[plot_window_min - read_first:plot_window_max + 1 - read_first]
 
             analytic_signal = hilbert(filtered_data)
             envelope = np.absolute(analytic_signal)
@@ -484,9 +487,6 @@ class TFPlotWindow(QtWidgets.QWidget):
                 self.stockwell_max_freq.setText('125')
                 self.stockwell_min_freq.setText('0')
 
-            self.raw_data = []
-            self.filtered_data = []
-
             self.plot_thread.start()
             self.plot_thread_worker = Worker(self.Plot)
             self.plot_thread_worker.moveToThread(self.plot_thread)
@@ -505,17 +505,12 @@ class TFPlotWindow(QtWidgets.QWidget):
         try:
             self.lower_cutoff = int(self.low_frequency.text())
             self.upper_cutoff = int(self.high_frequency.text())
-
-            self.filtered_data = []
         except ValueError:
             return
 
     def clearPlots(self):
         """This method will clear the plots and data associated with it so that when a user selects a new
         .set file, nothing remainds from the previous graph"""
-        self.raw_data = []
-        self.filtered_data = []
-
         self.FilteredGraphAxis.clear()
         self.RawGraphAxis.clear()
         self.STransformGraphAxis.clear()
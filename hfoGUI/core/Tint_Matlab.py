@@ -1,10 +1,6 @@
 from __future__ import division, print_function
 import numpy as np
 import struct, os
-import numpy.matlib
-from scipy.io import savemat
-import mmap
-import contextlib
 
 
 def int16toint8(value):
@@ -86,6 +82,78 @@ def get_good_cells(units):
     return np.asarray(good_cells)
 
 
+# the parsed .set files of this process by path, with the (modification time, size) of the file they were parsed from
+_set_file_cache = {}
+
+
+def _int_or_none(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class SetFile(object):
+    """A .set file parsed once. parameters holds the value (str) of every 'parameter value' line (the first line of a
+    parameter wins), and the values the readers need are typed:
+
+    - adc_fullscale_mv: the ADC_fullscale_mv (int)
+    - gains: {channel (0-63): gain} from the gain_ch_X lines
+    - eeg_channels: {eeg number (1 = .eeg/.egf, 2 = .eeg2/.egf2, ...): channel (1-64)} from the EEG_ch_X lines
+    - saved_eeg: {eeg number: status (1 if the eeg is saved)} from the saveEEG_ch_X lines
+    - active_tetrodes: the tetrode numbers with collectMask_X 1
+    - egf_active: whether saveEGF is 1
+
+    SetFile.load(set_filename) returns the parse of a file from a process-wide cache, the file is parsed again only
+    when its modification time or size changed, so reading every channel of a session parses its .set once. The
+    parsed values are shared, don't modify them.
+    """
+
+    def __init__(self, set_filename):
+        self.filename = str(set_filename)
+
+        self.parameters = {}
+        # adding the encoding because tint data is created via windows and if you want to run this in linux, you need
+        # to explicitly say this
+        with open(self.filename, 'r', encoding='cp1252') as f:
+            for line in f:
+                parameter = line.strip().split(' ', 1)
+                if parameter[0] and parameter[0] not in self.parameters:
+                    self.parameters[parameter[0]] = parameter[1] if len(parameter) == 2 else ''
+
+        self.adc_fullscale_mv = _int_or_none(self.parameters.get('ADC_fullscale_mv'))
+        self.gains = self._numbered_values('gain_ch_')
+        self.eeg_channels = self._numbered_values('EEG_ch_')
+        self.saved_eeg = self._numbered_values('saveEEG_ch_')
+        self.active_tetrodes = [tetrode for tetrode, status in self._numbered_values('collectMask_').items()
+                                if status == 1]
+        self.egf_active = any(_int_or_none(value) == 1 for parameter, value in self.parameters.items()
+                              if 'saveEGF' in parameter)
+
+    def _numbered_values(self, prefix):
+        """{X: int value} of the prefixX parameters (e.g. gain_ch_X), in the order of the file"""
+        values = {}
+        for parameter, value in self.parameters.items():
+            if parameter.startswith(prefix):
+                number, value = _int_or_none(parameter[len(prefix):]), _int_or_none(value)
+                if number is not None and value is not None:
+                    values[number] = value
+        return values
+
+    @classmethod
+    def load(cls, set_filename):
+        path = os.path.abspath(str(set_filename))
+        stat = os.stat(path)
+        version = (stat.st_mtime_ns, stat.st_size)
+
+        cached = _set_file_cache.get(path)
+        if cached is None or cached[0] != version:
+            cached = (version, cls(path))
+            _set_file_cache[path] = cached
+
+        return cached[1]
+
+
 def get_setfile_parameter(parameter, set_filename):
     """
     This function will return the parameter value of a given parameter name for a given set filename.
@@ -108,18 +176,7 @@ def get_setfile_parameter(parameter, set_filename):
     if not os.path.exists(set_filename):
         return
 
-    # adding the encoding because tint data is created via windows and if you want to run this in linux, you need
-    # to explicitly say this
-    with open(set_filename, 'r+', encoding='cp1252') as f:
-        for line in f:
-            if parameter in line:
-                if line.split(' ')[0] == parameter:
-                    # prevents part of the parameter being in another parameter name
-                    new_line = line.strip().split(' ')
-                    if len(new_line) == 2:
-                        return new_line[-1]
-                    else:
-                        return ' '.join(new_line[1:])
+    return SetFile.load(set_filename).parameters.get(parameter)
 
 
 def getpos(pos_fpath, arena, method='', flip_y=True, custom_ppm=None):
@@ -261,71 +318,21 @@ def is_tetrode(file, session):
 def get_active_tetrode(set_filename):
     """in the .set files it will say collectMask_X Y for each tetrode number to tell you if
     it is active or not. T1 = ch1-ch4, T2 = ch5-ch8, etc."""
-    active_tetrode = []
-    active_tetrode_str = 'collectMask_'
-
-    with open(set_filename, encoding='cp1252') as f:
-        for line in f:
-
-            # collectMask_X Y, where x is the tetrode number, and Y is eitehr on or off (1 or 0)
-            if active_tetrode_str in line:
-                tetrode_str, tetrode_status = line.split(' ')
-                if int(tetrode_status) == 1:
-                    # then the tetrode is saved
-                    tetrode_str.find('_')
-                    tet_number = int(tetrode_str[tetrode_str.find('_') + 1:])
-                    active_tetrode.append(tet_number)
-
-    return active_tetrode
+    return list(SetFile.load(set_filename).active_tetrodes)
 
 
 def get_active_eeg(set_filename):
     """This will return a dictionary (cative_eeg_dict) where the keys
     will be eeg channels from 1->64 which will represent the eeg suffixes (2 = .eeg2, 3 = 2.eeg3, etc)
     and the key will be the channel that the EEG maps to (a channel from 0->63)"""
-    active_eeg = []
-    active_eeg_str = 'saveEEG_ch'
-
-    eeg_map = []
-    eeg_map_str = 'EEG_ch_'
-
-    active_eeg_dict = {}
-
-    with open(set_filename, encoding='cp1252') as f:
-        for line in f:
-
-            if active_eeg_str in line:
-                # saveEEG_ch_X Y, where x is the eeg number, and Y is eitehr on or off (1 or 0)
-                _, status = line.split(' ')
-                active_eeg.append(int(status))
-            elif eeg_map_str in line:
-                # EEG_ch_X Y
-                _, chan = line.split(' ')
-                eeg_map.append(int(chan))
-
-                # active_eeg = np.asarray(active_eeg)
-                # eeg_map = np.asarray(eeg_map)
-
-    for i, status in enumerate(active_eeg):
-        if status == 1:
-            active_eeg_dict[i + 1] = eeg_map[i] - 1
+    set_file = SetFile.load(set_filename)
 
-    return active_eeg_dict
+    return {eeg_number: set_file.eeg_channels[eeg_number] - 1 for eeg_number, status in set_file.saved_eeg.items()
+            if status == 1 and eeg_number in set_file.eeg_channels}
 
 
 def is_egf_active(set_filename):
-    active_egf_str = 'saveEGF'
-
-    with open(set_filename, encoding='cp1252') as f:
-        for line in f:
-
-            if active_egf_str in line:
-                _, egf_status = line.split(' ')
-
-                if int(egf_status) == 1:
-                    return True
-
-        return False
+    return SetFile.load(set_filename).egf_active
 
 
 def find_tetrodes(set_fullpath):
@@ -401,22 +408,41 @@ def read_clu(filename):
     return data[1:].flatten() - 1
 
 
+# the parsed .cut files of this process by path, with the (modification time, size) of the file they were parsed from
+_cut_file_cache = {}
+
+
 def read_cut(cut_filename):
-    """This function will read the given cut file, and output the """
-    cut_values = None
-    if os.path.exists(cut_filename):
-        extract_cut = False
-        with open(cut_filename, 'r') as f:
-            for line in f:
-                if 'Exact_cut' in line:  # finding the beginning of the cut values
-                    extract_cut = True
-                if extract_cut:  # read all the cut values
-                    cut_values = str(f.readlines())
-                    for string_val in ['\\n', ',', "'", '[', ']']:  # removing non base10 integer values
-                        cut_values = cut_values.replace(string_val, '')
-                    cut_values = [int(val) for val in cut_values.split()]
-        cut_values = np.asarray(cut_values)
-    return cut_values
+    """This function will read the given cut file, and output the unit number of every spike (a read-only array,
+    None if there is no such file). The parse of a file is cached until the file changes (its modification time or
+    size), a plot reading the same .cut again doesn't parse it again."""
+    if not os.path.exists(cut_filename):
+        return None
+
+    path = os.path.abspath(cut_filename)
+    stat = os.stat(path)
+    version = (stat.st_mtime_ns, stat.st_size)
+
+    cached = _cut_file_cache.get(path)
+    if cached is None or cached[0] != version:
+        with open(path, 'r') as f:
+            cut_text = f.read()
+
+        # the cut values are every integer after the Exact_cut line
+        cut_start = cut_text.find('Exact_cut')
+        if cut_start < 0:
+            # no cut values (no spike is assigned to a unit)
+            cut_values = np.array([], dtype=int)
+        else:
+            line_end = cut_text.find('\n', cut_start)
+            cut_text = cut_text[line_end + 1:] if line_end >= 0 else ''
+            cut_values = np.array(cut_text.replace(',', ' ').split(), dtype=int)
+        cut_values.flags.writeable = False
+
+        cached = (version, cut_values)
+        _cut_file_cache[path] = cached
+
+    return cached[1]
 
 
 def arena_config(posx, posy, arena, conversion='', center='', flip_y=True):
@@ -461,40 +487,148 @@ def arena_config(posx, posy, arena, conversion='', center='', flip_y=True):
     return posx, posy
 
 
-def ReadEEG(eeg_fname):
+def ReadEEG(eeg_fname, dtype=None, copy=False):
     """input:
     eeg_filename: the fullpath to the eeg file that is desired to be read.
     Example: C:\Location\of\eegfile.eegX
+    dtype: optional dtype to convert the waveform to (e.g. np.float32), by default the raw int8/int16 samples
+    copy: by default (without a dtype) the waveform is a read-only np.memmap of the data in the file, nothing is read
+    until it is used and the pages are shared by every process reading the file. copy=True returns a writeable
+    in-memory copy instead.
 
     Output:
     The EEG waveform, and the sampling frequency"""
 
-    with open(eeg_fname, 'rb') as f:
+    lfp_file = TintLFPFile(eeg_fname)
+    EEG = lfp_file.data
 
-        is_eeg = False
-        if 'eeg' in eeg_fname:
-            is_eeg = True
-            # Fs = 250
-        # else:
-        #    Fs = 4.8e3
+    if dtype is not None:
+        EEG = np.array(EEG, dtype=dtype)
+    elif copy:
+        EEG = np.array(EEG)
 
-        with contextlib.closing(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)) as m:
-            # find the data_start
-            start_index = int(m.find(b'data_start') + len('data_start'))  # start of the data
-            stop_index = int(m.find(b'\r\ndata_end'))  # end of the data
+    return EEG, lfp_file.Fs
 
-            sample_rate_start = m.find(b'sample_rate')
-            sample_rate_end = m[sample_rate_start:].find(b'\r\n')
-            Fs = float(m[sample_rate_start:sample_rate_start + sample_rate_end].decode('utf-8').split(' ')[1])
 
-            m = m[start_index:stop_index]
+class TintLFPFile(object):
+    """An .eeg/.egf file opened for random access: the header is parsed once and the samples are a read-only
+    np.memmap of the file, so opening even a 24 h recording reads nothing but the header and the windows that are
+    used.
+
+        lfp_file = TintLFPFile('C:\\example\\session.egf')
+        window = lfp_file.read(1000, 1500, pad_ms=500)  # the µV samples from 0.5 s to 2 s
+        first, last = lfp_file.sample_range(1000, 1500, pad_ms=500)  # the samples of that window
+
+    The windows are clipped to the recording. Slicing (lfp_file[first:last]) returns the µV samples of sample
+    indices, and len(lfp_file) is the number of samples, so the file can be used where a µV array is expected.
+    The bits to µV scalar is read from set_filename (by default the .set file next to the data) when it is first
+    needed (or by read_scalar), a TintException is raised if there is none.
+    """
+
+    def __init__(self, filename, set_filename=''):
+        self.filename = str(filename)
+        self.set_filename = str(set_filename) if set_filename else ''
+
+        # the extension (.eeg, .eeg2, ...), not the whole path, a directory name can contain 'eeg'
+        is_eeg = 'eeg' in os.path.splitext(self.filename)[1]
+        sample_dtype = np.dtype('>b') if is_eeg else np.dtype('<h')
+
+        self.parameters, start_index = read_header(self.filename)  # start of the data
+        self.Fs = int(float(self.parameters['sample_rate'].split(' ')[0]))
+        self.bytes_per_sample = sample_dtype.itemsize
+
+        # end of the data, the data_end marker at the end of the file (a recording that is still being written has
+        # none)
+        file_size = os.path.getsize(self.filename)
+        tail_start = max(file_size - 64, start_index)
+        with open(self.filename, 'rb') as f:
+            f.seek(tail_start)
+            marker_index = f.read().rfind(b'\r\ndata_end')
+        stop_index = tail_start + marker_index if marker_index >= 0 else file_size
+
+        self.n_samples = max(stop_index - start_index, 0) // sample_dtype.itemsize
+        if self.n_samples > 0:
+            self.data = np.memmap(self.filename, dtype=sample_dtype, mode='r', offset=start_index,
+                                  shape=(self.n_samples,))
+        else:
+            self.data = np.zeros(0, dtype=sample_dtype)
+
+        self._scalar = None
+
+    @property
+    def duration(self):
+        """The duration of the recording in seconds"""
+        return self.n_samples / self.Fs
+
+    def read_scalar(self):
+        """Reads the bits to µV scalar of the samples from the .set file (once), raises a TintException if there is
+        no .set file"""
+        if self._scalar is None:
+            _, self._scalar = bits2uV([], self.filename, self.set_filename)
+        return self._scalar
+
+    @property
+    def scalar(self):
+        """The bits to µV scalar of the samples"""
+        return self.read_scalar()
+
+    def __len__(self):
+        return self.n_samples
+
+    def __getitem__(self, index):
+        return np.multiply(self.data[index], self.scalar, dtype=float)
+
+    def sample_range(self, t0_ms=0, t1_ms=None, pad_ms=0):
+        """The first and last (exclusive) sample of the window from t0_ms to t1_ms (by default the end of the
+        recording), widened by pad_ms on both sides and clipped to the recording"""
+        first = int(np.rint((t0_ms - pad_ms) * self.Fs / 1000))
+        if t1_ms is None:
+            last = self.n_samples
+        else:
+            last = int(np.rint((t1_ms + pad_ms) * self.Fs / 1000))
+
+        return min(max(first, 0), self.n_samples), min(max(last, 0), self.n_samples)
+
+    def read(self, t0_ms=0, t1_ms=None, scale_uV=True, pad_ms=0, dtype=None):
+        """The samples of the window from t0_ms to t1_ms (see sample_range), pad_ms before and after it (where the
+        recording has them) give a filter room for its edge effects.
+
+        Output:
+        An in-memory copy of the window, in µV (float64 or dtype) with scale_uV, else the raw int8/int16 samples
+        (or converted to dtype)"""
+        first, last = self.sample_range(t0_ms, t1_ms, pad_ms)
+
+        if scale_uV:
+            return np.multiply(self.data[first:last], self.scalar, dtype=dtype or float)
+        return np.array(self.data[first:last], dtype=dtype)
 
-            if is_eeg:
-                EEG = np.fromstring(m, dtype='>b')
-            else:
-                EEG = np.fromstring(m, dtype='<h')
 
-            return EEG, int(Fs)
+def read_header(fname, block_size=4096):
+    """Reads only the text header of a Tint file (everything before data_start), without the data.
+
+    Output:
+    A dictionary of the header parameters (e.g. {'sample_rate': '4800 hz', 'num_EGF_samples': '1440000', ...}) and the
+    byte offset of the data"""
+
+    header = b''
+    with open(fname, 'rb') as f:
+        while b'data_start' not in header:
+            block = f.read(block_size)
+            if not block:
+                break
+            header += block
+
+    data_start = header.find(b'data_start')
+    if data_start < 0:
+        raise TintException('No data_start in the header of %s' % fname)
+
+    parameters = {}
+    for line in header[:data_start].decode('cp1252').splitlines():
+        parameter = line.strip().split(' ', 1)
+        if parameter[0]:
+            parameters[parameter[0]] = parameter[1] if len(parameter) == 2 else ''
+
+    return parameters, data_start + len('data_start')
 
 
 def EEG_to_Mat(input_filename, output_filename):
@@ -505,6 +639,7 @@ def EEG_to_Mat(input_filename, output_filename):
     else:
         save_dictionary = {'EEG': EEG, 'Fs': Fs}
 
+    from scipy.io import savemat
     savemat(output_filename, save_dictionary)
 
 
@@ -542,11 +677,12 @@ def findCenter(NE, NW, SW, SE):
     return np.array([x, y])
 
 
-def bits2uV(data, data_fpath, set_fpath=''):
+def bits2uV(data, data_fpath, set_fpath='', dtype=None):
     '''
     :param data:
     :param data_fpath: example: 'C:\example\filepath.whatever'
     :param set_fpath:
+    :param dtype: the dtype of the converted data (e.g. np.float32), by default float64
     :return:
     '''
     path = os.path.split(data_fpath)[0]
@@ -564,53 +700,23 @@ def bits2uV(data, data_fpath, set_fpath=''):
     # create a tetrode map that has rows of channels that correspond to the same tetrode
     tet_map = np.asarray([np.arange(start,start+4) for start in np.arange(0, 32)*4])
 
-    chan_gains = np.array([])
-    saved_eeg = np.array([])
-    eeg_chan_map = np.array([])
+    set_file = SetFile.load(set_fpath)
+    ADC_fullscale_mv = set_file.adc_fullscale_mv
 
-    with open(set_fpath, 'r', encoding='cp1252') as f:
-        for line in f:
-
-            if 'ADC_fullscale_mv' in line:
-                ADC_fullscale_mv = int(line.split(" ")[1])
-            elif 'gain_ch_' in line:
-                # create an array of channel gains [channel_number, channels_gain]
-                if len(chan_gains) == 0:
-                    chan_gains = np.array([int(line[len('gain_ch_'):line.find(" ")]), int(line.split(" ")[1])], ndmin=2)
-                else:
-                    chan_gains = np.append(chan_gains, np.array([int(line[len('gain_ch_'):line.find(" ")]), int(line.split(" ")[1])], ndmin=2), axis=0)
-            elif 'saveEEG_ch_' in line:
-                # create an array of EEG channels that are saved
-                if int(line.split(" ")[1]) == 1:
-                    if len(chan_gains) == 0:
-                        saved_eeg = np.array([int(line[len('saveEEG_ch_'):line.find(" ")])])
-                    else:
-                        saved_eeg = np.append(saved_eeg, np.array([int(line[len('saveEEG_ch_'):line.find(" ")])]))
-            elif 'EEG_ch_' in line and 'BPF' not in line:
-                if len(eeg_chan_map) == 0:
-                    eeg_chan_map = np.array([int(line[len('EEG_ch_'):line.find(" ")]), int(line.split(" ")[1])], ndmin=2)
-                else:
-                    eeg_chan_map = np.append(eeg_chan_map, np.array([int(line[len('EEG_ch_'):line.find(" ")]), int(line.split(" ")[1])], ndmin=2), axis=0)
     if '.eeg' in ext:
         if len(ext) == len('.eeg'):
             chan_num = 1
         else:
             chan_num = int(ext[len('.eeg'):])
 
-        for index, value in enumerate(eeg_chan_map[:]):
-            if value[0] == chan_num:
-                eeg_chan = value[1] - 1
-                break
-
-        for index, value in enumerate(chan_gains):
-            if value[0] == eeg_chan:
-                gain = value[1]
+        eeg_chan = set_file.eeg_channels[chan_num] - 1
+        gain = set_file.gains[eeg_chan]
 
         scalar = ADC_fullscale_mv*1000/(gain*128)
         if len(data) == 0:
             data_uV = []
         else:
-            data_uV = np.multiply(data, scalar)
+            data_uV = np.multiply(data, scalar, dtype=dtype)
             #print(data_uV)
 
     elif '.egf' in ext:
@@ -620,36 +726,29 @@ def bits2uV(data, data_fpath, set_fpath=''):
             chan_num = int(ext[len('.egf'):])
         #print(chan_num)
 
-        for index, value in enumerate(eeg_chan_map[:]):
-            if value[0] == chan_num:
-                eeg_chan = value[1] - 1
-                break
-
-        for index, value in enumerate(chan_gains):
-            if value[0] == eeg_chan:
-                gain = value[1]
-                break
+        eeg_chan = set_file.eeg_channels[chan_num] - 1
+        gain = set_file.gains[eeg_chan]
 
         scalar = ADC_fullscale_mv*1000/(gain*32768)
 
         if len(data) == 0:
             data_uV = []
         else:
-            data_uV = np.multiply(data, scalar)
+            data_uV = np.multiply(data, scalar, dtype=dtype)
 
     else:
         tetrode_num = int(ext[1:])
 
         tet_chans = tet_map[tetrode_num-1]
 
-        gain = np.asarray([[gains[1] for gains in chan_gains if gains[0] == chan] for chan in tet_chans])
+        gain = np.asarray([set_file.gains[chan] for chan in tet_chans])
 
-        scalar = (ADC_fullscale_mv*1000/(gain*128).reshape((1, len(gain))))[0]
+        scalar = ADC_fullscale_mv*1000/(gain*128)
 
         if len(data) == 0:
             data_uV = []
         else:
-            data_uV = np.multiply(data, scalar)
+            data_uV = np.multiply(data, scalar, dtype=dtype)
 
     return data_uV, scalar
 
@@ -692,71 +791,132 @@ def getspikes(fullpath):
 
 def importspikes(filename):
     """Reads through the tetrode file as an input and returns two things, a dictionary containing the following:
-    timestamps, ch1-ch4 waveforms, and it also returns a dictionary containing the spike parameters"""
+    timestamps (an Nx1 array of seconds), ch1-ch4 waveforms (read-only NxM int8 views of the file, see
+    TintTetrodeFile), and it also returns a dictionary containing the spike parameters"""
 
-    with open(filename, 'rb') as f:
-        for line in f:
-            if 'data_start' in str(line):
-                spike_data = np.fromstring((line + f.read())[len('data_start'):-len('\r\ndata_end\r\n')], dtype='uint8')
-                break
-            elif 'num_spikes' in str(line):
-                num_spikes = int(line.decode(encoding='UTF-8').split(" ")[1])
-            elif 'bytes_per_timestamp' in str(line):
-                bytes_per_timestamp = int(line.decode(encoding='UTF-8').split(" ")[1])
-            elif 'samples_per_spike' in str(line):
-                samples_per_spike = int(line.decode(encoding='UTF-8').split(" ")[1])
-            elif 'bytes_per_sample' in str(line):
-                bytes_per_sample = int(line.decode(encoding='UTF-8').split(" ")[1])
-            elif 'timebase' in str(line):
-                timebase = int(line.decode(encoding='UTF-8').split(" ")[1])
-            elif 'duration' in str(line):
-                duration = int(line.decode(encoding='UTF-8').split(" ")[1])
-            elif 'sample_rate' in str(line):
-                samp_rate = int(line.decode(encoding='UTF-8').split(" ")[1])
-
-                # calculating the big-endian and little endian matrices so we can convert from bytes -> decimal
-    big_endian_vector = 256 ** np.arange(bytes_per_timestamp - 1, -1, -1)
-    little_endian_matrix = np.arange(0, bytes_per_sample).reshape(bytes_per_sample, 1)
-    little_endian_matrix = 256 ** numpy.matlib.repmat(little_endian_matrix, 1, samples_per_spike)
-
-    number_channels = 4
-
-    # calculating the timestamps
-    t_start_indices = np.linspace(0, num_spikes * (bytes_per_sample * samples_per_spike * 4 +
-                                                   bytes_per_timestamp * 4), num=num_spikes, endpoint=False).astype(
-        int).reshape(num_spikes, 1)
-    t_indices = t_start_indices
-
-    for chan in np.arange(1, number_channels):
-        t_indices = np.hstack((t_indices, t_start_indices + chan))
-
-    t = spike_data[t_indices].reshape(num_spikes, bytes_per_timestamp)  # acquiring the time bytes
-    t = np.sum(np.multiply(t, big_endian_vector), axis=1) / timebase  # converting from bytes to float values
-    t_indices = None
-
-    waveform_data = np.zeros((number_channels, num_spikes, samples_per_spike))  # (dimensions, rows, columns)
-
-    bytes_offset = 0
-    # read the t,ch1,t,ch2,t,ch3,t,ch4
-
-    for chan in range(number_channels):  # only really care about the first time that gets written
-        chan_start_indices = t_start_indices + chan * samples_per_spike + bytes_per_timestamp + bytes_per_timestamp * chan
-        for spike_sample in np.arange(1, samples_per_spike):
-            chan_start_indices = np.hstack((chan_start_indices, t_start_indices +
-                                            chan * samples_per_spike + bytes_per_timestamp +
-                                            bytes_per_timestamp * chan + spike_sample))
-        waveform_data[chan][:][:] = spike_data[chan_start_indices].reshape(num_spikes, samples_per_spike).astype(
-            'int8')  # acquiring the channel bytes
-        waveform_data[chan][:][:][np.where(waveform_data[chan][:][:] > 127)] -= 256
-        waveform_data[chan][:][:] = np.multiply(waveform_data[chan][:][:], little_endian_matrix)
-
-    spikeparam = {'timebase': timebase, 'bytes_per_sample': bytes_per_sample, 'samples_per_spike': samples_per_spike,
-                  'bytes_per_timestamp': bytes_per_timestamp, 'duration': duration, 'num_spikes': num_spikes,
-                  'sample_rate': samp_rate}
-
-    return {'t': t.reshape(num_spikes, 1), 'ch1': np.asarray(waveform_data[0][:][:]),
-            'ch2': np.asarray(waveform_data[1][:][:]),
-            'ch3': np.asarray(waveform_data[2][:][:]), 'ch4': np.asarray(waveform_data[3][:][:])}, spikeparam
+    tetrode_file = TintTetrodeFile(filename)
+    waveforms = tetrode_file.waveforms
+
+    spikeparam = {'timebase': tetrode_file.timebase, 'bytes_per_sample': tetrode_file.bytes_per_sample,
+                  'samples_per_spike': tetrode_file.samples_per_spike,
+                  'bytes_per_timestamp': tetrode_file.bytes_per_timestamp, 'duration': tetrode_file.duration,
+                  'num_spikes': tetrode_file.num_spikes, 'sample_rate': tetrode_file.sample_rate}
+
+    return {'t': tetrode_file.spike_times().reshape(tetrode_file.num_spikes, 1), 'ch1': waveforms[:, 0],
+            'ch2': waveforms[:, 1], 'ch3': waveforms[:, 2], 'ch4': waveforms[:, 3]}, spikeparam
+
+
+class TintTetrodeFile(object):
+    """A Tint tetrode file (session.1, session.2, ...) with its data block viewed as a structured array: each spike
+    is 4 records (t,ch1,t,ch2,t,ch3,t,ch4), one per channel, of a big-endian timestamp followed by the samples of the
+    channel. The records are a read-only np.memmap of the file, so opening a file reads only its header and the
+    timestamps and waveforms are views of the file without a copy:
+
+        tetrode_file = TintTetrodeFile('C:\\example\\session.1')
+        tetrode_file.timestamps  # (num_spikes,) uint32 timestamps (in timebase units) of the spikes
+        tetrode_file.waveforms  # (num_spikes, 4, samples_per_spike) int8 samples of the 4 channels
+
+    The timestamps are read as unsigned, a long recording passes 2**31 timebase units (6.2 h at 96 kHz).
+    """
+
+    def __init__(self, filename):
+        self.filename = str(filename)
+
+        self.parameters, start_index = read_header(self.filename)
+        self.timebase = int(self.parameters['timebase'].split(' ')[0])
+        self.bytes_per_timestamp = int(self.parameters['bytes_per_timestamp'])
+        self.samples_per_spike = int(self.parameters['samples_per_spike'])
+        self.bytes_per_sample = int(self.parameters['bytes_per_sample'])
+        self.sample_rate = int(self.parameters['sample_rate'].split(' ')[0])
+        self.duration = int(self.parameters['duration'].split(' ')[0])
+
+        self.record_dtype = np.dtype([('t', '>u%d' % self.bytes_per_timestamp),
+                                      ('samples', '<i%d' % self.bytes_per_sample, (self.samples_per_spike,))])
+
+        # the header count, unless the file is shorter (a recording that is still being written)
+        spike_bytes = 4 * self.record_dtype.itemsize
+        self.num_spikes = min(int(self.parameters['num_spikes']),
+                              max(os.path.getsize(self.filename) - start_index, 0) // spike_bytes)
+
+        if self.num_spikes > 0:
+            self.records = np.memmap(self.filename, dtype=self.record_dtype, mode='r', offset=start_index,
+                                     shape=(self.num_spikes, 4))
+        else:
+            self.records = np.zeros((0, 4), dtype=self.record_dtype)
+
+    def __len__(self):
+        return self.num_spikes
+
+    @property
+    def timestamps(self):
+        """The timestamps of the spikes (the one of the first channel, the 4 records of a spike have the same)"""
+        return self.records['t'][:, 0]
+
+    @property
+    def waveforms(self):
+        return self.records['samples']
+
+    def spike_times(self):
+        """The spike times in seconds (float64)"""
+        return self.timestamps / self.timebase
+
+
+def read_spike_times(tetrode_file):
+    """The spike times (s) of a tetrode file, only the timestamps are read from the data block (a strided view of
+    the file, see TintTetrodeFile), not the waveforms"""
+    return TintTetrodeFile(tetrode_file).spike_times()
+
+
+class SpikeIndex(object):
+    """The spike times of the units of the tetrodes of a session, for a raster: the spike times of a tetrode
+    (read_spike_times) grouped by the unit of each spike (read_cut), read the first time a tetrode is used and again
+    only once its tetrode or .cut file changes.
+
+        spike_index = SpikeIndex(session_path, session)
+        units = spike_index.tetrode_units(1)  # {unit: spike times (ms), sorted}
+        spike_index.window(units[2], 1000, 1500)  # the spike times of unit 2 between 1 s and 1.5 s
+    """
+
+    def __init__(self, session_path, session):
+        self.session_path = session_path
+        self.session = session
+        self._tetrode_units = {}
+
+    def tetrode_units(self, tetrode):
+        """{unit: sorted spike times (ms)} of a tetrode, None if the session has no tetrode file or no .cut file for
+        it"""
+        tetrode_file = os.path.join(self.session_path, '%s.%d' % (self.session, tetrode))
+        cut_file = os.path.join(self.session_path, '%s_%d.cut' % (self.session, tetrode))
+
+        # the modification time and size of the files, a re-cut tetrode is read again
+        version = tuple((os.stat(filename).st_mtime_ns, os.stat(filename).st_size) if os.path.exists(filename)
+                        else None for filename in (tetrode_file, cut_file))
+
+        cached = self._tetrode_units.get(tetrode)
+        if cached is None or cached[0] != version:
+            units = None
+            if None not in version:
+                spike_times = 1000 * read_spike_times(tetrode_file)
+                cut_values = read_cut(cut_file)
+
+                n_spikes = min(len(spike_times), len(cut_values))
+                spike_times, cut_values = spike_times[:n_spikes], cut_values[:n_spikes]
+
+                # sorted by unit, then time, so every unit is a sorted slice
+                order = np.lexsort((spike_times, cut_values))
+                unit_numbers, unit_starts = np.unique(cut_values[order], return_index=True)
+                units = dict(zip(unit_numbers.tolist(), np.split(spike_times[order], unit_starts[1:])))
+
+            cached = (version, units)
+            self._tetrode_units[tetrode] = cached
+
+        return cached[1]
+
+    @staticmethod
+    def window(spike_times, t0_ms, t1_ms):
+        """The spike times (sorted, ms) from t0_ms to t1_ms (inclusive)"""
+        return spike_times[np.searchsorted(spike_times, t0_ms, side='left'):
+                           np.searchsorted(spike_times, t1_ms, side='right')]
 
 
 def speed2D(x, y, t):
@@ -0,0 +1,101 @@
+import datetime
+import json
+import os
+import sqlite3
+
+from core.manifest import params_hash
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS parameter_sets (
+    id INTEGER PRIMARY KEY,
+    hash TEXT NOT NULL UNIQUE,
+    settings TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS detections (
+    id INTEGER PRIMARY KEY,
+    session TEXT NOT NULL,
+    channel TEXT NOT NULL,
+    data_file TEXT NOT NULL,
+    parameter_set_id INTEGER NOT NULL REFERENCES parameter_sets (id),
+    events INTEGER NOT NULL,
+    created TEXT NOT NULL,
+    UNIQUE (data_file, channel, parameter_set_id)
+);
+
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY,
+    session TEXT NOT NULL,
+    channel TEXT NOT NULL,
+    data_file TEXT NOT NULL,
+    parameter_set_id INTEGER NOT NULL REFERENCES parameter_sets (id),
+    start_ms REAL NOT NULL,
+    stop_ms REAL NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS events_session_time ON events (session, start_ms);
+CREATE INDEX IF NOT EXISTS events_detection ON events (data_file, channel, parameter_set_id);
+'''
+
+
+class EventStore(object):
+    """A SQLite database of the events detected by the batch runs, so that the events of every session can be
+    queried at once instead of opening the scores and settings files of each session.
+
+    parameter_sets holds each settings dictionary once, detections has a row per data file and channel detected
+    with a parameter set (also when no events were found) and events has the start and stop (ms) of every event with
+    its session, channel and parameter set. Storing a detection again (a rerun) replaces its events.
+
+        SELECT session, COUNT(*) FROM events WHERE parameter_set_id = 1 GROUP BY session
+    """
+
+    def __init__(self, path):
+        self.path = str(path)
+
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+
+        self.connection = sqlite3.connect(self.path, timeout=60)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        with self.connection:
+            self.connection.executescript(_SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+
+    def close(self):
+        self.connection.close()
+
+    def _parameter_set_id(self, settings):
+        settings_hash = params_hash(settings)
+        self.connection.execute('INSERT OR IGNORE INTO parameter_sets (hash, settings) VALUES (?, ?)',
+                                (settings_hash, json.dumps(settings, sort_keys=True)))
+        return self.connection.execute('SELECT id FROM parameter_sets WHERE hash = ?', (settings_hash,)).fetchone()[0]
+
+    def add_detection(self, session, channel, data_file, events, settings):
+        """Stores the events (an (n, 2) array of start and stop times in ms) detected on a channel of a session in one
+        transaction, returns the id of the parameter set."""
+        data_file = str(data_file)
+
+        with self.connection:
+            parameter_set_id = self._parameter_set_id(settings)
+
+            self.connection.execute('DELETE FROM events WHERE data_file = ? AND channel = ? AND parameter_set_id = ?',
+                                    (data_file, channel, parameter_set_id))
+            self.connection.execute(
+                'INSERT OR REPLACE INTO detections (session, channel, data_file, parameter_set_id, events, created) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (session, channel, data_file, parameter_set_id, len(events),
+                 datetime.datetime.now().isoformat(timespec='seconds')))
+            self.connection.executemany(
+                'INSERT INTO events (session, channel, data_file, parameter_set_id, start_ms, stop_ms) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                ((session, channel, data_file, parameter_set_id, float(start), float(stop))
+                 for start, stop in events))
+
+        return parameter_set_id
@@ -1,8 +1,10 @@
 from scipy import signal, fftpack
 import scipy
-import matplotlib.pyplot as plt
 import numpy as np
 
+# the samples read before and after a plotted window, the filters' edge effects stay outside of the plot
+FILTER_PAD_SEC = 2
+
 
 """ Double check that the replacement functions are correct and then delete this code block. Don't keep it forever.
 def notch_filt(data, Fs, band=10, freq=60, ripple=1, order=2, filter_type='butter', analog_filt=False,
@@ -68,6 +70,7 @@ def notch_filt(data, Fs, band=10, freq=60, ripple=1, order=2, filter_type='butte
             # w (radians/sec) * (1 cycle/2pi*radians) = Hz
             f = w / (2 * np.pi)  # Hz
 
+        import matplotlib.pyplot as plt  # only needed to show the filter response
         plt.figure(figsize=(20, 15))
         plt.subplot(211)
         plt.semilogx(f, np.abs(h), 'b')
@@ -213,6 +216,7 @@ def iirfilt(bandtype, data, Fs, Wp, Ws=[], order=3, analog_val=False, automatic=
             # w (radians/sec) * (1 cycle/2pi*radians) = Hz
             f = w / (2 * np.pi)  # Hz
 
+        import matplotlib.pyplot as plt  # only needed to show the filter response
         plt.figure(figsize=(10, 5))
         plt.semilogx(f, np.abs(h), 'b')
         plt.xscale('log')
@@ -301,6 +305,7 @@ def notch_filt(data, Fs, band=10, freq=60, ripple=1, order=2, filter_type='butte
             # w (radians/sec) * (1 cycle/2pi*radians) = Hz
             f = w / (2 * np.pi)  # Hz
 
+        import matplotlib.pyplot as plt  # only needed to show the filter response
         plt.figure(figsize=(20, 15))
         plt.subplot(211)
         plt.semilogx(f, np.abs(h), 'b')
@@ -315,7 +320,7 @@ def notch_filt(data, Fs, band=10, freq=60, ripple=1, order=2, filter_type='butte
     return filtered_data
 
 def iirfilt(bandtype, data, Fs, Wp, Ws=[], order=3, analog_val=False, automatic=0, Rp=3, As=60, filttype='butter',
-            showresponse=0):
+            showresponse=0, dtype=None):
     '''Designs butterworth filter:
     Data is the data that you want filtered
     Fs is the sampling frequency (in Hz)
@@ -346,6 +351,9 @@ def iirfilt(bandtype, data, Fs, Wp, Ws=[], order=3, analog_val=False, automatic=
         Bessel/Thomson: ‘bessel’
 
     bandtype : {‘bandpass’, ‘lowpass’, ‘highpass’, ‘bandstop’}, optional
+
+    dtype : the precision of the filtered data (e.g. np.float32), by default the data is filtered in float64. A
+        reduced precision filters with second-order sections, the b, a coefficients are not stable enough in float32.
     '''
 
     cutoff = Wp
@@ -355,7 +363,15 @@ def iirfilt(bandtype, data, Fs, Wp, Ws=[], order=3, analog_val=False, automatic=
 
     b, a = get_a_b(bandtype, Fs, Wp, Ws, order=order, Rp=Rp, As=As, analog_val=analog_val, filttype=filttype, automatic=automatic)
 
-    if len(data) != 0:
+    if len(data) != 0 and dtype is not None and np.dtype(dtype) != np.float64:
+        sos = scipy.signal.tf2sos(b, a).astype(dtype)
+        data = np.asarray(data, dtype=dtype)
+        if len(data.shape) > 1:
+            filtered_data = scipy.signal.sosfiltfilt(sos, data, axis=1)
+        else:
+            filtered_data = scipy.signal.sosfiltfilt(sos, data)
+
+    elif len(data) != 0:
         if len(data.shape) > 1:
 
             filtered_data = np.zeros((data.shape[0], data.shape[1]))
@@ -391,6 +407,7 @@ def iirfilt(bandtype, data, Fs, Wp, Ws=[], order=3, analog_val=False, automatic=
             # w (radians/sec) * (1 cycle/2pi*radians) = Hz
             f = w / (2 * np.pi)  # Hz
 
+        import matplotlib.pyplot as plt  # only needed to show the filter response
         plt.figure(figsize=(10, 5))
         plt.semilogx(f, np.abs(h), 'b')
         plt.xscale('log')
@@ -499,6 +516,7 @@ def custom_cheby1(data, Fs, N, Rp, Wp, Ws=None, filtresponse='bandpass', analog_
             # w (radians/sample) * Fs (samples/sec) * (1 cycle/2pi*radians) = Hz
             f = Fs * w / (2 * np.pi)  # Hz
 
+            import matplotlib.pyplot as plt  # only needed to show the filter response
             plt.figure(figsize=(10, 5))
             # plt.subplot(211)
             plt.semilogx(f, np.abs(h), 'b')
@@ -575,6 +593,7 @@ def PlotResponse(a, b, fc, fs, analog_val):
         # w (radians/sec) * (1 cycle/2pi*radians) = Hz
         f = w / (2 * np.pi)  # Hz
 
+    import matplotlib.pyplot as plt  # only needed to show the filter response
     fig = plt.figure(figsize=(10, 5))
     ax = fig.add_subplot(111)
     # plt.subplot(211)
@@ -609,6 +628,7 @@ def fft_plot(Fs, Y):
     frq = frq[range(int(N / 2))]  # one side frequency range
 
     FFT = fftpack.fft(Y)  # fft computing and normalization
+    import matplotlib.pyplot as plt
     fig, ax = plt.subplots(1)
     ax.plot(frq, 2.0 / N * np.abs(FFT[0:int(N / 2)]), 'b')
 
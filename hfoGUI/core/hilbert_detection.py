@@ -0,0 +1,999 @@
+"""The Hilbert transform based HFO detection, without any GUI dependency so that it can run headless (the
+hilbert-batch/hilbert-watch CLI, the worker processes and the compute nodes without Qt). The Score window imports
+it from here."""
+import functools
+import itertools
+import os
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+from scipy.signal import hilbert
+from scipy.fft import next_fast_len
+
+import core.filtering as filt
+from core.profiling import profile_stage
+
+
+def hilbert_filter(raw_data, Fs, min_freq, max_freq, dtype=None):
+    """Filter the raw data prior to the Hilbert transform, a band-pass between min_freq and max_freq, a high-pass
+    if max_freq is the Nyquist frequency, or a low-pass if min_freq is 0. dtype is the precision of the filtered data
+    (float64 by default)."""
+
+    if max_freq != Fs / 2 and min_freq != 0:
+        filtered_data = filt.iirfilt(
+            bandtype='band', data=raw_data, Fs=Fs, Wp=min_freq, Ws=max_freq,
+            order=3, automatic=0, Rp=3, As=60, filttype='butter', showresponse=0, dtype=dtype
+        )
+    elif max_freq == Fs / 2:
+        filtered_data = filt.iirfilt(
+            bandtype='high', data=raw_data, Fs=Fs, Wp=min_freq, Ws=[],
+            order=3, automatic=0, Rp=3, As=60, filttype='butter', showresponse=0, dtype=dtype
+        )
+    elif min_freq == 0:
+        filtered_data = filt.iirfilt(
+            bandtype='low', data=raw_data, Fs=Fs, Wp=max_freq, Ws=[],
+            order=3, automatic=0, Rp=3, As=60, filttype='butter', showresponse=0, dtype=dtype
+        )
+    else:
+        filtered_data = np.array(raw_data, dtype=dtype)
+
+    return filtered_data
+
+
+# the guards of the streamed detection are long enough for the envelope of an impulse (through hilbert_filter and the
+# Hilbert transform) to have all but GUARD_TAIL_ENERGY of its energy, at most MAX_GUARD_SEC
+GUARD_TAIL_ENERGY = 1e-6
+MAX_GUARD_SEC = 60
+
+
+@functools.lru_cache(maxsize=None)
+def streaming_guard_samples(Fs, min_freq, max_freq):
+    """The samples of guard a chunk of hilbert_detect_events_streaming needs on either side for its envelope to match
+    the whole-recording envelope: the length of the impulse response of hilbert_filter followed by the Hilbert
+    transform. A band-pass response is short (tens of ms at 80-500 Hz), the response of the high-pass branch
+    (max_freq at the Nyquist frequency) decays slowly and its guard can reach MAX_GUARD_SEC."""
+    half_length = int(MAX_GUARD_SEC * Fs)
+    impulse = np.zeros(2 * half_length + 1)
+    impulse[half_length] = 1
+
+    energy = np.abs(hilbert(hilbert_filter(impulse, Fs, min_freq, max_freq))) ** 2
+
+    # the energy further than d samples from the impulse, for every d
+    distance_energy = energy[half_length:].copy()
+    distance_energy[1:] += energy[half_length - 1::-1]
+    tail_energy = np.sum(distance_energy) - np.cumsum(distance_energy)
+
+    return int(min(np.argmax(tail_energy <= GUARD_TAIL_ENERGY * np.sum(energy)) + 1, half_length))
+
+
+def hilbert_detect_events(raw_data, Fs, *, epoch, sd_num, min_duration, min_freq, max_freq,
+                          required_peak_number, required_peak_sd=None, boundary_fraction=0.3, verbose=False,
+                          epoch_workers=1, epoch_executor='thread', dtype=None, profile=None):
+    """Run the Hilbert-based automatic detection and return an array of [start_ms, stop_ms] rows.
+
+    dtype=np.float32 runs the detection in single precision (the analytic signal is complex64), which halves the
+    memory of the intermediate signals, see hilbert_precision_report for how much the events move. By default the
+    detection runs in float64.
+
+    With epoch_workers > 1 the epochs are evaluated concurrently by a pool of that many workers, either threads
+    (epoch_executor='thread') or processes (epoch_executor='process'). The workers share the read-only envelope and
+    rectified signals (through shared memory for the processes), and the epochs are then stitched together in order,
+    so the events are the same as the sequential evaluation.
+
+    profile is an optional core.profiling.StageProfile that records the wall time, samples and peak allocated bytes
+    of the iirfilt, hilbert, boundary search and RejectEOIs stages (with a thread or a process pool the epochs are
+    profiled as a whole).
+    """
+
+    with profile_stage(profile, 'iirfilt', len(raw_data)):
+        filtered_data = hilbert_filter(raw_data, Fs, min_freq, max_freq, dtype=dtype)
+
+        filtered_data -= np.mean(filtered_data)
+
+    epoch_window = int(epoch * Fs)
+    epoch_firsts = range(0, len(filtered_data), epoch_window + 1)
+
+    epoch_parameters = dict(Fs=Fs, epoch_length=epoch_window + 1, sd_num=sd_num, min_duration=min_duration,
+                            required_peak_number=required_peak_number, required_peak_sd=required_peak_sd,
+                            boundary_fraction=boundary_fraction)
+
+    if verbose:
+        print('Epoch window (samples): %d' % epoch_window)
+
+    shared_memory_blocks = []
+    try:
+        with profile_stage(profile, 'hilbert', len(filtered_data)):
+            if epoch_workers > 1 and epoch_executor == 'process':
+                # the envelope and rectified signal are written straight into shared memory for the worker processes
+                for _ in range(2):
+                    shared_memory_blocks.append(
+                        shared_memory.SharedMemory(create=True, size=max(filtered_data.nbytes, 1)))
+                hilbert_envelope, rectified_signal = [np.ndarray(filtered_data.shape, dtype=filtered_data.dtype,
+                                                                 buffer=block.buf)
+                                                      for block in shared_memory_blocks]
+            else:
+                hilbert_envelope = np.empty(filtered_data.shape, dtype=filtered_data.dtype)
+                rectified_signal = np.empty(filtered_data.shape, dtype=filtered_data.dtype)
+
+            np.abs(hilbert(filtered_data), out=hilbert_envelope)
+            np.abs(filtered_data, out=rectified_signal)
+
+        filtered_data = None
+
+        if epoch_workers <= 1:
+            epoch_results = (_evaluate_epoch(hilbert_envelope, rectified_signal, epoch_first, profile=profile,
+                                             **epoch_parameters)
+                             for epoch_first in epoch_firsts)
+            EOIs = _stitch_epochs(epoch_results, rectified_signal, Fs, verbose=verbose)
+
+        elif epoch_executor == 'process':
+            shared_names = [block.name for block in shared_memory_blocks]
+            with profile_stage(profile, 'epochs (process pool)', len(hilbert_envelope)), \
+                    ProcessPoolExecutor(max_workers=epoch_workers) as executor:
+                epoch_results = executor.map(functools.partial(_evaluate_shared_epoch, shared_names,
+                                                               len(hilbert_envelope), hilbert_envelope.dtype,
+                                                               **epoch_parameters),
+                                             epoch_firsts)
+                EOIs = _stitch_epochs(epoch_results, rectified_signal, Fs, verbose=verbose)
+
+        elif epoch_executor == 'thread':
+            # the stages of concurrent threads can't be told apart by tracemalloc (its peak is process wide), so the
+            # pool is profiled as a whole like the process pool
+            with profile_stage(profile, 'epochs (thread pool)', len(hilbert_envelope)), \
+                    ThreadPoolExecutor(max_workers=epoch_workers) as executor:
+                epoch_results = executor.map(functools.partial(_evaluate_epoch, hilbert_envelope, rectified_signal,
+                                                               **epoch_parameters),
+                                             epoch_firsts)
+                EOIs = _stitch_epochs(epoch_results, rectified_signal, Fs, verbose=verbose)
+
+        else:
+            raise ValueError('Invalid epoch executor: %s' % epoch_executor)
+
+    finally:
+        hilbert_envelope = None
+        rectified_signal = None
+        for block in shared_memory_blocks:
+            block.close()
+            block.unlink()
+
+    if len(EOIs) == 0:
+        return np.asarray([])
+
+    return np.asarray(EOIs)
+
+
+def _evaluate_epoch(hilbert_envelope, rectified_signal, epoch_first, *, Fs, epoch_length, sd_num, min_duration,
+                    required_peak_number, required_peak_sd, boundary_fraction, profile=None):
+    """Evaluates a single epoch of the Hilbert detection, independently of the other epochs.
+
+    Returns:
+        window_EOIs (ndarray): the merged [start_ms, stop_ms] rows of the epoch that are long enough (before the peak
+            rejection, the stitching with the previous epoch needs the first one).
+        kept_eois (ndarray): boolean array of the window_EOIs that have the required peaks.
+        window_mean (float): the mean of the envelope in this epoch.
+        window_std (float): the standard deviation of the envelope in this epoch.
+        epoch_last (int): the index of the last sample of this epoch.
+    """
+    window_data = hilbert_envelope[epoch_first:epoch_first + epoch_length]
+    epoch_last = epoch_first + len(window_data) - 1
+
+    with profile_stage(profile, 'boundary search', len(window_data)):
+        window_mean = np.mean(window_data)
+        window_std = np.std(window_data)
+        threshold = window_mean + sd_num * window_std
+
+        peri_boundary_samples = int((200 / 1000) * Fs)
+
+        eoi_start_indices, eoi_stop_indices = find_eoi_boundaries(window_data, threshold, boundary_fraction,
+                                                                  peri_boundary_samples)
+
+        window_EOIs = np.zeros((0, 2))
+
+        # If no samples exceed threshold (or none had boundaries), there is nothing in this epoch
+        if len(eoi_start_indices) != 0:
+            window_EOIs = merge_eois(np.column_stack(((1000 / Fs) * (epoch_first + eoi_start_indices),
+                                                      (1000 / Fs) * (epoch_first + eoi_stop_indices))))
+
+            rejected_eois = np.where(np.diff(window_EOIs) < min_duration)[0]
+            if len(rejected_eois) > 0:
+                window_EOIs = np.delete(window_EOIs, rejected_eois, axis=0)
+
+    if required_peak_sd is None:
+        required_peak_threshold = None
+    else:
+        required_peak_threshold = window_mean + required_peak_sd * window_std
+
+    with profile_stage(profile, 'RejectEOIs', len(window_data)):
+        kept_eois = find_peaked_eois(window_EOIs, rectified_signal, Fs, required_peak_threshold,
+                                     required_peak_number)
+
+    return window_EOIs, kept_eois, window_mean, window_std, epoch_last
+
+
+def _evaluate_shared_epoch(shared_names, n_samples, dtype, epoch_first, **epoch_parameters):
+    """Evaluates an epoch in a worker process, from the envelope and rectified signal in shared memory."""
+    shared_memory_blocks = [shared_memory.SharedMemory(name=name) for name in shared_names]
+    try:
+        hilbert_envelope, rectified_signal = [np.ndarray((n_samples,), dtype=dtype, buffer=block.buf)
+                                              for block in shared_memory_blocks]
+        epoch_result = _evaluate_epoch(hilbert_envelope, rectified_signal, epoch_first, **epoch_parameters)
+        hilbert_envelope = None
+        rectified_signal = None
+        return epoch_result
+    finally:
+        for block in shared_memory_blocks:
+            block.close()
+
+
+def _stitch_epochs(epoch_results, rectified_signal, Fs, verbose=False):
+    """Stitches the evaluated epochs together in order, an EOI starting less than 10 ms after the last EOI of the
+    previous epoch is merged with it (and that merged EOI is checked for peaks again)."""
+    EOIs = []
+
+    last_sample = len(rectified_signal) - 1
+
+    for window_EOIs, kept_eois, window_mean, window_std, epoch_last in epoch_results:
+
+        if verbose:
+            print('Analyzing times up to %f sec (%f percent of the data)' %
+                  ((1000 / Fs) * epoch_last / 1000, 100 * epoch_last / last_sample))
+
+        if len(window_EOIs) == 0:
+            continue
+
+        if len(EOIs) != 0:
+
+            if window_EOIs[0, 0] - EOIs[-1, 1] < 10:
+                EOIs[-1, 1] = window_EOIs[0, 0]
+                window_EOIs = window_EOIs[1:, :]
+                kept_eois = kept_eois[1:]
+
+                if not find_peaked_eois(EOIs[-1:, :], rectified_signal, Fs, window_mean + 2 * window_std, 6)[0]:
+                    EOIs = EOIs[:-1, :]
+
+            EOIs = np.vstack((EOIs, window_EOIs[kept_eois]))
+        else:
+
+            EOIs = window_EOIs[kept_eois]
+
+    return EOIs
+
+
+def hilbert_detect_events_streaming(raw_data, Fs, *, chunk_sec, epoch, sd_num, min_duration, min_freq, max_freq,
+                                    required_peak_number, required_peak_sd=None, boundary_fraction=0.3, scalar=1,
+                                    guard_sec=1.0, verbose=False, dtype=None):
+    """Run the Hilbert-based automatic detection in overlapping chunks so that the memory is bounded by the chunk
+    size instead of the recording length, and return an array of [start_ms, stop_ms] rows.
+
+    The full length filtered, analytic and rectified signals of hilbert_detect_events are never built. raw_data only
+    has to support slicing (the array returned by ReadEEG, a memmap, etc.) and each chunk is multiplied by scalar
+    (e.g. the bits2uV scalar) as it is read. Every chunk is filtered and Hilbert transformed with guard_sec of the
+    neighbouring data on either side (at least guard_sec, longer if the impulse response of the filter and Hilbert
+    transform is, see streaming_guard_samples), so the filter transients and the Hilbert edge effects fall in samples
+    that are thrown away.
+
+    The edge effects left are tiny but not zero, so an envelope within them of a threshold can cross it a few samples
+    earlier or later than in hilbert_detect_events: event boundaries can move by a few samples, and rarely such an
+    event is split, joined or dropped.
+
+    The data is streamed three times: once for the mean of the filtered signal, once for the per-epoch mean and
+    standard deviation of the envelope, and once for the detection. During the detection a run of the envelope that
+    is cut by the end of a chunk is carried over to the next chunk, and the local maxima of the rectified signal are
+    only kept around the candidate EOIs (for the peak rejection), so the events are stitched across the chunks as if
+    each epoch had been processed at once.
+
+    dtype=np.float32 streams the chunks in single precision (see hilbert_detect_events).
+    """
+
+    n_samples = len(raw_data)
+    if n_samples == 0:
+        return np.asarray([])
+
+    chunk_samples = max(int(chunk_sec * Fs), 1)
+    epoch_window = int(epoch * Fs)
+    epoch_length = epoch_window + 1  # the epochs of hilbert_detect_events are epoch_window + 1 samples long
+    n_epochs = int(np.ceil(n_samples / epoch_length))
+
+    peri_boundary_samples = int((200 / 1000) * Fs)
+    merge_samples = int(np.ceil(10 * Fs / 1000)) + 1  # the 10 ms merge gap between EOIs
+    guard_samples = max(int(guard_sec * Fs), streaming_guard_samples(Fs, min_freq, max_freq),
+                        peri_boundary_samples + merge_samples + 4)
+
+    guard_taper = 0.5 - 0.5 * np.cos(np.pi * np.arange(guard_samples) / guard_samples)
+
+    t_scale = 1000 / Fs
+
+    def filter_segment(first, last):
+        # filters the samples from first to last with the guard samples on either side, returns the padded data
+        padded_first = max(first - guard_samples, 0)
+        padded_last = min(last + guard_samples, n_samples)
+        data = np.multiply(raw_data[padded_first:padded_last], scalar, dtype=dtype or float)
+        return hilbert_filter(data, Fs, min_freq, max_freq, dtype=dtype), padded_first
+
+    def envelope_segment(first, last):
+        filtered_data, padded_first = filter_segment(first, last)
+        filtered_data -= filtered_mean
+        rectified_signal = np.abs(filtered_data)
+
+        # the guards are tapered to 0 (a half cosine) so that the segment doesn't end abruptly, the Hilbert transform
+        # of an abrupt end only fades as 1 / distance into the samples kept
+        leading_guard, trailing_guard = first - padded_first, padded_first + len(filtered_data) - last
+        filtered_data[:leading_guard] *= guard_taper[guard_samples - leading_guard:]
+        filtered_data[len(filtered_data) - trailing_guard:] *= guard_taper[::-1][:trailing_guard]
+
+        analytic_signal = hilbert(filtered_data, N=next_fast_len(len(filtered_data)))[:len(filtered_data)]
+        return np.abs(analytic_signal), rectified_signal, padded_first
+
+    if verbose:
+        print('Streaming %d samples in chunks of %d samples (guard: %d samples)' %
+              (n_samples, chunk_samples, guard_samples))
+
+    # ---------------- first pass: the mean of the filtered signal ---------------------
+    filtered_sum = 0.0
+    for first in range(0, n_samples, chunk_samples):
+        last = min(first + chunk_samples, n_samples)
+        filtered_data, padded_first = filter_segment(first, last)
+        filtered_sum += np.sum(filtered_data[first - padded_first:last - padded_first])
+
+    filtered_mean = filtered_sum / n_samples
+
+    # ---------------- second pass: the envelope statistics of each epoch ---------------------
+    epoch_count = np.zeros(n_epochs)
+    epoch_mean = np.zeros(n_epochs)
+    epoch_m2 = np.zeros(n_epochs)
+
+    for first in range(0, n_samples, chunk_samples):
+        last = min(first + chunk_samples, n_samples)
+        hilbert_envelope, _, padded_first = envelope_segment(first, last)
+
+        for epoch_index in range(first // epoch_length, (last - 1) // epoch_length + 1):
+            piece_first = max(epoch_index * epoch_length, first)
+            piece_last = min((epoch_index + 1) * epoch_length, last)
+            piece = hilbert_envelope[piece_first - padded_first:piece_last - padded_first]
+
+            # combine the statistics of this piece with the rest of the epoch (Chan et al.)
+            piece_count = len(piece)
+            piece_mean = np.mean(piece)
+            piece_m2 = np.sum((piece - piece_mean) ** 2)
+
+            count = epoch_count[epoch_index] + piece_count
+            delta = piece_mean - epoch_mean[epoch_index]
+            epoch_mean[epoch_index] += delta * piece_count / count
+            epoch_m2[epoch_index] += piece_m2 + delta ** 2 * epoch_count[epoch_index] * piece_count / count
+            epoch_count[epoch_index] = count
+
+    epoch_std = np.sqrt(epoch_m2 / epoch_count)
+
+    # ---------------- third pass: the detection ---------------------
+    EOIs = []
+    peak_indices = np.array([], dtype=int)
+    peak_values = np.array([])
+
+    for epoch_index in range(n_epochs):
+        epoch_first = epoch_index * epoch_length
+        epoch_last = min(epoch_first + epoch_length, n_samples)
+
+        if verbose:
+            print('Analyzing times up to %f sec (%f percent of the data)' %
+                  (t_scale * (epoch_last - 1) / 1000, 100 * (epoch_last - 1) / (n_samples - 1)))
+
+        window_mean = epoch_mean[epoch_index]
+        window_std = epoch_std[epoch_index]
+        threshold = window_mean + sd_num * window_std
+
+        eoi_start_indices = []
+        eoi_stop_indices = []
+        epoch_peak_indices = [peak_indices]
+        epoch_peak_values = [peak_values]
+
+        first = epoch_first
+        last = min(first + chunk_samples, epoch_last)
+        while first < epoch_last:
+            window_first = max(first - peri_boundary_samples, epoch_first)
+            window_last = min(last + peri_boundary_samples, epoch_last)
+
+            hilbert_envelope, rectified_signal, padded_first = envelope_segment(window_first, window_last)
+
+            run_starts, run_stops, start_indices, stop_indices, accepted = _find_run_boundaries(
+                hilbert_envelope[window_first - padded_first:window_last - padded_first], threshold,
+                boundary_fraction, peri_boundary_samples)
+
+            run_starts = run_starts + window_first
+            run_stops = run_stops + window_first
+
+            # the runs starting in this chunk belong to it, the ones whose stop could be past the window are carried
+            owned = (run_starts >= first) & (run_starts < last)
+            cut = owned & (run_stops + peri_boundary_samples > window_last - 1) & (window_last < epoch_last)
+
+            if cut.any():
+                carry = run_starts[cut][0]
+                if carry == first:
+                    # the run is longer than the chunk, so grow the chunk until it fits
+                    last = min(last + chunk_samples, epoch_last)
+                    continue
+                owned &= run_starts < carry
+                next_first = carry
+            else:
+                next_first = last
+
+            start_indices = start_indices[owned & accepted] + window_first
+            stop_indices = stop_indices[owned & accepted] + window_first
+            eoi_start_indices.append(start_indices)
+            eoi_stop_indices.append(stop_indices)
+
+            if len(start_indices) > 0:
+                # the local maxima of the rectified signal spanned by the candidates (and their merge gaps)
+                coverage = np.zeros(len(rectified_signal) + 1, dtype=int)
+                np.add.at(coverage, np.clip(start_indices - 2 - padded_first, 1, len(rectified_signal) - 1), 1)
+                np.add.at(coverage, np.clip(stop_indices + merge_samples + 3 - padded_first, 1,
+                                            len(rectified_signal) - 1), -1)
+                covered = np.cumsum(coverage[:-1]) > 0
+
+                is_peak = np.zeros(len(rectified_signal), dtype=bool)
+                is_peak[1:-1] = ((rectified_signal[1:-1] > rectified_signal[:-2]) &
+                                 (rectified_signal[2:] <= rectified_signal[1:-1]))
+                chunk_peaks = np.where(is_peak & covered)[0]
+
+                epoch_peak_indices.append(chunk_peaks + padded_first)
+                epoch_peak_values.append(rectified_signal[chunk_peaks])
+
+            first = next_first
+            last = min(first + chunk_samples, epoch_last)
+
+        peak_indices, unique_indices = np.unique(np.concatenate(epoch_peak_indices), return_index=True)
+        peak_values = np.concatenate(epoch_peak_values)[unique_indices]
+
+        eoi_start_indices = np.concatenate(eoi_start_indices)
+        eoi_stop_indices = np.concatenate(eoi_stop_indices)
+
+        if len(eoi_start_indices) == 0:
+            continue
+
+        window_EOIs = merge_eois(np.column_stack((t_scale * eoi_start_indices, t_scale * eoi_stop_indices)))
+
+        rejected_eois = np.where(np.diff(window_EOIs) < min_duration)[0]
+        if len(rejected_eois) > 0:
+            window_EOIs = np.delete(window_EOIs, rejected_eois, axis=0)
+
+        if len(window_EOIs) == 0:
+            continue
+
+        if required_peak_sd is None:
+            required_peak_threshold = None
+        else:
+            required_peak_threshold = window_mean + required_peak_sd * window_std
+
+        if len(EOIs) != 0:
+
+            if window_EOIs[0, 0] - EOIs[-1, 1] < 10:
+                EOIs[-1, 1] = window_EOIs[0, 0]
+                window_EOIs = window_EOIs[1:, :]
+
+                if not count_eoi_peaks(EOIs[-1:, :], peak_indices, peak_values, Fs,
+                                       window_mean + 2 * window_std)[0] >= 6:
+                    EOIs = EOIs[:-1, :]
+
+            window_EOIs = window_EOIs[count_eoi_peaks(window_EOIs, peak_indices, peak_values, Fs,
+                                                      required_peak_threshold) >= required_peak_number]
+
+            EOIs = np.vstack((EOIs, window_EOIs))
+        else:
+
+            EOIs = window_EOIs[count_eoi_peaks(window_EOIs, peak_indices, peak_values, Fs,
+                                               required_peak_threshold) >= required_peak_number]
+
+        # only the peaks of the latest EOI can be needed again (when it is merged with the next epoch)
+        if len(EOIs) != 0:
+            kept_peaks = peak_indices >= int(Fs * EOIs[-1, 0] / 1000)
+        else:
+            kept_peaks = np.zeros(len(peak_indices), dtype=bool)
+        peak_indices = peak_indices[kept_peaks]
+        peak_values = peak_values[kept_peaks]
+
+    if len(EOIs) == 0:
+        return np.asarray([])
+
+    return np.asarray(EOIs)
+
+
+def hilbert_detect_events_multichannel(raw_data, Fs, *, epoch, sd_num, min_duration, min_freq, max_freq,
+                                       required_peak_number, required_peak_sd=None, boundary_fraction=0.3,
+                                       verbose=False, dtype=None):
+    """Run the Hilbert-based automatic detection on every channel (row) of the 2D raw_data at once.
+
+    The channels are filtered with a single filtfilt along the rows and Hilbert transformed together, then the epochs
+    of each channel are evaluated like hilbert_detect_events. Returns a list with the [start_ms, stop_ms] rows of
+    each channel.
+    """
+    raw_data = np.atleast_2d(raw_data)
+
+    filtered_data = hilbert_filter(raw_data, Fs, min_freq, max_freq, dtype=dtype)
+
+    filtered_data -= np.mean(filtered_data, axis=1, keepdims=True)
+
+    hilbert_envelope = np.abs(hilbert(filtered_data, axis=1))
+    rectified_signal = np.abs(filtered_data)
+    filtered_data = None
+
+    epoch_window = int(epoch * Fs)
+    epoch_parameters = dict(Fs=Fs, epoch_length=epoch_window + 1, sd_num=sd_num, min_duration=min_duration,
+                            required_peak_number=required_peak_number, required_peak_sd=required_peak_sd,
+                            boundary_fraction=boundary_fraction)
+
+    channel_events = []
+    for channel in range(raw_data.shape[0]):
+
+        if verbose:
+            print('Channel %d of %d' % (channel + 1, raw_data.shape[0]))
+
+        epoch_results = (_evaluate_epoch(hilbert_envelope[channel], rectified_signal[channel], epoch_first,
+                                         **epoch_parameters)
+                         for epoch_first in range(0, raw_data.shape[1], epoch_window + 1))
+
+        EOIs = _stitch_epochs(epoch_results, rectified_signal[channel], Fs, verbose=verbose)
+
+        if len(EOIs) == 0:
+            channel_events.append(np.asarray([]))
+        else:
+            channel_events.append(np.asarray(EOIs))
+
+    return channel_events
+
+
+def event_cooccurrence(channel_events, channel_names=None):
+    """Returns a DataFrame where the (i, j) cell is the number of events of channel i that overlap at least one event
+    of channel j, the diagonal is the number of events of each channel.
+
+    channel_events is a list of [start_ms, stop_ms] arrays (sorted and not overlapping, like the detections return
+    them), channel_names are the row/column labels (default: the channel index).
+    """
+    if channel_names is None:
+        channel_names = list(range(len(channel_events)))
+
+    channel_events = [np.asarray(events).reshape((-1, 2)) for events in channel_events]
+
+    cooccurrence = np.zeros((len(channel_events), len(channel_events)), dtype=int)
+    for i, events in enumerate(channel_events):
+        for j, other_events in enumerate(channel_events):
+            if len(events) == 0 or len(other_events) == 0:
+                continue
+
+            # the first event of the other channel that stops after each event starts, overlaps if it starts before
+            # the event stops
+            first_after = np.searchsorted(other_events[:, 1], events[:, 0], side='right')
+            overlapping = first_after < len(other_events)
+            overlapping[overlapping] = other_events[first_after[overlapping], 0] < events[overlapping, 1]
+
+            cooccurrence[i, j] = np.sum(overlapping)
+
+    return pd.DataFrame(cooccurrence, index=channel_names, columns=channel_names)
+
+
+def intermediates_key(source, filename, *, epoch, min_freq, max_freq):
+    """The key of the intermediates of hilbert_detection_intermediates computed on a loaded source, it identifies the
+    loaded data (the source object and the modification time and size of its file) and not only its filename, so that
+    a source re-loaded from a rewritten file doesn't reuse the intermediates of the old data."""
+    try:
+        stat = os.stat(filename)
+        file_identity = (stat.st_mtime_ns, stat.st_size)
+    except OSError:
+        file_identity = None
+
+    return filename, id(source), file_identity, epoch, min_freq, max_freq
+
+
+def hilbert_detection_intermediates(raw_data, Fs, *, epoch, min_freq, max_freq, dtype=None):
+    """Computes the intermediates of hilbert_detect_events that don't depend on the threshold parameters, so that
+    hilbert_detect_from_intermediates (or hilbert_sweep) can evaluate any number of threshold parameters without
+    filtering and Hilbert transforming the data again.
+
+    Returns a dictionary with the envelope and rectified signal, the first sample, mean and standard deviation of the
+    envelope of each epoch, and the (sorted) indices and values of the local maxima of the rectified signal.
+    """
+    filtered_data = hilbert_filter(raw_data, Fs, min_freq, max_freq, dtype=dtype)
+
+    filtered_data -= np.mean(filtered_data)
+
+    hilbert_envelope = np.abs(hilbert(filtered_data))
+    rectified_signal = np.abs(filtered_data)
+    filtered_data = None
+
+    epoch_length = int(epoch * Fs) + 1
+    epoch_firsts = np.arange(0, len(hilbert_envelope), epoch_length)
+
+    epoch_means = np.array([np.mean(hilbert_envelope[epoch_first:epoch_first + epoch_length])
+                            for epoch_first in epoch_firsts])
+    epoch_stds = np.array([np.std(hilbert_envelope[epoch_first:epoch_first + epoch_length])
+                           for epoch_first in epoch_firsts])
+
+    peak_indices = find_local_maxima(rectified_signal)
+
+    return {
+        'Fs': Fs,
+        'hilbert_envelope': hilbert_envelope,
+        'rectified_signal': rectified_signal,
+        'epoch_length': epoch_length,
+        'epoch_firsts': epoch_firsts,
+        'epoch_means': epoch_means,
+        'epoch_stds': epoch_stds,
+        'peak_indices': peak_indices,
+        'peak_values': rectified_signal[peak_indices],
+    }
+
+
+def _find_epoch_candidates(intermediates, sd_num, boundary_fraction):
+    """Returns the merged [start_ms, stop_ms] EOIs of each epoch (before the duration and the peak rejection)."""
+    Fs = intermediates['Fs']
+    epoch_length = intermediates['epoch_length']
+    peri_boundary_samples = int((200 / 1000) * Fs)
+
+    epoch_candidates = []
+    for epoch_first, window_mean, window_std in zip(intermediates['epoch_firsts'], intermediates['epoch_means'],
+                                                    intermediates['epoch_stds']):
+
+        window_data = intermediates['hilbert_envelope'][epoch_first:epoch_first + epoch_length]
+        threshold = window_mean + sd_num * window_std
+
+        eoi_start_indices, eoi_stop_indices = find_eoi_boundaries(window_data, threshold, boundary_fraction,
+                                                                  peri_boundary_samples)
+
+        if len(eoi_start_indices) == 0:
+            epoch_candidates.append(np.zeros((0, 2)))
+            continue
+
+        epoch_candidates.append(merge_eois(np.column_stack(((1000 / Fs) * (epoch_first + eoi_start_indices),
+                                                             (1000 / Fs) * (epoch_first + eoi_stop_indices)))))
+
+    return epoch_candidates
+
+
+def _select_epoch_eois(intermediates, epoch_candidates, min_duration, required_peak_number, required_peak_sd):
+    """Applies the duration and the peak rejection to the candidates of each epoch, and stitches the epochs."""
+    Fs = intermediates['Fs']
+
+    epoch_results = []
+    for window_EOIs, window_mean, window_std, epoch_first in zip(epoch_candidates, intermediates['epoch_means'],
+                                                                 intermediates['epoch_stds'],
+                                                                 intermediates['epoch_firsts']):
+
+        window_EOIs = window_EOIs[np.diff(window_EOIs).flatten() >= min_duration]
+
+        if required_peak_sd is None:
+            required_peak_threshold = None
+        else:
+            required_peak_threshold = window_mean + required_peak_sd * window_std
+
+        epoch_last = min(epoch_first + intermediates['epoch_length'], len(intermediates['rectified_signal'])) - 1
+
+        # only the peaks of this epoch can be within its EOIs
+        first_peak, last_peak = np.searchsorted(intermediates['peak_indices'], [epoch_first, epoch_last + 1])
+
+        kept_eois = count_eoi_peaks(window_EOIs, intermediates['peak_indices'][first_peak:last_peak],
+                                    intermediates['peak_values'][first_peak:last_peak], Fs,
+                                    required_peak_threshold) >= required_peak_number
+        epoch_results.append((window_EOIs, kept_eois, window_mean, window_std, epoch_last))
+
+    EOIs = _stitch_epochs(epoch_results, intermediates['rectified_signal'], Fs)
+
+    if len(EOIs) == 0:
+        return np.asarray([])
+
+    return np.asarray(EOIs)
+
+
+def hilbert_detect_from_intermediates(intermediates, *, sd_num, min_duration, required_peak_number,
+                                      required_peak_sd=None, boundary_fraction=0.3):
+    """Run the Hilbert-based automatic detection on the intermediates of hilbert_detection_intermediates, and return
+    the same [start_ms, stop_ms] rows as hilbert_detect_events."""
+    epoch_candidates = _find_epoch_candidates(intermediates, sd_num, boundary_fraction)
+
+    return _select_epoch_eois(intermediates, epoch_candidates, min_duration, required_peak_number, required_peak_sd)
+
+
+def hilbert_sweep(raw_data, Fs, *, epoch, min_freq, max_freq, sd_num, min_duration, required_peak_number,
+                  required_peak_sd=None, boundary_fraction=0.3, dtype=None, verbose=False):
+    """Run the Hilbert-based automatic detection for every combination (grid) of the threshold parameters.
+
+    sd_num, min_duration, required_peak_number, required_peak_sd and boundary_fraction can each be a single value or
+    a list of values. The data is filtered and Hilbert transformed once (hilbert_detection_intermediates), and the
+    boundaries are only searched once per (sd_num, boundary_fraction) pair, so a sweep costs little more than a single
+    detection.
+
+    Returns a DataFrame with a row per parameter set, its parameters and the number of events detected (in the
+    order of the grid).
+    """
+
+    def as_list(value):
+        if isinstance(value, (list, tuple, np.ndarray)):
+            return list(value)
+        return [value]
+
+    sd_num, min_duration, required_peak_number, required_peak_sd, boundary_fraction = [
+        as_list(value) for value in [sd_num, min_duration, required_peak_number, required_peak_sd, boundary_fraction]]
+
+    intermediates = hilbert_detection_intermediates(raw_data, Fs, epoch=epoch, min_freq=min_freq, max_freq=max_freq,
+                                                    dtype=dtype)
+
+    event_counts = {}
+    for sd_index, current_sd_num in enumerate(sd_num):
+        for boundary_index, current_boundary_fraction in enumerate(boundary_fraction):
+
+            if verbose:
+                print('Finding the EOIs (threshold: %s SD, boundary fraction: %s)' %
+                      (current_sd_num, current_boundary_fraction))
+
+            epoch_candidates = _find_epoch_candidates(intermediates, current_sd_num, current_boundary_fraction)
+
+            for duration_index, current_min_duration in enumerate(min_duration):
+                for peak_index, current_peak_number in enumerate(required_peak_number):
+                    for peak_sd_index, current_peak_sd in enumerate(required_peak_sd):
+                        EOIs = _select_epoch_eois(intermediates, epoch_candidates, current_min_duration,
+                                                  current_peak_number, current_peak_sd)
+
+                        event_counts[sd_index, duration_index, peak_index, peak_sd_index, boundary_index] = len(EOIs)
+
+    rows = []
+    for indices in itertools.product(*[range(len(values)) for values in [sd_num, min_duration, required_peak_number,
+                                                                          required_peak_sd, boundary_fraction]]):
+        sd_index, duration_index, peak_index, peak_sd_index, boundary_index = indices
+        rows.append({
+            'sd_num': sd_num[sd_index],
+            'min_duration': min_duration[duration_index],
+            'required_peak_number': required_peak_number[peak_index],
+            'required_peak_sd': required_peak_sd[peak_sd_index],
+            'boundary_fraction': boundary_fraction[boundary_index],
+            'events': event_counts[indices],
+        })
+
+    return pd.DataFrame(rows, columns=['sd_num', 'min_duration', 'required_peak_number', 'required_peak_sd',
+                                       'boundary_fraction', 'events'])
+
+
+def hilbert_precision_report(raw_data, Fs, dtype=np.float32, **detection_parameters):
+    """Runs hilbert_detect_events in float64 and in the reduced precision dtype and reports how far the events move.
+
+    Each reduced precision event is matched to the float64 event it overlaps the most. Returns a dictionary with the
+    number of events of each run, the number of matched / unmatched events, and the maximum, mean and 99th percentile
+    of the absolute start and stop shifts (in ms) of the matched events.
+    """
+    reference_events = hilbert_detect_events(np.array(raw_data, dtype=float), Fs, **detection_parameters)
+    events = hilbert_detect_events(raw_data, Fs, dtype=dtype, **detection_parameters)
+
+    reference_events = np.asarray(reference_events).reshape((-1, 2))
+    events = np.asarray(events).reshape((-1, 2))
+
+    report = {
+        'dtype': np.dtype(dtype).name,
+        'reference_events': len(reference_events),
+        'events': len(events),
+        'matched_events': 0,
+        'unmatched_reference_events': len(reference_events),
+        'unmatched_events': len(events),
+    }
+
+    matched_reference = np.zeros(len(reference_events), dtype=bool)
+    matched = np.zeros(len(events), dtype=bool)
+    start_shifts = []
+    stop_shifts = []
+
+    if len(reference_events) != 0:
+        for k, (start, stop) in enumerate(events):
+            # the reference events (sorted and not overlapping) that overlap this event
+            first = np.searchsorted(reference_events[:, 1], start, side='left')
+            last = np.searchsorted(reference_events[:, 0], stop, side='right')
+            if last <= first:
+                continue
+
+            overlaps = (np.minimum(reference_events[first:last, 1], stop) -
+                        np.maximum(reference_events[first:last, 0], start))
+            best = first + int(np.argmax(overlaps))
+            if matched_reference[best]:
+                continue
+
+            matched_reference[best] = True
+            matched[k] = True
+            start_shifts.append(abs(start - reference_events[best, 0]))
+            stop_shifts.append(abs(stop - reference_events[best, 1]))
+
+    report['matched_events'] = int(np.sum(matched))
+    report['unmatched_reference_events'] = int(np.sum(~matched_reference))
+    report['unmatched_events'] = int(np.sum(~matched))
+
+    for name, shifts in [('start', start_shifts), ('stop', stop_shifts)]:
+        shifts = np.asarray(shifts, dtype=float)
+        if len(shifts) == 0:
+            shifts = np.zeros(1)
+        report['%s_shift_max_ms' % name] = float(np.max(shifts))
+        report['%s_shift_mean_ms' % name] = float(np.mean(shifts))
+        report['%s_shift_p99_ms' % name] = float(np.percentile(shifts, 99))
+
+    return report
+
+
+def find_eoi_boundaries(envelope, threshold, boundary_fraction, peri_boundary_samples):
+    """Find the start and stop sample of every supra-threshold run of the envelope in one vectorized pass.
+
+    The runs of consecutive samples at or above the threshold are run-length encoded from the threshold mask. The
+    start of an EOI is the last sample at or below (boundary_fraction * threshold) within the peri_boundary_samples
+    preceding its run, and the stop is the first such sample within the peri_boundary_samples following it. Both are
+    found with a searchsorted against the indices of the boundary mask. Runs missing either boundary are rejected.
+
+    Args:
+        envelope (ndarray): the Hilbert envelope of the epoch.
+        threshold (float): the detection threshold of the epoch.
+        boundary_fraction (float): the fraction of the threshold that defines the EOI boundaries.
+        peri_boundary_samples (int): how many samples to search on either side of a run for its boundaries.
+
+    Returns:
+        start_indices (ndarray): the start sample of each accepted EOI.
+        stop_indices (ndarray): the stop sample of each accepted EOI.
+    """
+    _, _, start_indices, stop_indices, accepted = _find_run_boundaries(envelope, threshold, boundary_fraction,
+                                                                      peri_boundary_samples)
+
+    return start_indices[accepted], stop_indices[accepted]
+
+
+def _find_run_boundaries(envelope, threshold, boundary_fraction, peri_boundary_samples):
+    """The per-run version of find_eoi_boundaries, returns (run_starts, run_stops, start_indices, stop_indices,
+    accepted) where accepted flags the runs that have both boundaries."""
+    empty = np.array([], dtype=int)
+
+    above_threshold = np.asarray(envelope >= threshold, dtype=np.int8)
+    if not above_threshold.any():
+        return empty, empty, empty, empty, np.array([], dtype=bool)
+
+    run_edges = np.diff(np.concatenate(([0], above_threshold, [0])))
+    run_starts = np.where(run_edges == 1)[0]
+    run_stops = np.where(run_edges == -1)[0] - 1
+
+    boundary_indices = np.where(envelope <= boundary_fraction * threshold)[0]
+    if len(boundary_indices) == 0:
+        return run_starts, run_stops, run_starts.copy(), run_stops.copy(), np.zeros(len(run_starts), dtype=bool)
+
+    last_index = len(envelope) - 1
+
+    # the last boundary sample within the search window preceding each run (window is clipped to the epoch)
+    search_first = np.maximum(run_starts - peri_boundary_samples, 0)
+    search_last = np.maximum(run_starts - 1, 0)
+    boundary_position = np.searchsorted(boundary_indices, search_last, side='right') - 1
+    has_start = boundary_position >= 0
+    start_indices = boundary_indices[np.maximum(boundary_position, 0)]
+    has_start &= start_indices >= search_first
+
+    # the first boundary sample within the search window following each run
+    search_first = np.minimum(run_stops + 1, last_index)
+    search_last = np.minimum(run_stops + peri_boundary_samples, last_index)
+    boundary_position = np.searchsorted(boundary_indices, search_first, side='left')
+    has_stop = boundary_position < len(boundary_indices)
+    stop_indices = boundary_indices[np.minimum(boundary_position, len(boundary_indices) - 1)]
+    has_stop &= stop_indices <= search_last
+
+    return run_starts, run_stops, start_indices, stop_indices, has_start & has_stop
+
+
+def merge_eois(EOIs, merge_gap=10):
+    """Merge overlapping EOIs, and then EOIs that are separated by less than merge_gap (ms), in bulk.
+
+    An EOI that starts before the latest stop seen so far is absorbed into the EOI that it overlaps, afterwards any EOI
+    that starts less than merge_gap after the previous one stops is joined to it.
+
+    Args:
+        EOIs (ndarray): an Nx2 array of [start_ms, stop_ms] rows in the order they were detected.
+        merge_gap (float): the gap (ms) below which neighbouring EOIs are joined.
+
+    Returns:
+        EOIs (ndarray): the merged Mx2 array of [start_ms, stop_ms] rows.
+    """
+    if len(EOIs) == 0:
+        return EOIs
+
+    starts = EOIs[:, 0]
+    stops = EOIs[:, 1]
+
+    latest_stop = np.maximum.accumulate(stops)
+    first_indices = np.where(np.concatenate(([True], starts[1:] > latest_stop[:-1])))[0]
+    starts = starts[first_indices]
+    stops = np.maximum.reduceat(stops, first_indices)
+
+    first_indices = np.where(np.concatenate(([True], ~(starts[1:] - stops[:-1] < merge_gap))))[0]
+    last_indices = np.append(first_indices[1:] - 1, len(starts) - 1)
+
+    return np.column_stack((starts[first_indices], stops[last_indices]))
+
+
+def RejectEOIs(EOIs, rectified_signal, Fs, threshold, required_peaks):
+    # reject events that don't have the required_peaks above the designated threshold, if there is no threshold and
+    # you just want an N number of peaks, then leave the threshold as None (or blank in the GUI)
+    return EOIs[find_peaked_eois(EOIs, rectified_signal, Fs, threshold, required_peaks)]
+
+
+def find_peaked_eois(EOIs, rectified_signal, Fs, threshold, required_peaks):
+    """Returns a boolean array of the EOIs that have the required_peaks (above the threshold if it isn't None).
+
+    The local maxima of the rectified signal are found once over the span of the EOIs and counted for every EOI with
+    count_eoi_peaks, which gives the same counts as detect_peaks on the slice of each EOI.
+    """
+    EOIs = np.asarray(EOIs).reshape((-1, 2))
+
+    if len(EOIs) == 0:
+        return np.ones(0, dtype=bool)
+
+    peak_indices = find_local_maxima(rectified_signal, int(Fs * np.min(EOIs[:, 0]) / 1000),
+                                     int(Fs * np.max(EOIs[:, 1]) / 1000))
+
+    return count_eoi_peaks(EOIs, peak_indices, rectified_signal[peak_indices], Fs, threshold) >= required_peaks
+
+
+def find_local_maxima(signal, first=0, last=None):
+    """Returns the (sorted) indices first <= i < last of the local maxima of the signal, with the same rising edge
+    definition as detect_peaks (signal[i] > signal[i - 1] and signal[i + 1] <= signal[i]). The first and last sample
+    of the signal can't be maxima."""
+    if last is None:
+        last = len(signal)
+    first = max(first, 1)
+    last = min(last, len(signal) - 1)
+
+    if last <= first:
+        return np.array([], dtype=int)
+
+    center = signal[first:last]
+    is_peak = (center > signal[first - 1:last - 1]) & (signal[first + 1:last + 1] <= center)
+
+    return np.where(is_peak)[0] + first
+
+
+def count_eoi_peaks(EOIs, peak_indices, peak_values, Fs, threshold):
+    """Count the peaks of the rectified signal within each EOI.
+
+    peak_indices are the (sorted) sample indices of the local maxima of the rectified signal, and peak_values their
+    amplitudes. Like detect_peaks on the rectified slice of each EOI the first and last sample of the slice can't be
+    peaks. If the threshold is None every peak is counted, otherwise only the peaks at or above the threshold.
+    """
+    EOIs = np.asarray(EOIs).reshape((-1, 2))
+
+    first_peak = np.searchsorted(peak_indices, (Fs * EOIs[:, 0] / 1000).astype(int), side='right')
+    last_peak = np.searchsorted(peak_indices, (Fs * EOIs[:, 1] / 1000).astype(int), side='left')
+
+    if threshold is None:
+        return last_peak - first_peak
+
+    peaks_above = np.concatenate(([0], np.cumsum(peak_values >= threshold)))
+
+    return peaks_above[last_peak] - peaks_above[first_peak]
+
+
+def findStop(stop_indices):
+    # checks which indices are consecutive from the first index given and finds that largest consecutive value to be
+    # the stop index
+
+    stop_index = stop_indices[0]
+
+    if len(stop_indices) == 1:
+        return stop_index
+
+    for i in range(1, len(stop_indices) + 1):
+        if stop_indices[i] == stop_index + 1:
+            stop_index = stop_indices[i]
+        else:
+            break
+    return stop_index
+
+
+def findStart(start_indices):
+    # checks which indices are consecutive from the last index given and finds that smallest consecutive value to be
+    # the start index
+
+    start_index = start_indices[-1]
+
+    if len(start_indices) == 1:
+        return start_index
+
+    for i in range(len(start_indices)-2, -1, -1):
+        if start_indices[i] == start_index - 1:
+            start_index = start_indices[i]
+        else:
+            break
+    return start_index
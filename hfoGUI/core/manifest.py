@@ -0,0 +1,117 @@
+import datetime
+import hashlib
+import json
+import os
+
+
+def file_fingerprint(path):
+    """The size and modification time (ns) of a file, None if it doesn't exist."""
+    try:
+        stat = os.stat(str(path))
+    except OSError:
+        return None
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def params_hash(params):
+    """A hash of a JSON serializable parameter dictionary, independent of the key order."""
+    return hashlib.sha1(json.dumps(params, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+def _read_entries(path):
+    if not os.path.exists(path):
+        return []
+
+    entries = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                # the last line of a run that was killed while writing it
+                continue
+    return entries
+
+
+class RunManifest(object):
+    """A JSON lines record of the files a batch run processed, so that a rerun can skip them.
+
+    Every processed file appends one line with the fingerprints (size and mtime) of its input files (the data files
+    and the .set file), the hash of the parameters it was processed with, the files it wrote and its status ('done'
+    or 'failed'). The last line of a file wins, so a run that dies part way keeps everything it finished, and a
+    file is only up to date if it finished, its inputs and parameters are unchanged and its outputs still exist.
+    """
+
+    def __init__(self, path):
+        self.path = str(path)
+        self.entries = {}
+        self.load()
+
+    def load(self):
+        self.entries = {entry['key']: entry for entry in _read_entries(self.path)}
+
+    def _unchanged_entry(self, key, input_paths, run_params_hash):
+        """The last entry of a file if its inputs and parameters are unchanged since, otherwise None."""
+        entry = self.entries.get(str(key))
+        if entry is None or entry['params_hash'] != run_params_hash:
+            return None
+
+        if entry['inputs'] != {str(path): file_fingerprint(path) for path in input_paths}:
+            return None
+
+        return entry
+
+    def is_up_to_date(self, key, input_paths, run_params_hash):
+        entry = self._unchanged_entry(key, input_paths, run_params_hash)
+        if entry is None or entry['status'] != 'done':
+            return False
+
+        return all(os.path.exists(output) for output in entry['outputs'])
+
+    def has_failed(self, key, input_paths, run_params_hash):
+        """Whether the file failed with the same inputs and parameters (so it fails again until one changes)."""
+        entry = self._unchanged_entry(key, input_paths, run_params_hash)
+        return entry is not None and entry['status'] == 'failed'
+
+    def record(self, key, input_paths, run_params_hash, status, outputs=(), events=None, error=None):
+        entry = {
+            'key': str(key),
+            'inputs': {str(path): file_fingerprint(path) for path in input_paths},
+            'params_hash': run_params_hash,
+            'status': status,
+            'outputs': [str(output) for output in outputs],
+            'events': events,
+            'error': error,
+            'finished': datetime.datetime.now().isoformat(timespec='seconds'),
+        }
+
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+        self.entries[entry['key']] = entry
+        return entry
+
+
+class ShardedRunManifest(RunManifest):
+    """A RunManifest shared by processes on several hosts (e.g. over NFS, where appends to one file from several
+    hosts can interleave): every process appends to its own shard, <directory>/<shard>.jsonl, and reads all the
+    shards. The last record of a file (by its finished time) wins.
+    """
+
+    def __init__(self, directory, shard):
+        self.directory = str(directory)
+        super().__init__(os.path.join(self.directory, '{}.jsonl'.format(shard)))
+
+    def load(self):
+        entries = []
+        if os.path.isdir(self.directory):
+            for name in sorted(os.listdir(self.directory)):
+                if name.endswith('.jsonl'):
+                    entries.extend(_read_entries(os.path.join(self.directory, name)))
+
+        # sorted() is stable, the records of a shard finished in the same second stay in order
+        self.entries = {entry['key']: entry for entry in sorted(entries, key=lambda entry: entry['finished'])}
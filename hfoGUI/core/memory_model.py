@@ -0,0 +1,117 @@
+import math
+import os
+import re
+
+from core.Tint_Matlab import read_header
+from core.hilbert_detection import streaming_guard_samples
+
+# peak bytes above the process baseline per sample of the recording, measured through ReadEEG, bits2uV, iirfilt,
+# hilbert and the epoch evaluation (the float64 detection peaks at ~92 B/sample, float32 at ~45 B/sample)
+BYTES_PER_SAMPLE = {'double': 96, 'single': 48}
+
+# the streamed detection keeps the raw recording and transforms a chunk (with its guards) at a time, the chunk
+# costs about twice the whole-recording detection per sample
+STREAMED_BYTES_PER_SAMPLE = 10
+STREAMED_CHUNK_BYTES_PER_SAMPLE = 2 * BYTES_PER_SAMPLE['double']
+
+# the memory a file takes besides its samples (the scipy/numpy work buffers, the outputs, allocator slack)
+FIXED_OVERHEAD_BYTES = 50 * 10 ** 6
+
+# the peak of a recording whose samples take less than this is mostly the fixed overhead, it says nothing about the
+# memory per sample and doesn't correct the model
+MIN_OBSERVED_SAMPLE_BYTES = 100 * 10 ** 6
+
+# the correction is this percentile of the measured/predicted ratios, one outlier doesn't inflate every later
+# prediction but most recordings stay under their prediction
+CORRECTION_PERCENTILE = 90
+
+_SIZE_UNITS = {'': 1, 'k': 1e3, 'm': 1e6, 'g': 1e9, 't': 1e12}
+
+
+def parse_memory_size(size):
+    """Bytes of a memory size like 512M, 8G or 8GB (decimal units, a plain number is in bytes)."""
+    match = re.match(r'^\s*([\d.]+)\s*([kmgt]?)i?b?\s*$', str(size), re.IGNORECASE)
+    if match is None:
+        raise ValueError('Invalid memory size: {} (e.g. 512M, 8G)'.format(size))
+
+    return int(float(match.group(1)) * _SIZE_UNITS[match.group(2).lower()])
+
+
+def recording_samples(data_path):
+    """The number of samples and the sample rate of an .egf/.eeg file, read from its header only."""
+    parameters, data_offset = read_header(str(data_path))
+
+    Fs = float(parameters.get('sample_rate', '0').split(' ')[0])
+
+    for parameter in ['num_EGF_samples', 'num_EEG_samples']:
+        if parameter in parameters:
+            return int(parameters[parameter]), Fs
+
+    # no sample count in the header, the size of the data (the trailing data_end marker is negligible)
+    bytes_per_sample = int(parameters.get('bytes_per_sample', 2))
+    return max(os.path.getsize(str(data_path)) - data_offset, 0) // bytes_per_sample, Fs
+
+
+class DetectionMemoryModel(object):
+    """Predicts the peak memory of the Hilbert detection of a recording from its header (a fixed overhead plus the
+    memory per sample), and corrects the memory per sample with the peak RSS measured on the recordings processed
+    so far.
+
+    The correction is the CORRECTION_PERCENTILE percentile of the measured/predicted ratios of the per-sample memory
+    (1 until something is measured), so the predictions follow the heavier recordings without a single outlier
+    deciding them. Recordings too small for the per-sample memory to show above the overhead aren't used.
+    """
+
+    def __init__(self, precision='double', chunk_sec=None, validate_precision=False, guard_sec=1.0, min_freq=None,
+                 max_freq=None):
+        self.precision = precision
+        self.chunk_sec = chunk_sec
+        self.validate_precision = validate_precision
+        self.guard_sec = guard_sec
+        # the band, when it is known the chunks are guarded as hilbert_detect_events_streaming guards them
+        self.min_freq = min_freq
+        self.max_freq = max_freq
+        self.ratios = []
+
+    @property
+    def correction(self):
+        if not self.ratios:
+            return None
+
+        # nearest rank percentile
+        ratios = sorted(self.ratios)
+        rank = max(int(math.ceil(CORRECTION_PERCENTILE / 100.0 * len(ratios))), 1)
+        return ratios[rank - 1]
+
+    def sample_bytes(self, n_samples, Fs, n_channels=1):
+        """The predicted memory (bytes) that grows with the samples of a recording, without the correction."""
+        if self.chunk_sec:
+            guard_sec = self.guard_sec
+            if self.min_freq is not None and self.max_freq is not None:
+                guard_sec = max(guard_sec, streaming_guard_samples(Fs, self.min_freq, self.max_freq) / Fs)
+            chunk_samples = min((self.chunk_sec + 2 * guard_sec) * Fs, n_samples)
+            estimate = STREAMED_BYTES_PER_SAMPLE * n_samples + STREAMED_CHUNK_BYTES_PER_SAMPLE * chunk_samples
+        else:
+            estimate = BYTES_PER_SAMPLE[self.precision] * n_samples * n_channels
+
+        if self.validate_precision:
+            # the float64 and float32 reference detections run after the detection
+            estimate = max(estimate, (BYTES_PER_SAMPLE['double'] + BYTES_PER_SAMPLE['single']) * n_samples)
+
+        return int(estimate)
+
+    def base_estimate(self, n_samples, Fs, n_channels=1):
+        """The predicted peak memory (bytes) of a recording without the correction."""
+        return FIXED_OVERHEAD_BYTES + self.sample_bytes(n_samples, Fs, n_channels)
+
+    def estimate(self, n_samples, Fs, n_channels=1):
+        """The predicted peak memory (bytes) of the detection of a recording with n_samples per channel."""
+        return int(FIXED_OVERHEAD_BYTES + self.sample_bytes(n_samples, Fs, n_channels) * (self.correction or 1.0))
+
+    def observe(self, n_samples, Fs, measured_bytes, n_channels=1):
+        """Corrects the model with the measured peak memory of a recording."""
+        sample_bytes = self.sample_bytes(n_samples, Fs, n_channels)
+        if measured_bytes is None or sample_bytes < MIN_OBSERVED_SAMPLE_BYTES:
+            return
+
+        self.ratios.append(max(measured_bytes - FIXED_OVERHEAD_BYTES, 0) / float(sample_bytes))
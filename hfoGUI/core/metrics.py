@@ -0,0 +1,126 @@
+import datetime
+import json
+import os
+import socket
+import threading
+import time
+
+
+class MetricsStream(object):
+    """A JSON lines feed of the progress of a batch run, for dashboards instead of parsing the printed output.
+
+    Every line is one record with its 'type', the 'time' (ISO) and the 'host':
+
+    - run_start: the number of files ('files_total') and their bytes ('bytes_total') when known, and the run info.
+    - stage: one per stage of a finished file (from its StageProfile), with its wall time and samples per second.
+    - file: one per file, with its status ('done' or 'failed'), wall time, samples, samples per second, bytes read,
+      event count, peak RSS and error.
+    - heartbeat: every interval_sec seconds, the files done and failed so far, the overall throughput (samples and
+      bytes per second) and the ETA (s) from the bytes left, None when the total isn't known (hilbert-watch).
+    - run_end: a last heartbeat with the summary of the run.
+    """
+
+    def __init__(self, path, interval_sec=30.0, files_total=None, bytes_total=None):
+        self.path = str(path)
+        self.interval_sec = interval_sec
+        self.files_total = files_total
+        self.bytes_total = bytes_total
+        self.host = socket.gethostname()
+
+        self.files_done = 0
+        self.files_failed = 0
+        self.samples = 0
+        self.bytes_read = 0
+
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        self._file = open(self.path, 'a', encoding='utf-8')
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._start_time = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+
+    def write(self, record_type, **fields):
+        record = {'type': record_type, 'time': datetime.datetime.now().isoformat(timespec='milliseconds'),
+                  'host': self.host}
+        record.update(fields)
+        with self._lock:
+            self._file.write(json.dumps(record, default=str) + '\n')
+            self._file.flush()
+
+    def start(self, **run_info):
+        """Writes the run_start record and starts the heartbeat thread."""
+        self._start_time = time.perf_counter()
+        self.write('run_start', files_total=self.files_total, bytes_total=self.bytes_total, **run_info)
+
+        self._thread = threading.Thread(target=self._beat, name='metrics heartbeat', daemon=True)
+        self._thread.start()
+
+    def _beat(self):
+        while not self._stop.wait(self.interval_sec):
+            self.heartbeat()
+
+    def progress(self):
+        """The counts, throughput and ETA of the run so far."""
+        with self._lock:
+            elapsed = time.perf_counter() - self._start_time if self._start_time is not None else 0.0
+            bytes_per_sec = self.bytes_read / elapsed if elapsed > 0 else 0.0
+
+            eta_sec = None
+            if self.bytes_total is not None and bytes_per_sec > 0:
+                eta_sec = max(self.bytes_total - self.bytes_read, 0) / bytes_per_sec
+
+            return {
+                'elapsed_sec': elapsed,
+                'files_done': self.files_done,
+                'files_failed': self.files_failed,
+                'files_total': self.files_total,
+                'samples': self.samples,
+                'samples_per_sec': self.samples / elapsed if elapsed > 0 else 0.0,
+                'bytes_read': self.bytes_read,
+                'bytes_per_sec': bytes_per_sec,
+                'eta_sec': eta_sec,
+            }
+
+    def heartbeat(self):
+        self.write('heartbeat', **self.progress())
+
+    def file_finished(self, data_file, status, wall_sec=None, samples=0, bytes_read=0, events=None,
+                      peak_rss_bytes=None, error=None, profile=None):
+        """Writes the stage records of a file (profile is a StageProfile.as_dict()) and its file record."""
+        for stage in (profile or {}).get('stages', []):
+            self.write('stage', data_file=str(data_file), stage=stage['name'], calls=stage['calls'],
+                       wall_sec=stage['wall_time_s'], samples=stage['samples'],
+                       samples_per_sec=stage['samples'] / stage['wall_time_s'] if stage['wall_time_s'] > 0 else None,
+                       peak_allocated_bytes=stage['peak_allocated_bytes'] or None)
+
+        with self._lock:
+            if status == 'done':
+                self.files_done += 1
+            else:
+                self.files_failed += 1
+            self.samples += samples
+            self.bytes_read += bytes_read
+
+        self.write('file', data_file=str(data_file), status=status, wall_sec=wall_sec, samples=samples,
+                   samples_per_sec=samples / wall_sec if wall_sec else None, bytes_read=bytes_read, events=events,
+                   peak_rss_bytes=peak_rss_bytes, error=error)
+
+    def close(self, **summary):
+        """Stops the heartbeat and writes the run_end record."""
+        if self._file.closed:
+            return
+
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+        self.write('run_end', **dict(self.progress(), **summary))
+        self._file.close()
@@ -0,0 +1,150 @@
+import contextlib
+import os
+import threading
+import time
+import tracemalloc
+
+
+class StageProfile(object):
+    """Records the wall time, the samples processed and the peak allocated bytes (traced with tracemalloc) of each
+    stage of a detection.
+
+    Use the profile as a context manager around the run (it starts tracemalloc if it isn't already tracing), and
+    time each stage with profile.stage(name, samples). When the samples are only known at the end of the stage, set
+    them on the dictionary the stage yields (with profile.stage('ReadEEG') as stage: ... stage['samples'] = n). A
+    stage that runs several times (e.g. once per epoch) adds up its wall time and samples, and keeps the largest
+    peak.
+
+    The peak is read from tracemalloc, which traces the whole process, so the stages must not run concurrently (a
+    pool of threads is profiled as one stage around it).
+    """
+
+    def __init__(self, trace_memory=True):
+        self.trace_memory = trace_memory
+        self.stages = {}
+        self._started_tracing = False
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+        return False
+
+    def start(self):
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+
+    def stop(self):
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    @contextlib.contextmanager
+    def stage(self, name, samples=0):
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            current_bytes = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+
+        stage_info = {'samples': samples}
+
+        start_time = time.perf_counter()
+        try:
+            yield stage_info
+        finally:
+            wall_time = time.perf_counter() - start_time
+            peak_bytes = max(tracemalloc.get_traced_memory()[1] - current_bytes, 0) if tracing else 0
+
+            with self._lock:
+                record = self.stages.setdefault(name, {'calls': 0, 'wall_time_s': 0.0, 'samples': 0,
+                                                       'peak_allocated_bytes': 0})
+                record['calls'] += 1
+                record['wall_time_s'] += wall_time
+                record['samples'] += int(stage_info['samples'])
+                record['peak_allocated_bytes'] = max(record['peak_allocated_bytes'], peak_bytes)
+
+    def as_dict(self):
+        """Returns the profile as a JSON serializable dictionary, the stages in the order they first ran."""
+        return {
+            'stages': [dict(name=name, **record) for name, record in self.stages.items()],
+            'total_wall_time_s': sum(record['wall_time_s'] for record in self.stages.values()),
+            'peak_allocated_bytes': max([record['peak_allocated_bytes'] for record in self.stages.values()] or [0]),
+        }
+
+
+def merge_profiles(profiles):
+    """Adds up the stages of several profile dictionaries (StageProfile.as_dict), e.g. the files of a batch."""
+    stages = {}
+    for profile in profiles:
+        for stage in profile['stages']:
+            record = stages.setdefault(stage['name'], {'calls': 0, 'wall_time_s': 0.0, 'samples': 0,
+                                                       'peak_allocated_bytes': 0})
+            record['calls'] += stage['calls']
+            record['wall_time_s'] += stage['wall_time_s']
+            record['samples'] += stage['samples']
+            record['peak_allocated_bytes'] = max(record['peak_allocated_bytes'], stage['peak_allocated_bytes'])
+
+    return {
+        'stages': [dict(name=name, **record) for name, record in stages.items()],
+        'total_wall_time_s': sum(record['wall_time_s'] for record in stages.values()),
+        'peak_allocated_bytes': max([record['peak_allocated_bytes'] for record in stages.values()] or [0]),
+    }
+
+
+def profile_stage(profile, name, samples=0):
+    """profile.stage(name, samples) if there is a profile, otherwise a context that does nothing."""
+    if profile is None:
+        return contextlib.nullcontext({'samples': samples})
+    return profile.stage(name, samples)
+
+
+def _current_rss():
+    """The resident set size of this process in bytes (Linux /proc), None where it isn't available."""
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+class PeakRSSMonitor(object):
+    """Samples the resident set size of the process in a background thread and records its peak above the RSS at
+    the start (the memory a job actually took from the machine, including the numpy/scipy buffers tracemalloc
+    doesn't trace).
+
+    with PeakRSSMonitor() as monitor:
+        ...
+    monitor.peak_bytes  # None where the RSS can't be read
+    """
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.peak_bytes = None
+        self._baseline = None
+        self._peak = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self._baseline = _current_rss()
+        if self._baseline is not None:
+            self._peak = self._baseline
+            self._thread = threading.Thread(target=self._poll, daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._peak = max(self._peak, _current_rss() or 0)
+            self.peak_bytes = self._peak - self._baseline
+        return False
+
+    def _poll(self):
+        while not self._stop.wait(self.interval):
+            self._peak = max(self._peak, _current_rss() or 0)
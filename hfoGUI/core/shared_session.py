@@ -0,0 +1,107 @@
+import collections
+import contextlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from core.Tint_Matlab import ReadEEG, bits2uV
+
+# a picklable reference to a published session, what the worker processes receive instead of the data
+SessionHandle = collections.namedtuple('SessionHandle', ['name', 'shape', 'dtype', 'Fs', 'data_file'])
+
+
+class SharedSession(object):
+    """The µV waveform of a session read and converted once (ReadEEG and bits2uV) and published in shared memory, so
+    that any number of analyses in worker processes (attach_session, map_session) use the same array without reading
+    the .egf again or pickling the data.
+
+        with SharedSession(data_path, set_path) as session:
+            results = map_session(analysis, session, parameters, workers=4)
+
+    The shared memory is freed when the session is closed, the workers must be done with it by then.
+    """
+
+    def __init__(self, data_path, set_path=None, dtype=None):
+        dtype = np.dtype(dtype or np.float64)
+
+        data, Fs = ReadEEG(str(data_path), dtype=dtype)
+        if set_path is not None:
+            data, _ = bits2uV(data, str(data_path), str(set_path), dtype=dtype)
+        self._publish(np.asarray(data, dtype=dtype), Fs, data_path)
+
+    @classmethod
+    def from_array(cls, data, Fs, data_file=None):
+        """Publishes an array that is already in memory (e.g. the (channels, samples) amplifier data of an Intan
+        recording), the caller can free its own copy after."""
+        session = cls.__new__(cls)
+        session._publish(np.asarray(data), Fs, data_file)
+        return session
+
+    def _publish(self, data, Fs, data_file):
+        self._block = shared_memory.SharedMemory(create=True, size=max(data.nbytes, 1))
+        self.data = np.ndarray(data.shape, dtype=data.dtype, buffer=self._block.buf)
+        self.data[:] = data
+        self.data.flags.writeable = False
+        self.Fs = Fs
+
+        self.handle = SessionHandle(self._block.name, data.shape, data.dtype.str, Fs, str(data_file))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+
+    def close(self):
+        if self._block is None:
+            return
+
+        self.data = None
+        self._block.close()
+        self._block.unlink()
+        self._block = None
+
+
+@contextlib.contextmanager
+def attach_session(handle):
+    """The read-only array of a published session (a SessionHandle) in another process, without copying it."""
+    block = shared_memory.SharedMemory(name=handle.name)
+    try:
+        data = np.ndarray(handle.shape, dtype=np.dtype(handle.dtype), buffer=block.buf)
+        data.flags.writeable = False
+        yield data
+        data = None
+    finally:
+        block.close()
+
+
+# the session a map_session worker attached to, once per worker process
+_worker_session = {}
+
+
+def _attach_worker(handle):
+    block = shared_memory.SharedMemory(name=handle.name)
+    data = np.ndarray(handle.shape, dtype=np.dtype(handle.dtype), buffer=block.buf)
+    data.flags.writeable = False
+    _worker_session.update(block=block, data=data, Fs=handle.Fs)
+
+
+def _run_analysis(function, item):
+    return function(_worker_session['data'], _worker_session['Fs'], item)
+
+
+def map_session(function, session, items, workers=1):
+    """Runs function(data, Fs, item) for every item on the array of a SharedSession, in a pool of worker processes
+    that each attach to the shared memory once. function must be picklable (a module level function), the results
+    are returned in the order of the items. With workers <= 1 the analyses run in this process.
+    """
+    items = list(items)
+    if workers <= 1 or len(items) <= 1:
+        return [function(session.data, session.Fs, item) for item in items]
+
+    with ProcessPoolExecutor(max_workers=min(workers, len(items)), mp_context=multiprocessing.get_context('spawn'),
+                             initializer=_attach_worker, initargs=(session.handle,)) as executor:
+        return list(executor.map(_run_analysis, [function] * len(items), items))
@@ -123,4 +123,34 @@ def test_down_sample_timeseries():
     downsampled_data = down_sample_timeseries(data, sample_rate, new_sample_rate)
 
     # assert that the length of downsampled_data is within + or - 1 of the formula.
-    assert len(downsampled_data) == round(len(data) / (sample_rate / new_sample_rate) - 1)
\ No newline at end of file
+    assert len(downsampled_data) == round(len(data) / (sample_rate / new_sample_rate) - 1)
+
+def test_convert_session_with_workers(tmp_path):
+    from ..intan_rhd_format import convert_session
+
+    rhd_file = base_dir + '/hfoGUI/core/load_intan_rhd_format/sampledata.rhd'
+    channels = ['A-000', 'A-005', 'A-017']
+
+    serial = convert_session(rhd_file, channels=channels, output_dir=str(tmp_path / 'serial'))
+    parallel = convert_session(rhd_file, channels=channels, workers=2, output_dir=str(tmp_path / 'parallel'))
+
+    assert serial['channels'] == parallel['channels'] == channels
+    assert serial['files'] == {channel: 'sampledata.egf' + channel[-3:] for channel in channels}
+    assert (tmp_path / 'serial' / 'sampledata_channels.txt').read_text().splitlines() == \
+        ['channel\tfile'] + ['{}\tsampledata.egf{}'.format(channel, channel[-3:]) for channel in channels]
+    assert serial['samples'] == len(channels) * intan_data['amplifier_data'].shape[1]
+    for suffix in ['000', '005', '017']:
+        file_name = 'sampledata.egf' + suffix
+        assert (tmp_path / 'serial' / file_name).read_bytes() == (tmp_path / 'parallel' / file_name).read_bytes()
+
+
+def test_channel_file_names():
+    from ..intan_rhd_format import channel_file_names
+
+    assert channel_file_names(['A-000', 'A-001']) == ['A-000', 'A-001']
+    # non-colliding channels of several ports keep their numbers
+    assert channel_file_names(['A-000', 'A-001', 'B-002', 'C-010']) == ['A-000', 'A-001', 'B-002', 'C-010']
+    # the files are numbered by the last 3 characters, B-000 would overwrite A-000, only the colliding channels are
+    # renumbered, to numbers no channel has
+    assert channel_file_names(['A-000', 'A-001', 'B-000', 'B-001', 'B-005']) == \
+        ['A-000', 'A-001', '002', '003', 'B-005']
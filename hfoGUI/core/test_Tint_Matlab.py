@@ -0,0 +1,162 @@
+import numpy as np
+
+import pytest
+
+from .Tint_Matlab import ReadEEG, SetFile, SpikeIndex, TintException, TintLFPFile, TintTetrodeFile, bits2uV, get_active_eeg, get_active_tetrode, \
+    get_setfile_parameter, importspikes, is_egf_active, read_cut, read_spike_times
+
+
+def _write_lfp(path, samples, sample_dtype='<h', data_end=True):
+    header = b'sample_rate 4800.0 hz\r\nbytes_per_sample %d\r\ndata_start' % np.dtype(sample_dtype).itemsize
+    path.write_bytes(header + np.asarray(samples, dtype=sample_dtype).tobytes() + (b'\r\ndata_end\r\n' if data_end else b''))
+
+
+def test_read_eeg_is_a_read_only_view(tmp_path):
+    samples = np.array([-32768, -1, 0, 1, 32767, 13], dtype='<h')
+    data_path = tmp_path / 'session.egf'
+    _write_lfp(data_path, samples)
+
+    data, Fs = ReadEEG(str(data_path))
+    assert Fs == 4800
+    assert isinstance(data, np.memmap) and not data.flags.writeable
+    np.testing.assert_array_equal(data, samples)
+
+    data, _ = ReadEEG(str(data_path), copy=True)
+    assert type(data) is np.ndarray and data.flags.writeable
+    np.testing.assert_array_equal(data, samples)
+
+    data, _ = ReadEEG(str(data_path), dtype=np.float32)
+    assert type(data) is np.ndarray and data.dtype == np.float32
+    np.testing.assert_array_equal(data, samples)
+
+
+def test_read_eeg_formats(tmp_path):
+    samples = np.array([-128, -5, 0, 5, 127], dtype='>b')
+    eeg_path = tmp_path / 'session.eeg'
+    _write_lfp(eeg_path, samples, sample_dtype='>b')
+    np.testing.assert_array_equal(ReadEEG(str(eeg_path))[0], samples)
+
+    # a recording that is still being written has no data_end
+    egf_path = tmp_path / 'recording.egf'
+    _write_lfp(egf_path, np.arange(100), data_end=False)
+    np.testing.assert_array_equal(ReadEEG(str(egf_path))[0], np.arange(100))
+
+    empty_path = tmp_path / 'empty.egf'
+    _write_lfp(empty_path, [])
+    assert len(ReadEEG(str(empty_path))[0]) == 0
+
+
+def test_lfp_file_windows(tmp_path):
+    samples = np.arange(-2400, 2400, dtype='<h')  # 1 s at 4800 Hz
+    data_path = tmp_path / 'session.egf'
+    _write_lfp(data_path, samples)
+
+    lfp_file = TintLFPFile(data_path)
+    assert (lfp_file.Fs, lfp_file.n_samples, lfp_file.bytes_per_sample, len(lfp_file)) == (4800, 4800, 2, 4800)
+    assert lfp_file.duration == 1.0
+
+    np.testing.assert_array_equal(lfp_file.read(100, 200, scale_uV=False), samples[480:960])
+    # the padding and the windows are clipped to the recording
+    assert lfp_file.sample_range(100, 200, pad_ms=50) == (240, 1200)
+    assert lfp_file.sample_range(-100, 2000, pad_ms=50) == (0, 4800)
+    assert len(lfp_file.read(2000, 3000, scale_uV=False)) == 0
+
+    with pytest.raises(TintException):
+        lfp_file.read(0, 10)
+
+    (tmp_path / 'session.set').write_text('ADC_fullscale_mv 1500\nEEG_ch_1 1\ngain_ch_0 1000\n')
+    scalar = 1500 * 1000 / (1000 * 32768)
+    np.testing.assert_allclose(lfp_file.read(100, 200, pad_ms=10), samples[432:1008] * scalar)
+    np.testing.assert_allclose(lfp_file[10:20], samples[10:20] * scalar)
+
+
+def test_set_file_parse_and_cache(tmp_path):
+    set_path = tmp_path / 'session.set'
+    set_path.write_text('trial_date Monday, 1 Jan 2024\nduration 60\nADC_fullscale_mv 1500\n' +
+                        ''.join('gain_ch_%d %d\n' % (channel, 1000 + channel) for channel in range(8)) +
+                        'collectMask_1 1\ncollectMask_2 0\nsaveEEG_ch_1 1\nsaveEEG_ch_2 0\nsaveEEG_ch_3 1\n'
+                        'EEG_ch_1 3\nEEG_ch_2 4\nBPFEEG_ch_3 9\nEEG_ch_3 5\nsaveEGF 1\n')
+
+    set_file = SetFile.load(set_path)
+    assert SetFile.load(str(set_path)) is set_file
+    assert set_file.parameters['trial_date'] == 'Monday, 1 Jan 2024'
+    assert get_setfile_parameter('duration', str(set_path)) == '60'
+    assert get_setfile_parameter('missing', str(set_path)) is None
+    assert get_active_tetrode(str(set_path)) == [1]
+    assert get_active_eeg(str(set_path)) == {1: 2, 3: 4}
+    assert is_egf_active(str(set_path))
+
+    _, scalar = bits2uV([], str(tmp_path / 'session.egf3'))
+    assert scalar == 1500 * 1000 / (1004 * 32768)
+    _, scalar = bits2uV([], str(tmp_path / 'session.2'))
+    np.testing.assert_array_equal(scalar, [1500 * 1000 / ((1000 + channel) * 128) for channel in range(4, 8)])
+
+    # a changed file is parsed again
+    set_path.write_text('duration 1200\n')
+    assert SetFile.load(set_path) is not set_file
+    assert get_setfile_parameter('duration', str(set_path)) == '1200'
+
+
+def _write_tetrode(path, timestamps, samples):
+    header = b'\r\n'.join([b'duration 60', b'timebase 96000 hz', b'bytes_per_timestamp 4', b'samples_per_spike 50',
+                            b'sample_rate 48000 hz', b'bytes_per_sample 1', b'num_spikes %d' % len(timestamps)])
+    records = np.zeros((len(timestamps), 4), dtype=[('t', '>u4'), ('samples', 'i1', 50)])
+    records['t'] = np.asarray(timestamps)[:, np.newaxis]
+    records['samples'] = samples
+    path.write_bytes(header + b'\r\ndata_start' + records.tobytes() + b'\r\ndata_end\r\n')
+
+
+def test_tetrode_file_views(tmp_path):
+    timestamps = np.array([96, 9600, 2 ** 31 + 96000])
+    samples = np.arange(3 * 4 * 50).reshape(3, 4, 50) % 256 - 128
+    tetrode_path = tmp_path / 'session.1'
+    _write_tetrode(tetrode_path, timestamps, samples)
+
+    tetrode_file = TintTetrodeFile(tetrode_path)
+    assert len(tetrode_file) == 3
+    assert not tetrode_file.waveforms.flags.writeable
+    np.testing.assert_array_equal(tetrode_file.timestamps, timestamps)
+    np.testing.assert_array_equal(tetrode_file.waveforms, samples)
+    np.testing.assert_allclose(tetrode_file.spike_times(), timestamps / 96000)
+
+    spikes, spike_parameters = importspikes(str(tetrode_path))
+    assert spike_parameters['num_spikes'] == 3 and spike_parameters['timebase'] == 96000
+    assert spikes['t'].shape == (3, 1)
+    np.testing.assert_array_equal(spikes['ch3'], samples[:, 2])
+
+    empty_path = tmp_path / 'session.2'
+    _write_tetrode(empty_path, [], np.zeros((0, 4, 50)))
+    assert len(importspikes(str(empty_path))[0]['t']) == 0
+
+
+def test_spike_index(tmp_path):
+    timestamps = np.array([96, 960, 1920, 9600, 96000])
+    _write_tetrode(tmp_path / 'session.1', timestamps, np.zeros((5, 4, 50)))
+    cut_path = tmp_path / 'session_1.cut'
+    cut_path.write_text('n_clusters: 3\nExact_cut_for: session spikes: 5\n2 0 2 1\n2\n')
+
+    np.testing.assert_allclose(read_spike_times(str(tmp_path / 'session.1')), timestamps / 96000)
+
+    cut_values = read_cut(str(cut_path))
+    np.testing.assert_array_equal(cut_values, [2, 0, 2, 1, 2])
+    assert read_cut(str(cut_path)) is cut_values
+    assert read_cut(str(tmp_path / 'missing.cut')) is None
+
+    spike_index = SpikeIndex(str(tmp_path), 'session')
+    units = spike_index.tetrode_units(1)
+    assert sorted(units) == [0, 1, 2]
+    np.testing.assert_allclose(units[2], [1, 20, 1000])
+    np.testing.assert_allclose(SpikeIndex.window(units[2], 1, 20), [1, 20])
+    assert spike_index.tetrode_units(2) is None
+
+    # a .cut file without an Exact_cut line assigns no spike to a unit
+    _write_tetrode(tmp_path / 'session.3', timestamps, np.zeros((5, 4, 50)))
+    uncut_path = tmp_path / 'session_3.cut'
+    uncut_path.write_text('n_clusters: 0\n')
+    cut_values = read_cut(str(uncut_path))
+    assert cut_values.dtype.kind == 'i' and len(cut_values) == 0
+    assert spike_index.tetrode_units(3) == {}
+
+    # a re-cut tetrode is read again
+    cut_path.write_text('n_clusters: 2\nExact_cut_for: session spikes: 5\n1 1 1 1 1\n')
+    np.testing.assert_allclose(spike_index.tetrode_units(1)[1], [1, 10, 20, 100, 1000])
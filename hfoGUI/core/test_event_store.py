@@ -0,0 +1,37 @@
+import sqlite3
+
+import numpy as np
+
+from .event_store import EventStore
+
+
+def test_event_store_stores_settings_once_and_replaces_reruns(tmp_path):
+    db_path = tmp_path / 'events.sqlite'
+    settings = {'sd_num': 3.0, 'epoch': 300.0}
+
+    with EventStore(db_path) as store:
+        first_id = store.add_detection('session1', 'egf', '/data/session1.egf', np.array([[10.0, 25.0], [40.0, 52.5]]),
+                                       settings)
+        # the same settings in another order are the same parameter set
+        assert store.add_detection('session2', 'egf', '/data/session2.egf', np.array([[5.0, 15.0]]),
+                                   {'epoch': 300.0, 'sd_num': 3.0}) == first_id
+        store.add_detection('session3', 'egf', '/data/session3.egf', np.zeros((0, 2)), settings)
+
+    with EventStore(db_path) as store:
+        # a rerun of a session replaces its events
+        store.add_detection('session1', 'egf', '/data/session1.egf', np.array([[10.0, 26.0]]), settings)
+        other_id = store.add_detection('session1', 'egf', '/data/session1.egf', np.array([[11.0, 20.0]]),
+                                       {'sd_num': 4.0, 'epoch': 300.0})
+        assert other_id != first_id
+
+    connection = sqlite3.connect(str(db_path))
+    assert connection.execute('SELECT COUNT(*) FROM parameter_sets').fetchone()[0] == 2
+
+    assert connection.execute('SELECT session, COUNT(*) FROM events WHERE parameter_set_id = ? GROUP BY session '
+                              'ORDER BY session', (first_id,)).fetchall() == [('session1', 1), ('session2', 1)]
+    assert connection.execute('SELECT start_ms, stop_ms FROM events WHERE session = ? AND parameter_set_id = ?',
+                              ('session1', first_id)).fetchall() == [(10.0, 26.0)]
+
+    # the sessions without events are recorded too
+    assert connection.execute('SELECT events FROM detections WHERE session = ?', ('session3',)).fetchone() == (0,)
+    connection.close()
@@ -2,8 +2,13 @@
 Unit tests for hilbert_detect_events function, especially empty-epoch handling.
 """
 import numpy as np
+import pandas as pd
 import pytest
-from .Score import hilbert_detect_events
+from .hilbert_detection import hilbert_detect_events, hilbert_detect_events_streaming, find_eoi_boundaries, merge_eois, \
+    hilbert_filter, hilbert_precision_report, hilbert_sweep, RejectEOIs, hilbert_detect_events_multichannel, \
+    event_cooccurrence, intermediates_key
+from .Tint_Matlab import detect_peaks
+from .profiling import StageProfile
 
 
 def test_empty_epochs_large_window():
@@ -155,6 +160,307 @@ def test_integer_indexing_robustness():
             raise
 
 
+def _naive_eoi_boundaries(envelope, threshold, boundary_fraction, peri_boundary_samples):
+    """Per-run reference implementation of the boundary search (one window scan per run)."""
+    above = np.where(envelope >= threshold)[0]
+    runs = np.split(above, np.where(np.diff(above) != 1)[0] + 1) if len(above) else []
+    starts, stops = [], []
+    for run in runs:
+        before = np.clip(np.arange(run[0] - peri_boundary_samples, run[0]), 0, None)
+        after = np.clip(np.arange(run[-1] + 1, run[-1] + peri_boundary_samples + 1), None, len(envelope) - 1)
+        before = before[envelope[before] <= boundary_fraction * threshold]
+        after = after[envelope[after] <= boundary_fraction * threshold]
+        if len(before) and len(after):
+            starts.append(before.max())
+            stops.append(after.min())
+    return np.asarray(starts, dtype=int), np.asarray(stops, dtype=int)
+
+
+def test_vectorized_boundaries_match_naive_search():
+    """
+    The vectorized boundary search must find the same starts/stops as scanning each run individually,
+    including runs touching the epoch edges and runs without boundaries.
+    """
+    np.random.seed(2024)
+    for boundary_fraction in [0.3, 0.5, 0.8]:
+        envelope = np.abs(np.random.randn(20000)).cumsum() % 7
+        envelope[:5] = 10  # run at the very start of the epoch
+        envelope[-5:] = 10  # run at the very end of the epoch
+        threshold = 5.0
+
+        expected = _naive_eoi_boundaries(envelope, threshold, boundary_fraction, 40)
+        starts, stops = find_eoi_boundaries(envelope, threshold, boundary_fraction, 40)
+
+        np.testing.assert_array_equal(starts, expected[0])
+        np.testing.assert_array_equal(stops, expected[1])
+
+
+def test_merge_eois_overlapping_and_near():
+    """
+    Overlapping/contained EOIs collapse into the first, and EOIs closer than 10 ms are joined.
+    """
+    EOIs = np.array([[0., 20.], [5., 15.], [10., 30.], [35., 50.], [70., 80.], [100., 120.], [125., 130.]])
+
+    merged = merge_eois(EOIs)
+
+    np.testing.assert_array_equal(merged, np.array([[0., 50.], [70., 80.], [100., 130.]]))
+    assert merge_eois(np.zeros((0, 2))).shape == (0, 2)
+
+
+def test_streaming_matches_batch():
+    """
+    Streaming the detection in chunks (with runs cut by the chunk boundaries carried over) must find the same
+    events as the whole-recording detection, up to a sample of edge effects with a band-pass.
+    """
+    Fs = 4800
+    duration = 180
+    np.random.seed(321)
+    raw_data = np.random.randn(int(Fs * duration))
+
+    for burst_start in np.random.randint(0, len(raw_data) - 500, 150):
+        t_burst = np.arange(300) / float(Fs)
+        raw_data[burst_start:burst_start + 300] += 6.0 * np.sin(2 * np.pi * 300 * t_burst)
+
+    params = dict(epoch=60.0, sd_num=2.5, min_duration=5.0, min_freq=80.0, max_freq=500.0,
+                  required_peak_number=3, required_peak_sd=1.0, boundary_fraction=0.3)
+
+    events = hilbert_detect_events(raw_data.copy(), Fs, **params)
+    assert len(events) > 50
+
+    # bits (int16) + scalar, like the CLI passes them
+    raw_bits = np.round(raw_data * 1000).astype(np.int16)
+    events = hilbert_detect_events(raw_bits * 0.001, Fs, **params)
+
+    for chunk_sec in [4.0, 25.0]:
+        streamed_events = hilbert_detect_events_streaming(raw_bits, Fs, chunk_sec=chunk_sec, scalar=0.001, **params)
+
+        assert streamed_events.shape == events.shape
+        assert np.abs(streamed_events - events).max() <= 1000 / Fs + 1e-9
+
+
+def test_streaming_matches_batch_high_pass_and_low_sample_rate():
+    """
+    The guards of the chunks follow the band and the sample rate: a low band at 250 Hz matches the whole-recording
+    detection up to a sample, the high-pass branch (max_freq at the Nyquist frequency), whose Hilbert transform
+    reaches far past any guard, finds the same events with boundaries a few samples off.
+    """
+    params = dict(epoch=20.0, sd_num=2.5, min_duration=20.0, required_peak_number=3, required_peak_sd=1.0,
+                  boundary_fraction=0.3)
+
+    for Fs, min_freq, max_freq, burst_freq, chunk_sec, max_shift in [(4800, 80.0, 2400.0, 300, 4.0, 8),
+                                                                      (250, 4.0, 12.0, 8, 2.0, 1),
+                                                                      (250, 80.0, 125.0, 100, 2.0, 8)]:
+        np.random.seed(6)
+        raw_data = np.random.randn(int(Fs * 60))
+
+        burst_samples = int(0.08 * Fs)
+        t_burst = np.arange(burst_samples) / float(Fs)
+        for burst_start in np.random.randint(0, len(raw_data) - burst_samples, 60):
+            raw_data[burst_start:burst_start + burst_samples] += 6.0 * np.sin(2 * np.pi * burst_freq * t_burst)
+
+        events = hilbert_detect_events(raw_data.copy(), Fs, min_freq=min_freq, max_freq=max_freq, **params)
+        assert len(events) > 20
+
+        streamed_events = hilbert_detect_events_streaming(raw_data, Fs, chunk_sec=chunk_sec, min_freq=min_freq,
+                                                          max_freq=max_freq, **params)
+
+        assert streamed_events.shape == events.shape
+        assert np.abs(streamed_events - events).max() <= max_shift * 1000 / Fs + 1e-9
+
+
+def test_parallel_epochs_match_sequential():
+    """
+    Evaluating the epochs with a thread or a process pool must give exactly the sequential events.
+    """
+    Fs = 4800
+    duration = 120
+    np.random.seed(77)
+    raw_data = np.random.randn(int(Fs * duration))
+
+    for burst_start in np.random.randint(0, len(raw_data) - 500, 100):
+        t_burst = np.arange(300) / float(Fs)
+        raw_data[burst_start:burst_start + 300] += 6.0 * np.sin(2 * np.pi * 300 * t_burst)
+
+    params = dict(epoch=10.0, sd_num=2.5, min_duration=5.0, min_freq=80.0, max_freq=500.0,
+                  required_peak_number=3, required_peak_sd=1.0, boundary_fraction=0.3)
+
+    events = hilbert_detect_events(raw_data.copy(), Fs, **params)
+    assert len(events) > 50
+
+    for epoch_executor in ['thread', 'process']:
+        parallel_events = hilbert_detect_events(raw_data.copy(), Fs, epoch_workers=3,
+                                                epoch_executor=epoch_executor, **params)
+        np.testing.assert_array_equal(parallel_events, events)
+
+
+def test_single_precision_matches_double():
+    """
+    The float32 detection keeps the data in float32 and its events stay within a sample of the float64 events.
+    """
+    Fs = 4800
+    duration = 60
+    np.random.seed(5)
+    raw_data = np.random.randn(int(Fs * duration))
+
+    for burst_start in np.random.randint(0, len(raw_data) - 500, 60):
+        t_burst = np.arange(300) / float(Fs)
+        raw_data[burst_start:burst_start + 300] += 6.0 * np.sin(2 * np.pi * 300 * t_burst)
+
+    assert hilbert_filter(raw_data, Fs, 80.0, 500.0, dtype=np.float32).dtype == np.float32
+
+    params = dict(epoch=20.0, sd_num=2.5, min_duration=5.0, min_freq=80.0, max_freq=500.0,
+                  required_peak_number=3, required_peak_sd=1.0, boundary_fraction=0.3)
+
+    report = hilbert_precision_report(raw_data, Fs, dtype=np.float32, **params)
+
+    assert report['reference_events'] > 20
+    assert report['matched_events'] >= report['reference_events'] - 1
+    assert report['start_shift_p99_ms'] <= 1000 / Fs + 1e-9
+    assert report['stop_shift_p99_ms'] <= 1000 / Fs + 1e-9
+
+
+def test_sweep_matches_detection():
+    """
+    Every parameter set of a sweep must count the events hilbert_detect_events finds with those parameters.
+    """
+    Fs = 4800
+    duration = 60
+    np.random.seed(11)
+    raw_data = np.random.randn(int(Fs * duration))
+
+    for burst_start in np.random.randint(0, len(raw_data) - 500, 60):
+        t_burst = np.arange(300) / float(Fs)
+        raw_data[burst_start:burst_start + 300] += np.random.uniform(2, 8) * np.sin(2 * np.pi * 300 * t_burst)
+
+    filter_params = dict(epoch=20.0, min_freq=80.0, max_freq=500.0)
+
+    results = hilbert_sweep(raw_data, Fs, sd_num=[2.0, 3.0], min_duration=[5.0, 10.0], required_peak_number=[3, 6],
+                            required_peak_sd=[None, 2.0], boundary_fraction=0.3, **filter_params)
+
+    assert len(results) == 16
+    assert results['events'].max() > 20
+
+    for _, row in results.iterrows():
+        required_peak_sd = None if pd.isnull(row['required_peak_sd']) else row['required_peak_sd']
+        events = hilbert_detect_events(raw_data.copy(), Fs, sd_num=row['sd_num'], min_duration=row['min_duration'],
+                                       required_peak_number=int(row['required_peak_number']),
+                                       required_peak_sd=required_peak_sd,
+                                       boundary_fraction=row['boundary_fraction'], **filter_params)
+        assert len(events) == row['events']
+
+
+def test_reject_eois_matches_detect_peaks():
+    """
+    The vectorized peak counts must reject the same EOIs as detect_peaks on the rectified slice of each EOI.
+    """
+    Fs = 4800
+    np.random.seed(3)
+    rectified_signal = np.abs(np.random.randn(Fs * 60))
+    rectified_signal[1000:1010] = 1.0  # plateaus
+
+    starts = np.sort(np.random.uniform(0, 60000 - 100, 500))
+    EOIs = np.column_stack((starts, starts + np.random.uniform(1, 40, len(starts))))
+    EOIs = np.vstack(([[0, 3], [1000 * 995 / Fs, 1000 * 1015 / Fs], [59990, 60000]], EOIs))
+
+    for threshold, required_peaks in [(None, 6), (1.5, 6), (2.0, 3)]:
+        expected = []
+        for start, stop in EOIs:
+            eoi_data = rectified_signal[int(Fs * start / 1000):int(Fs * stop / 1000) + 1]
+            peak_values = eoi_data[detect_peaks(eoi_data, threshold=0)]
+            if threshold is not None:
+                peak_values = peak_values[peak_values >= threshold]
+            expected.append(len(peak_values) >= required_peaks)
+
+        np.testing.assert_array_equal(RejectEOIs(EOIs, rectified_signal, Fs, threshold, required_peaks),
+                                      EOIs[np.array(expected)])
+
+
+def test_multichannel_matches_single_channel():
+    """
+    The batched multi-channel detection must find the events of the single channel detection on every channel.
+    """
+    Fs = 4800
+    duration = 60
+    np.random.seed(8)
+    raw_data = np.random.randn(3, int(Fs * duration))
+
+    for burst_start in np.random.randint(0, raw_data.shape[1] - 500, 40):
+        t_burst = np.arange(300) / float(Fs)
+        channels = np.random.choice(3, 2, replace=False)
+        raw_data[channels, burst_start:burst_start + 300] += 6.0 * np.sin(2 * np.pi * 300 * t_burst)
+
+    params = dict(epoch=20.0, sd_num=2.5, min_duration=5.0, min_freq=80.0, max_freq=500.0,
+                  required_peak_number=3, required_peak_sd=1.0, boundary_fraction=0.3)
+
+    channel_events = hilbert_detect_events_multichannel(raw_data, Fs, **params)
+
+    assert len(channel_events) == 3
+    for channel in range(3):
+        events = hilbert_detect_events(raw_data[channel].copy(), Fs, **params)
+        assert len(events) > 10
+        np.testing.assert_allclose(channel_events[channel], events)
+
+
+def test_event_cooccurrence():
+    channel_events = [np.array([[0.0, 10.0], [20.0, 30.0], [50.0, 60.0]]),
+                      np.array([[5.0, 8.0], [30.0, 40.0], [55.0, 70.0]]),
+                      np.asarray([])]
+
+    cooccurrence = event_cooccurrence(channel_events, channel_names=['egf', 'egf2', 'egf3'])
+
+    # [20, 30] and [30, 40] only touch, they don't overlap
+    np.testing.assert_array_equal(cooccurrence.values, [[3, 2, 0], [2, 3, 0], [0, 0, 0]])
+    assert list(cooccurrence.columns) == ['egf', 'egf2', 'egf3']
+
+
+def test_detection_profile():
+    """
+    A profiled detection records every stage and finds the same events.
+    """
+    Fs = 4800
+    np.random.seed(2)
+    raw_data = np.random.randn(Fs * 30)
+
+    params = dict(epoch=10.0, sd_num=2.5, min_duration=5.0, min_freq=80.0, max_freq=500.0,
+                  required_peak_number=3, required_peak_sd=1.0, boundary_fraction=0.3)
+
+    with StageProfile() as profile:
+        events = hilbert_detect_events(raw_data.copy(), Fs, profile=profile, **params)
+
+    np.testing.assert_array_equal(events, hilbert_detect_events(raw_data.copy(), Fs, **params))
+
+    stages = {stage['name']: stage for stage in profile.as_dict()['stages']}
+    assert list(stages) == ['iirfilt', 'hilbert', 'boundary search', 'RejectEOIs']
+    assert stages['boundary search']['calls'] == 3
+    assert stages['boundary search']['samples'] == len(raw_data)
+    assert stages['hilbert']['peak_allocated_bytes'] > raw_data.nbytes
+
+    # the epochs of a thread pool are one stage, concurrent stages would reset each other's tracemalloc peak
+    with StageProfile() as profile:
+        hilbert_detect_events(raw_data.copy(), Fs, profile=profile, epoch_workers=3, epoch_executor='thread', **params)
+
+    stages = {stage['name']: stage for stage in profile.as_dict()['stages']}
+    assert list(stages) == ['iirfilt', 'hilbert', 'epochs (thread pool)']
+    assert stages['epochs (thread pool)']['calls'] == 1
+
+
+def test_intermediates_key_changes_when_the_same_path_is_reloaded(tmp_path):
+    """The cached intermediates of a source must not be reused after its file is rewritten and loaded again."""
+    filename = str(tmp_path / 'session.npy')
+    parameters = dict(epoch=300, min_freq=80, max_freq=500)
+
+    np.save(filename, np.zeros(1000))
+    source = np.load(filename)
+    key = intermediates_key(source, filename, **parameters)
+    assert intermediates_key(source, filename, **parameters) == key
+
+    np.save(filename, np.ones(2000))
+    reloaded_source = np.load(filename)
+    assert intermediates_key(reloaded_source, filename, **parameters) != key
+    # even if the new source was allocated where the old one was
+    assert intermediates_key(source, filename, **parameters) != key
+
+
 if __name__ == '__main__':
     # Allow running tests directly
     pytest.main([__file__, '-v'])
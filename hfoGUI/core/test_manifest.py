@@ -0,0 +1,54 @@
+import os
+
+from .manifest import RunManifest, params_hash
+
+
+def test_manifest_skips_only_unchanged_finished_files(tmp_path):
+    data_path = tmp_path / 'session.egf'
+    data_path.write_bytes(b'data')
+    output_path = tmp_path / 'session_HIL.txt'
+    output_path.write_text('scores')
+
+    run_params_hash = params_hash({'sd_num': 3.0, 'epoch': 300.0})
+    assert run_params_hash == params_hash({'epoch': 300.0, 'sd_num': 3.0})
+
+    manifest = RunManifest(tmp_path / 'manifest.jsonl')
+    assert not manifest.is_up_to_date(data_path, [data_path], run_params_hash)
+
+    manifest.record(data_path, [data_path], run_params_hash, 'done', outputs=[output_path], events=2)
+
+    # a rerun reads the manifest back
+    manifest = RunManifest(tmp_path / 'manifest.jsonl')
+    assert manifest.is_up_to_date(data_path, [data_path], run_params_hash)
+    assert not manifest.is_up_to_date(data_path, [data_path], params_hash({'sd_num': 4.0, 'epoch': 300.0}))
+
+    # the input changed
+    os.utime(str(data_path), ns=(0, 0))
+    assert not manifest.is_up_to_date(data_path, [data_path], run_params_hash)
+
+    # a failure is retried, the last record of a file wins
+    manifest.record(data_path, [data_path], run_params_hash, 'failed', error='boom')
+    assert not RunManifest(tmp_path / 'manifest.jsonl').is_up_to_date(data_path, [data_path], run_params_hash)
+
+    manifest.record(data_path, [data_path], run_params_hash, 'done', outputs=[output_path], events=2)
+    assert manifest.is_up_to_date(data_path, [data_path], run_params_hash)
+
+    # the output was deleted
+    output_path.unlink()
+    assert not manifest.is_up_to_date(data_path, [data_path], run_params_hash)
+
+
+def test_manifest_failed_files(tmp_path):
+    data_path = tmp_path / 'session.egf'
+    data_path.write_bytes(b'data')
+    run_params_hash = params_hash({'sd_num': 3.0})
+
+    manifest = RunManifest(tmp_path / 'manifest.jsonl')
+    assert not manifest.has_failed(data_path, [data_path], run_params_hash)
+
+    manifest.record(data_path, [data_path], run_params_hash, 'failed', error='boom')
+    assert manifest.has_failed(data_path, [data_path], run_params_hash)
+    assert not manifest.has_failed(data_path, [data_path], params_hash({'sd_num': 4.0}))
+
+    data_path.write_bytes(b'the rest of the data')
+    assert not manifest.has_failed(data_path, [data_path], run_params_hash)
@@ -0,0 +1,58 @@
+import pytest
+
+from .memory_model import FIXED_OVERHEAD_BYTES, DetectionMemoryModel, parse_memory_size, recording_samples
+
+
+def test_parse_memory_size():
+    assert parse_memory_size('512M') == 512 * 10 ** 6
+    assert parse_memory_size('8G') == 8 * 10 ** 9
+    assert parse_memory_size('1.5gb') == 15 * 10 ** 8
+    assert parse_memory_size('1000') == 1000
+
+    with pytest.raises(ValueError):
+        parse_memory_size('lots')
+
+
+def test_recording_samples_reads_the_header(tmp_path):
+    header = b'sample_rate 4800 hz\r\nbytes_per_sample 2\r\nnum_EGF_samples 9600\r\ndata_start'
+    data_path = tmp_path / 'session.egf'
+    data_path.write_bytes(header + b'\x00' * 2 * 9600 + b'\r\ndata_end')
+    assert recording_samples(data_path) == (9600, 4800.0)
+
+    # without a sample count, the size of the data
+    header = b'sample_rate 4800 hz\r\nbytes_per_sample 2\r\ndata_start'
+    data_path.write_bytes(header + b'\x00' * 2 * 9600)
+    assert recording_samples(data_path) == (9600, 4800.0)
+
+
+def test_memory_model_correction():
+    model = DetectionMemoryModel(precision='double')
+    predicted = model.estimate(10 ** 7, 4800.0)
+    assert predicted == model.base_estimate(10 ** 7, 4800.0)
+    assert DetectionMemoryModel(precision='single').estimate(10 ** 7, 4800.0) < predicted
+    assert DetectionMemoryModel(chunk_sec=60).estimate(10 ** 8, 4800.0) < model.estimate(10 ** 8, 4800.0)
+
+    sample_bytes = model.sample_bytes(10 ** 7, 4800.0)
+    model.observe(10 ** 7, 4800.0, FIXED_OVERHEAD_BYTES + 2 * sample_bytes)
+    model.observe(10 ** 7, 4800.0, None)
+    assert model.estimate(10 ** 7, 4800.0) == FIXED_OVERHEAD_BYTES + 2 * sample_bytes
+
+
+def test_memory_model_ignores_the_overhead_of_tiny_recordings():
+    model = DetectionMemoryModel(precision='double')
+
+    # a 10 s recording peaks at the overhead of the interpreter and the libraries, 100 times its sample memory
+    model.observe(48000, 4800.0, 100 * model.sample_bytes(48000, 4800.0))
+    assert model.correction is None
+
+    # the large recording that follows corrects the model with its own ratio
+    sample_bytes = model.sample_bytes(10 ** 8, 4800.0)
+    model.observe(10 ** 8, 4800.0, FIXED_OVERHEAD_BYTES + int(1.1 * sample_bytes))
+    assert model.correction == pytest.approx(1.1)
+    assert model.estimate(10 ** 8, 4800.0) < 1.2 * model.base_estimate(10 ** 8, 4800.0)
+
+    # one outlier among many doesn't set the correction
+    for _ in range(9):
+        model.observe(10 ** 8, 4800.0, FIXED_OVERHEAD_BYTES + sample_bytes)
+    model.observe(10 ** 8, 4800.0, FIXED_OVERHEAD_BYTES + 5 * sample_bytes)
+    assert model.correction == pytest.approx(1.1)
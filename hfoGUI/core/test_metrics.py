@@ -0,0 +1,30 @@
+import json
+
+from .metrics import MetricsStream
+
+
+def test_metrics_stream_records(tmp_path):
+    metrics_path = tmp_path / 'metrics.jsonl'
+    profile = {'stages': [{'name': 'ReadEEG', 'calls': 1, 'wall_time_s': 0.5, 'samples': 1000,
+                           'peak_allocated_bytes': 0}]}
+
+    with MetricsStream(metrics_path, interval_sec=3600, files_total=2, bytes_total=300) as metrics:
+        metrics.start(command='hilbert-batch')
+        metrics.file_finished('a.egf', 'done', wall_sec=2.0, samples=1000, bytes_read=100, events=3,
+                              peak_rss_bytes=10 ** 6, profile=profile)
+
+        progress = metrics.progress()
+        assert progress['files_done'] == 1
+        # 100 of 300 bytes read, the ETA is twice the elapsed time
+        assert abs(progress['eta_sec'] - 2 * progress['elapsed_sec']) < 0.1
+
+        metrics.file_finished('b.egf', 'failed', bytes_read=200, error='boom')
+
+    records = [json.loads(line) for line in metrics_path.read_text().splitlines()]
+    assert [record['type'] for record in records] == ['run_start', 'stage', 'file', 'file', 'run_end']
+
+    stage, done, failed, run_end = records[1:]
+    assert stage['stage'] == 'ReadEEG' and stage['samples_per_sec'] == 2000
+    assert done['samples_per_sec'] == 500 and done['events'] == 3 and done['peak_rss_bytes'] == 10 ** 6
+    assert failed['status'] == 'failed' and failed['error'] == 'boom'
+    assert run_end['files_done'] == 1 and run_end['files_failed'] == 1 and run_end['eta_sec'] == 0
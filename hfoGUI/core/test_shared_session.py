@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+
+from .shared_session import SharedSession, attach_session, map_session
+
+
+def _write_egf(path, samples):
+    header = b'sample_rate 4800 hz\r\nbytes_per_sample 2\r\nnum_EGF_samples %d\r\ndata_start' % len(samples)
+    path.write_bytes(header + np.asarray(samples, dtype='<h').tobytes() + b'\r\ndata_end')
+
+
+def _scaled_sum(data, Fs, scale):
+    return float(np.sum(data)) * scale, Fs
+
+
+def test_shared_session_is_read_once_and_shared(tmp_path):
+    samples = np.arange(-500, 500)
+    data_path = tmp_path / 'session.egf'
+    _write_egf(data_path, samples)
+
+    with SharedSession(data_path) as session:
+        np.testing.assert_array_equal(session.data, samples)
+        assert session.Fs == 4800
+
+        with attach_session(session.handle) as data:
+            np.testing.assert_array_equal(data, samples)
+            with pytest.raises(ValueError):
+                data[0] = 1
+
+        expected = [(float(np.sum(samples)) * scale, 4800) for scale in [1, 2, 3]]
+        assert map_session(_scaled_sum, session, [1, 2, 3]) == expected
+        assert map_session(_scaled_sum, session, [1, 2, 3], workers=2) == expected
@@ -0,0 +1,103 @@
+import multiprocessing
+import os
+
+from . import work_queue
+
+from .manifest import ShardedRunManifest
+from .work_queue import WorkQueue
+
+
+def _drain(queue_dir, worker_id):
+    queue = WorkQueue(queue_dir, worker_id=worker_id)
+    claimed = []
+    while True:
+        claim = queue.claim()
+        if claim is None:
+            return claimed
+        claim_name, item = claim
+        assert queue.finish(claim_name, 'done')
+        claimed.append(item['data_file'])
+
+
+def test_every_item_is_claimed_once_by_concurrent_workers(tmp_path):
+    queue = WorkQueue(tmp_path / 'queue')
+    data_files = ['/nas/session{}.egf'.format(index) for index in range(40)]
+    for data_file in data_files:
+        assert queue.enqueue({'data_file': data_file, 'set_file': None})
+    # already pending
+    assert not queue.enqueue({'data_file': data_files[0], 'set_file': None})
+
+    # processes stand in for the hosts sharing the queue directory
+    with multiprocessing.get_context('spawn').Pool(4) as pool:
+        claimed = pool.starmap(_drain, [(str(tmp_path / 'queue'), 'host{}'.format(index)) for index in range(4)])
+
+    assert sorted(data_file for worker_claimed in claimed for data_file in worker_claimed) == sorted(data_files)
+    assert queue.counts() == {'pending': 0, 'claimed': 0, 'done': 40, 'failed': 0}
+
+    # a finished item is queued again
+    assert queue.enqueue({'data_file': data_files[0], 'set_file': None})
+    assert queue.counts()['pending'] == 1
+
+
+def test_stale_claims_are_reclaimed(tmp_path):
+    queue = WorkQueue(tmp_path / 'queue', worker_id='host0', stale_sec=60)
+    queue.enqueue({'data_file': '/nas/session.egf', 'set_file': None})
+
+    claim_name, _ = queue.claim()
+    assert queue.claim() is None
+    assert queue.reclaim_stale() == []
+
+    # the owner stopped its heartbeat 2 minutes ago
+    stale_time = queue.server_time() - 120
+    os.utime(os.path.join(queue.directory, 'claimed', claim_name), (stale_time, stale_time))
+    assert queue.reclaim_stale() == [claim_name]
+    assert not queue.touch(claim_name)
+    assert not queue.finish(claim_name, 'done')
+
+    other_queue = WorkQueue(tmp_path / 'queue', worker_id='host1')
+    other_claim_name, item = other_queue.claim()
+    assert item['data_file'] == '/nas/session.egf'
+    assert other_queue.finish(other_claim_name, 'done')
+
+
+def test_sharded_manifest_reads_every_shard(tmp_path):
+    data_path = tmp_path / 'session.egf'
+    data_path.write_bytes(b'data')
+
+    ShardedRunManifest(tmp_path / 'manifest', 'host0').record(data_path, [data_path], 'hash', 'failed', error='boom')
+    ShardedRunManifest(tmp_path / 'manifest', 'host1').record(data_path, [data_path], 'hash', 'done', events=1)
+
+    assert ShardedRunManifest(tmp_path / 'manifest', 'host2').is_up_to_date(data_path, [data_path], 'hash')
+
+
+def test_claim_survives_a_reclaim_between_rename_and_touch(tmp_path, monkeypatch):
+    queue = WorkQueue(tmp_path / 'queue', worker_id='host0', stale_sec=60)
+    other_queue = WorkQueue(tmp_path / 'queue', worker_id='host1', stale_sec=60)
+    queue.enqueue({'data_file': '/nas/session.egf', 'set_file': None})
+
+    # the item was queued 2 minutes ago
+    name = WorkQueue.item_name('/nas/session.egf')
+    queued_time = queue.server_time() - 120
+    os.utime(os.path.join(queue.directory, 'pending', name), (queued_time, queued_time))
+
+    rename = os.rename
+    reclaimed = []
+
+    def rename_then_reclaim(source, destination):
+        rename(source, destination)
+        if os.path.basename(os.path.dirname(destination)) == 'claimed' and not reclaimed:
+            reclaimed.append(other_queue.reclaim_stale())
+
+    monkeypatch.setattr(work_queue.os, 'rename', rename_then_reclaim)
+
+    claim_name, item = queue.claim()
+    assert reclaimed == [[]]
+    assert item['data_file'] == '/nas/session.egf'
+    assert queue.finish(claim_name, 'done')
+
+    # a claim that is reclaimed anyway is skipped instead of crashing the worker
+    queue.enqueue({'data_file': '/nas/session.egf', 'set_file': None})
+    other_queue.stale_sec = -1
+    reclaimed.clear()
+    assert queue.claim() is None
+    assert reclaimed and queue.counts()['pending'] == 1
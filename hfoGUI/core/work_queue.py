@@ -0,0 +1,163 @@
+import contextlib
+import hashlib
+import json
+import os
+import socket
+import threading
+
+_STATES = ['pending', 'claimed', 'done', 'failed']
+
+
+def default_worker_id():
+    return '{}-{}'.format(socket.gethostname(), os.getpid())
+
+
+class WorkQueue(object):
+    """A work queue in a shared directory (e.g. on a NAS mounted by every compute node), for batch runs on several
+    hosts without a scheduler.
+
+    Every work item is a JSON file that moves between the pending/, claimed/, done/ and failed/ subdirectories with
+    os.rename, which is atomic on the same file system, so of all the processes that try to claim an item exactly one
+    succeeds. A claimed item is named <item>@<worker id>, and its owner touches it (heartbeat) while it works on it.
+    A claim that wasn't touched for stale_sec seconds (the owner died or lost the mount) is moved back to pending/ by
+    any worker. The ages are measured with the clock of the file server, not the one of the host.
+
+    An item that is reclaimed while its owner is merely slow is processed twice (at least once delivery), the
+    detection writes the same outputs either way.
+    """
+
+    def __init__(self, directory, worker_id=None, stale_sec=300.0):
+        self.directory = str(directory)
+        self.worker_id = worker_id or default_worker_id()
+        self.stale_sec = stale_sec
+
+        for state in _STATES + ['tmp']:
+            os.makedirs(os.path.join(self.directory, state), exist_ok=True)
+
+    def _path(self, state, name=''):
+        return os.path.join(self.directory, state, name)
+
+    @staticmethod
+    def item_name(data_file):
+        return hashlib.sha1(str(data_file).encode('utf-8')).hexdigest()[:20]
+
+    def item_state(self, name):
+        """The state of an item ('pending', 'claimed', 'done' or 'failed'), None if it isn't queued."""
+        for state in _STATES:
+            if state == 'claimed':
+                if any(claim.split('@', 1)[0] == name for claim in os.listdir(self._path(state))):
+                    return state
+            elif os.path.exists(self._path(state, name)):
+                return state
+        return None
+
+    def enqueue(self, item):
+        """Queues an item (a JSON serializable dictionary with a 'data_file'). An item that is already queued is left
+        where it is, except a finished one (done or failed), which is queued again. Returns whether the item was
+        queued."""
+        name = self.item_name(item['data_file'])
+
+        state = self.item_state(name)
+        if state in ['pending', 'claimed']:
+            return False
+
+        if state in ['done', 'failed']:
+            try:
+                os.rename(self._path(state, name), self._path('pending', name))
+                return True
+            except FileNotFoundError:
+                # another process queued it again first
+                return False
+
+        tmp_path = self._path('tmp', '{}@{}'.format(name, self.worker_id))
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(item, f)
+        os.rename(tmp_path, self._path('pending', name))
+        return True
+
+    def claim(self):
+        """Claims a pending item, returns (claim name, item) or None if nothing is pending."""
+        for name in sorted(os.listdir(self._path('pending'))):
+            claim_name = '{}@{}'.format(name, self.worker_id)
+            try:
+                # the claim time starts the heartbeat, the item is touched before the rename (which keeps the mtime)
+                # so a reclaim_stale never sees the time it was queued on a claim
+                os.utime(self._path('pending', name))
+                os.rename(self._path('pending', name), self._path('claimed', claim_name))
+            except FileNotFoundError:
+                # claimed by another worker
+                continue
+
+            try:
+                os.utime(self._path('claimed', claim_name))
+                with open(self._path('claimed', claim_name), 'r', encoding='utf-8') as f:
+                    return claim_name, json.load(f)
+            except FileNotFoundError:
+                # reclaimed by another worker meanwhile
+                continue
+
+        return None
+
+    def touch(self, claim_name):
+        """Heartbeat of a claim, returns False if the claim was reclaimed."""
+        try:
+            os.utime(self._path('claimed', claim_name))
+            return True
+        except FileNotFoundError:
+            return False
+
+    @contextlib.contextmanager
+    def heartbeat(self, claim_name, interval=None):
+        """Touches the claim every interval seconds (a quarter of stale_sec by default) in a background thread while
+        the context is active."""
+        interval = interval or self.stale_sec / 4.0
+        stop = threading.Event()
+
+        def beat():
+            while not stop.wait(interval):
+                self.touch(claim_name)
+
+        thread = threading.Thread(target=beat, name='heartbeat {}'.format(claim_name), daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            thread.join()
+
+    def finish(self, claim_name, status):
+        """Moves a claimed item to done/ or failed/ (status). Returns False if the claim was reclaimed meanwhile."""
+        name = claim_name.split('@', 1)[0]
+        try:
+            os.rename(self._path('claimed', claim_name), self._path(status, name))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def server_time(self):
+        """The current time of the file server (the mtime of a file touched now)."""
+        clock_path = self._path('tmp', 'clock')
+        with open(clock_path, 'a'):
+            pass
+        os.utime(clock_path)
+        return os.stat(clock_path).st_mtime
+
+    def reclaim_stale(self):
+        """Moves the claims without a heartbeat for stale_sec back to pending/, returns their names."""
+        now = self.server_time()
+
+        reclaimed = []
+        for claim_name in os.listdir(self._path('claimed')):
+            try:
+                age = now - os.stat(self._path('claimed', claim_name)).st_mtime
+                if age > self.stale_sec:
+                    os.rename(self._path('claimed', claim_name),
+                              self._path('pending', claim_name.split('@', 1)[0]))
+                    reclaimed.append(claim_name)
+            except FileNotFoundError:
+                # finished or reclaimed by another worker meanwhile
+                continue
+        return reclaimed
+
+    def counts(self):
+        return {state: len(os.listdir(self._path(state))) for state in _STATES}
@@ -147,35 +147,106 @@ def select_rhd_file(default_path: str) -> str:
     return None
 
 
-def main():
-    # Directory where this script is located
-    script_dir = os.path.dirname(os.path.abspath(__file__))
+def session_name_of(rhd_file: str) -> str:
+    """The session name of an RHD file, the prefix_YYMMDD_HHMMSS core without a chunk suffix when present."""
+    session_name_base = os.path.splitext(os.path.basename(rhd_file))[0]
+    m = re.match(r"(.+?_\d{6}_\d{6})(?:[-_]\d{1,3})?$", session_name_base)
+    return m.group(1) if m else session_name_base
 
-    # Default to bundled sample data
-    default_rhd = os.path.join(script_dir, 'core', 'load_intan_rhd_format', 'sampledata.rhd')
 
-    # If a path was provided as an argument, use it; otherwise prompt user
-    rhd_file = sys.argv[1] if len(sys.argv) > 1 else select_rhd_file(default_rhd)
+def find_amplifier_channel(intan_data: dict, target_channel_name: str):
+    """The (index, name) of an amplifier channel by its native or custom name (or the first one starting with it),
+    None if there is no such channel."""
+    for i, ch in enumerate(intan_data.get('amplifier_channels', [])):
+        names = [ch.get('native_channel_name', ''), ch.get('custom_channel_name', '')]
+        if any(n == target_channel_name for n in names):
+            return i, target_channel_name
 
-    # User cancelled the dialog: exit gracefully with no conversion
-    if not rhd_file:
-        print("Conversion cancelled: no RHD file selected.")
-        return
+    # Fallback: try startswith match
+    for i, ch in enumerate(intan_data.get('amplifier_channels', [])):
+        names = [ch.get('native_channel_name', ''), ch.get('custom_channel_name', '')]
+        if any(n.startswith(target_channel_name) for n in names):
+            return i, names[0] or names[1]
 
-    if not os.path.isfile(rhd_file):
-        print(f"Error: RHD file not found: {rhd_file}")
-        sys.exit(1)
+    return None
 
-    print(f"Using RHD file: {rhd_file}")
+
+def channel_file_names(channel_names: list) -> list:
+    """The names the channels are written as: the files and the .set gains are numbered by the last 3 characters of
+    the channel name (A-005 -> .egf005). A channel whose number is already taken by an earlier channel (e.g. B-000
+    after A-000) is written under the next number no channel has, without a port (B-000 -> 002 after A-000, A-001
+    and B-001), every other channel keeps its name. Pass every amplifier channel of the session, so that a channel
+    gets the same file whichever channels are converted (convert_session writes the mapping next to the files)."""
+    native_numbers = {name[-3:] for name in channel_names}
+    used_numbers = set()
+    free_numbers = ('{:03d}'.format(number) for number in range(1000) if '{:03d}'.format(number) not in native_numbers)
+
+    file_names = []
+    for name in channel_names:
+        if name[-3:] in used_numbers:
+            name = next(free_numbers)
+        used_numbers.add(name[-3:])
+        file_names.append(name)
+    return file_names
+
+
+def convert_channel(amplifier_data, intan_sample_rate, channel):
+    """Filters, downsamples and writes one amplifier channel to its .egf/.eeg file. amplifier_data is the whole
+    (channels, samples) array and channel the (index, file name, header, session_name, output_dir, duration,
+    create_egf) of the channel, so that a pool of workers can share the array (core.shared_session.map_session).
+
+    Returns the number of input samples converted.
+    """
+    target_idx, file_channel_name, header, session_name, output_dir, duration, create_egf = channel
+
+    # Extract, filter, and convert only the target channel
+    chan_data = amplifier_data[target_idx]
+    irfiltered_data = iirfilt(
+        bandtype='low', data=chan_data, Fs=intan_sample_rate,
+        Wp=500, order=6, automatic=0, Rp=0.1, As=60, filttype='cheby1', showresponse=0
+    )
+    filtered_data = notch_filt(
+        irfiltered_data, Fs=intan_sample_rate, freq=60, band=10, order=2, showresponse=0
+    )
+
+    if create_egf:
+        # Create EGF file (4.8 kHz)
+        egf_ephys_data = down_sample_timeseries(filtered_data, intan_sample_rate, 4.8e3)
+        egf_ephys_data = egf_ephys_data.astype('int16')
+        write_eeg_or_egf_file(egf_ephys_data, duration, header, file_channel_name, session_name, output_dir, is_egf=True)
+    else:
+        # Create EEG file (250 Hz)
+        eeg_ephys_data = down_sample_timeseries(filtered_data, intan_sample_rate, 250)
+        eeg_ephys_data = eeg_ephys_data.astype('int8')
+        write_eeg_or_egf_file(eeg_ephys_data, duration, header, file_channel_name, session_name, output_dir, is_egf=False)
+
+    return len(chan_data)
+
+
+def convert_session(rhd_file: str, channels=None, workers: int = 1, output_dir: str = None) -> dict:
+    """Converts the amplifier channels of the session of an RHD file (and its related files) to a .set and an
+    .egf/.eeg file per channel.
+
+    channels is a list of channel names (all the amplifier channels by default). With workers > 1 the amplifier data
+    is published once in shared memory and the channels are filtered and written by a pool of that many processes.
+    The output directory defaults to a session-named folder next to the RHD file.
+
+    Returns a dictionary with the session name, output directory, converted channels, number of input samples and
+    the read and conversion times (s).
+    """
+    import time
+    from core.shared_session import SharedSession, map_session
+
+    read_start = time.perf_counter()
 
     # Find and read all related RHD files (handles chunked recordings)
     related_files = find_related_rhd_files(rhd_file)
     intan_data = read_and_concatenate_rhd_files(related_files)
 
+    read_sec = time.perf_counter() - read_start
+
     # Use session core for folder/name when available
-    session_name_base = os.path.splitext(os.path.basename(rhd_file))[0]
-    m = re.match(r"(.+?_\d{6}_\d{6})(?:[-_]\d{1,3})?$", session_name_base)
-    session_name = m.group(1) if m else session_name_base
+    session_name = session_name_of(rhd_file)
 
     # Get sampling rate to determine if we can create EGF or only EEG
     intan_sample_rate = intan_data['frequency_parameters']['amplifier_sample_rate']
@@ -187,33 +258,38 @@ def main():
     print(f"Creating {file_type} files (sampling rate {'sufficient' if create_egf else 'insufficient'} for EGF)")
 
     # Create output directory with session name next to the chosen RHD file
-    parent_dir = os.path.dirname(rhd_file)
-    output_dir = os.path.join(parent_dir, session_name)
+    output_dir = output_dir or os.path.join(os.path.dirname(rhd_file), session_name)
     os.makedirs(output_dir, exist_ok=True)
 
-    # Select only one channel: A-000
-    target_channel_name = 'A-000'
-    target_idx = None
-    for i, ch in enumerate(intan_data.get('amplifier_channels', [])):
-        names = [ch.get('native_channel_name', ''), ch.get('custom_channel_name', '')]
-        if any(n == target_channel_name for n in names):
-            target_idx = i
-            break
-
-    if target_idx is None:
-        # Fallback: try startswith match
-        for i, ch in enumerate(intan_data.get('amplifier_channels', [])):
-            names = [ch.get('native_channel_name', ''), ch.get('custom_channel_name', '')]
-            if any(n.startswith(target_channel_name) for n in names):
-                target_idx = i
-                target_channel_name = names[0] or names[1]
-                break
-
-    if target_idx is None:
-        print("Error: Could not find channel 'A-000' in amplifier_channels.")
-        sys.exit(1)
-
-    print(f"Converting single channel: {target_channel_name} (index {target_idx})")
+    if channels is None:
+        selected = [(i, ch['native_channel_name']) for i, ch in enumerate(intan_data.get('amplifier_channels', []))]
+    else:
+        selected = []
+        for target_channel_name in channels:
+            channel = find_amplifier_channel(intan_data, target_channel_name)
+            if channel is None:
+                raise ValueError(f"Could not find channel '{target_channel_name}' in amplifier_channels.")
+            selected.append(channel)
+
+    if not selected:
+        raise ValueError(f"No amplifier channels in {rhd_file}")
+
+    # numbered over every amplifier channel, a channel is written to the same file whichever channels are selected
+    session_file_names = channel_file_names([ch['native_channel_name']
+                                             for ch in intan_data.get('amplifier_channels', [])])
+    file_channel_names = [session_file_names[index] for index, _ in selected]
+    print(f"Converting {len(selected)} channel(s): {', '.join(name for _, name in selected)}")
+
+    extension = '.egf' if create_egf else '.eeg'
+    channel_files = {name: session_name + extension + file_channel_name[-3:]
+                     for (_, name), file_channel_name in zip(selected, file_channel_names)}
+    with open(os.path.join(output_dir, session_name + '_channels.txt'), 'w') as f:
+        f.write('channel\tfile\n')
+        f.writelines('{}\t{}\n'.format(name, file_name) for name, file_name in channel_files.items())
+
+    for (_, name), file_channel_name in zip(selected, file_channel_names):
+        if file_channel_name[-3:] != name[-3:]:
+            print(f"  {name} collides with another channel's number, written to {channel_files[name]}")
 
     # Downsample time for duration
     amplifier_sample_rate = float(intan_data['frequency_parameters']['amplifier_sample_rate'])
@@ -221,37 +297,71 @@ def main():
     time_down = down_sample_timeseries(intan_data['t_amplifier'].flatten(), amplifier_sample_rate, target_rate)
     duration = float(time_down[-1] - time_down[0]) if len(time_down) > 1 else 0.0
 
-    # Create header limited to single channel
+    # Create header limited to the selected channels
     header = intan_to_lfp_header_dict(intan_data, egf=create_egf)
-    header['channels'] = [target_channel_name]
+    header['channels'] = file_channel_names
     write_faux_set_file(header, session_name, output_dir, duration)
 
-    # Extract, filter, and convert only the target channel
-    chan_data = intan_data['amplifier_data'][target_idx]
-    irfiltered_data = iirfilt(
-        bandtype='low', data=chan_data, Fs=intan_sample_rate,
-        Wp=500, order=6, automatic=0, Rp=0.1, As=60, filttype='cheby1', showresponse=0
-    )
-    filtered_data = notch_filt(
-        irfiltered_data, Fs=intan_sample_rate, freq=60, band=10, order=2, showresponse=0
-    )
+    convert_start = time.perf_counter()
+    channel_tasks = [(index, file_channel_name, header, session_name, output_dir, duration, create_egf)
+                     for (index, _), file_channel_name in zip(selected, file_channel_names)]
 
-    if create_egf:
-        # Create EGF file (4.8 kHz)
-        egf_ephys_data = down_sample_timeseries(filtered_data, intan_sample_rate, 4.8e3)
-        egf_ephys_data = egf_ephys_data.astype('int16')
-        write_eeg_or_egf_file(egf_ephys_data, duration, header, target_channel_name, session_name, output_dir, is_egf=True)
+    if workers > 1 and len(channel_tasks) > 1:
+        # the channels are filtered in the workers from one shared copy of the amplifier data
+        with SharedSession.from_array(intan_data['amplifier_data'], intan_sample_rate, rhd_file) as session:
+            intan_data = None
+            samples = map_session(convert_channel, session, channel_tasks, workers=workers)
     else:
-        # Create EEG file (250 Hz)
-        eeg_ephys_data = down_sample_timeseries(filtered_data, intan_sample_rate, 250)
-        eeg_ephys_data = eeg_ephys_data.astype('int8')
-        write_eeg_or_egf_file(eeg_ephys_data, duration, header, target_channel_name, session_name, output_dir, is_egf=False)
+        samples = [convert_channel(intan_data['amplifier_data'], intan_sample_rate, channel)
+                   for channel in channel_tasks]
+
+    return {
+        'session': session_name,
+        'output_dir': output_dir,
+        'file_type': file_type.lower(),
+        'channels': [name for _, name in selected],
+        'files': channel_files,
+        'samples': int(sum(samples)),
+        'read_sec': read_sec,
+        'convert_sec': time.perf_counter() - convert_start,
+    }
+
+
+def main():
+    # Directory where this script is located
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+
+    # Default to bundled sample data
+    default_rhd = os.path.join(script_dir, 'core', 'load_intan_rhd_format', 'sampledata.rhd')
+
+    # If a path was provided as an argument, use it; otherwise prompt user
+    rhd_file = sys.argv[1] if len(sys.argv) > 1 else select_rhd_file(default_rhd)
+
+    # User cancelled the dialog: exit gracefully with no conversion
+    if not rhd_file:
+        print("Conversion cancelled: no RHD file selected.")
+        return
+
+    if not os.path.isfile(rhd_file):
+        print(f"Error: RHD file not found: {rhd_file}")
+        sys.exit(1)
+
+    print(f"Using RHD file: {rhd_file}")
+
+    # Select only one channel: A-000 (the intan-convert command converts every channel)
+    try:
+        result = convert_session(rhd_file, channels=['A-000'])
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    file_type = result['file_type']
 
     print(f"\nConversion complete!")
-    print(f"Session name: {session_name}")
-    print(f"Files saved to: {output_dir}")
-    print(f"Files created: {session_name}.set, {session_name}.{file_type.lower()}1, {session_name}.{file_type.lower()}2, etc.")
+    print(f"Session name: {result['session']}")
+    print(f"Files saved to: {result['output_dir']}")
+    print(f"Files created: {result['session']}.set, {result['session']}.{file_type}1, {result['session']}.{file_type}2, etc.")
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -331,6 +331,9 @@ class Window(QtWidgets.QWidget):  # defines the window class (main window)
                     if self.previous_current_time != self.current_time:
                         self.Graph_axis.setXRange(self.current_time/1000, (self.current_time + self.windowsize)/1000, padding=0)
                         self.previous_current_time = self.current_time
+                        if hasattr(self, 'graph_settings_window'):
+                            # plots the sources again once the window is scrolled out of the plotted span
+                            self.graph_settings_window.followWindow(self.current_time, self.windowsize)
 
                 except AttributeError:
                     pass